@@ -1,48 +1,256 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, current_app, render_template, request, redirect, url_for, jsonify, session, flash, Response, stream_with_context, g, send_file, send_from_directory, abort
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
+from functools import wraps
+import io
+import sys
+import sqlite3
 import json
 import os
+import time
 from config import Config
-from database.connection import get_db, execute_query, execute_single, execute_insert, execute_update
+from database import connection
+from database.connection import get_db, pool_stats, execute_query, execute_single, execute_insert, execute_update
 from database.init_db import init_database
-from docx_generator import generate_memorial_docx
+from database.escrita import escrever, escrita_stats
+from database.listagem import listar_projetos, FILTROS as FILTROS_LISTAGEM
+from database.busca import buscar_projetos
+from database.resumo import versao_resumo
+from database import analise
+from database.equipamentos import salvar_equipamentos, anexar_equipamentos, uso_por_modelo, kwp_modulos_por_mes, TABELAS as TIPOS_EQUIPAMENTO
+import project_import
+import project_export
+import project_update
+import project_history
+import memorial_cache
+import document_store
+import metrics
+import http_cache
+import static_assets
+import password_hasher
+from user_cache import UserCache
+from login_throttle import Limitador
 
-# Inicializar Flask
-app = Flask(__name__)
-app.config.from_object(Config)
+# Módulos pesados (docxtpl/python-docx, numpy) são importados dentro das rotas que os
+# usam: docx_generator, docx_jobs, batch_export, dimensionamento e template_registry
 
-# Inicializar Flask-Login
+# Flask-Login (associado a cada aplicação em create_app)
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 
-# Criar pasta de uploads se não existir
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Rotas declaradas neste módulo, registradas em cada aplicação criada por create_app
+_ROTAS = []
 
-# Classe de usuário para Flask-Login
-class User(UserMixin):
+def rota(rule, **options):
+    """Equivalente a @app.route, adiado até a criação da aplicação"""
+    def registrar(view):
+        _ROTAS.append((rule, view, options))
+        return view
+    return registrar
+
+def create_app(config=Config, aquecer=None):
+    """Cria e configura a aplicação.
+
+    Com aquecer (padrão: PREWARM_TEMPLATES) o template do memorial é carregado e
+    compilado aqui; com o Gunicorn em preload_app isso acontece uma vez no processo
+    mestre e os workers herdam o template compilado no fork. Os tempos de cada etapa
+    ficam em app.extensions['inicializacao'] e em /metrics.
+    """
+    inicio = time.perf_counter()
+    relatorio = {}
+    
+    app = Flask(__name__)
+    app.config.from_object(config)
+    login_manager.init_app(app)
+    
+    # Atrás de proxy reverso, request.remote_addr passa a ser o IP do cliente
+    proxies = app.config['TRUSTED_PROXIES']
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    
+    # Criar pasta de uploads e banco se não existirem
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    etapa = time.perf_counter()
+    if not os.path.exists(connection.DATABASE_PATH):
+        init_database(connection.DATABASE_PATH)
+    relatorio['banco_s'] = time.perf_counter() - etapa
+    
+    # Cache de usuários carregados da sessão
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    
+    # Limites de tentativas de login com senha errada, por IP e por email
+    app.extensions['login_limites'] = {
+        'ip': Limitador(app.config['LOGIN_MAX_FALHAS_IP'], app.config['LOGIN_JANELA_S']),
+        'email': Limitador(app.config['LOGIN_MAX_FALHAS_EMAIL'], app.config['LOGIN_JANELA_S']),
+    }
+    
+    for rule, view, options in _ROTAS:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.add_template_global(static_assets.asset_url)
+    
+    if app.config['METRICS_ENABLED']:
+        app.before_request(iniciar_medicao)
+        app.after_request(registrar_medicao)
+    app.before_request(iniciar_varredura)
+    
+    aquecer = app.config['PREWARM_TEMPLATES'] if aquecer is None else aquecer
+    if aquecer:
+        etapa = time.perf_counter()
+        from docx_generator import aquecer as aquecer_templates
+        aquecer_templates()
+        relatorio['aquecimento_s'] = time.perf_counter() - etapa
+    
+    relatorio['create_app_s'] = time.perf_counter() - inicio
+    relatorio['modulos_carregados'] = len(sys.modules)
+    relatorio['docxtpl_carregado'] = int('docxtpl' in sys.modules)
+    relatorio['numpy_carregado'] = int('numpy' in sys.modules)
+    app.extensions['inicializacao'] = relatorio
+    return app
+
+def __getattr__(nome):
+    # `from app import app` e `gunicorn app:app` criam a aplicação padrão no primeiro acesso
+    if nome == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f'module {__name__!r} has no attribute {nome!r}')
+
+# Classe de usuário para Flask-Login (interface do UserMixin com __slots__)
+class User:
+    __slots__ = ('id', 'email', 'nome')
+    
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+    
     def __init__(self, id, email, nome):
         self.id = id
         self.email = email
         self.nome = nome
+    
+    def get_id(self):
+        return str(self.id)
+    
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+    
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+    
+    __hash__ = object.__hash__
 
 @login_manager.user_loader
 def load_user(user_id):
     """Carrega o usuário da sessão"""
+    user_id = str(user_id)
+    user_cache = current_app.extensions['user_cache']
+    user_obj = user_cache.get(user_id)
+    if user_obj is not None:
+        return user_obj
+    
     with get_db() as conn:
         user = conn.execute('SELECT id, email, nome FROM usuarios WHERE id = ?', (user_id,)).fetchone()
         if user:
-            return User(user['id'], user['email'], user['nome'])
+            user_obj = User(user['id'], user['email'], user['nome'])
+            user_cache.set(user_id, user_obj)
+            return user_obj
+    return None
+
+# ============================================================================
+# INSTRUMENTAÇÃO
+# ============================================================================
+
+def iniciar_varredura():
+    # A thread de varredura de uploads/ nasce no worker, depois do fork
+    document_store.iniciar_varredura_periodica(current_app.config['DOCUMENTOS_VARREDURA_INTERVALO'])
+
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+    metrics.iniciar_detalhamento()
+
+def registrar_medicao(response):
+    inicio = g.pop('inicio_requisicao', None)
+    detalhe = metrics.finalizar_detalhamento()
+    if inicio is None:
+        return response
+    
+    duracao = time.perf_counter() - inicio
+    rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+    metrics.requisicoes.observar(duracao, rota, request.method, str(response.status_code))
+    
+    limite_ms = current_app.config['SLOW_REQUEST_MS']
+    if limite_ms and duracao * 1000 >= limite_ms and detalhe:
+        fases = ', '.join(f'{nome}={seg * 1000:.1f}ms' for nome, seg in detalhe['fases'].items())
+        current_app.logger.warning(
+            'Requisição lenta: %s %s -> %s em %.1fms (sql: %d statements, %.1fms; fases: %s)',
+            request.method, request.path, response.status_code, duracao * 1000,
+            detalhe['sql_statements'], detalhe['sql_segundos'] * 1000, fases or '-'
+        )
+    return response
+
+def _template_stats():
+    """Estatísticas do registro de templates, sem importar o docxtpl se nada foi gerado ainda"""
+    registro = sys.modules.get('template_registry')
+    return registro.registry.stats() if registro else {}
+
+def _nao_autorizado():
+    """401 para quem não envia o METRICS_TOKEN (Authorization: Bearer), quando ele está definido"""
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Não autorizado\n', status=401, mimetype='text/plain')
     return None
 
+def operacional(view):
+    """Estatísticas internas: exigem o METRICS_TOKEN como /metrics; sem token definido, login"""
+    com_login = login_required(view)
+
+    @wraps(view)
+    def protegida(*args, **kwargs):
+        if not current_app.config['METRICS_TOKEN']:
+            return com_login(*args, **kwargs)
+        return _nao_autorizado() or view(*args, **kwargs)
+    return protegida
+
+@rota('/metrics')
+def metricas():
+    """Métricas do processo no formato texto do Prometheus"""
+    negado = _nao_autorizado()
+    if negado:
+        return negado
+    
+    texto = (
+        metrics.registry.exportar()
+        + metrics.gauges('solar_db_pool', 'Pool de conexões SQLite', pool_stats())
+        + metrics.gauges('solar_db_write_queue', 'Escritor único do SQLite', escrita_stats())
+        + metrics.gauges('solar_template_registry', 'Registro de templates DOCX', _template_stats())
+        + metrics.gauges('solar_user_cache', 'Cache de usuários da sessão', current_app.extensions['user_cache'].stats())
+        + metrics.gauges('solar_password_hash', 'Pool de hash de senhas', password_hasher.stats())
+        + metrics.gauges('solar_login_ip', 'Limite de falhas de login por IP', current_app.extensions['login_limites']['ip'].stats())
+        + metrics.gauges('solar_login_email', 'Limite de falhas de login por email', current_app.extensions['login_limites']['email'].stats())
+        + metrics.gauges('solar_startup', 'Inicialização da aplicação', current_app.extensions['inicializacao'])
+    )
+    return Response(texto, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # ============================================================================
 # ROTAS DE AUTENTICAÇÃO
 # ============================================================================
 
-@app.route('/login', methods=['GET', 'POST'])
+def _bloqueado(template, espera, motivo):
+    """Resposta 429 quando o IP ou o email passou do limite de falhas"""
+    metrics.login_bloqueios.inc(motivo)
+    flash(f'Muitas tentativas. Tente novamente em {espera} segundos.', 'error')
+    return render_template(template), 429, {'Retry-After': str(espera)}
+
+def _hash_indisponivel(template):
+    """Resposta 503 quando o pool de hash de senhas está saturado"""
+    flash('Servidor ocupado, tente novamente em instantes.', 'error')
+    return render_template(template), 503, {'Retry-After': '1'}
+
+@rota('/login', methods=['GET', 'POST'])
 def login():
     """Página de login"""
     if request.method == 'POST':
@@ -53,19 +261,49 @@ def login():
             flash('Email e senha são obrigatórios', 'error')
             return redirect(url_for('login'))
         
+        # Limites checados antes do hash: tentativas bloqueadas não ocupam o pool
+        limites = current_app.extensions['login_limites']
+        ip = request.remote_addr or ''
+        chave_email = email.lower()
+        espera = limites['ip'].espera(ip)
+        if espera:
+            return _bloqueado('login.html', espera, 'ip')
+        espera = limites['email'].espera(chave_email)
+        if espera:
+            return _bloqueado('login.html', espera, 'email')
+        
         with get_db() as conn:
             user = conn.execute('SELECT id, email, nome, senha_hash FROM usuarios WHERE email = ?', (email,)).fetchone()
         
-        if user and check_password_hash(user['senha_hash'], senha):
+        try:
+            ok, novo_hash = password_hasher.verificar(user['senha_hash'] if user else None, senha)
+        except password_hasher.HashIndisponivel:
+            return _hash_indisponivel('login.html')
+        
+        if ok:
+            limites['email'].limpar(chave_email)
+            if novo_hash:
+                # Hash gravado com outro método/custo: substitui, se ninguém trocou a senha nesse meio tempo
+                usuario_id, hash_antigo = user['id'], user['senha_hash']
+                try:
+                    escrever(lambda conn: conn.execute(
+                        'UPDATE usuarios SET senha_hash = ? WHERE id = ? AND senha_hash = ?',
+                        (novo_hash, usuario_id, hash_antigo)
+                    ))
+                except sqlite3.Error as e:
+                    # A troca fica para o próximo login; a senha já conferiu
+                    current_app.logger.warning('Falha ao atualizar o hash do usuário %s: %s', usuario_id, e)
             user_obj = User(user['id'], user['email'], user['nome'])
             login_user(user_obj, remember=True)
             return redirect(url_for('dashboard'))
         else:
+            limites['ip'].falha(ip)
+            limites['email'].falha(chave_email)
             flash('Email ou senha incorretos', 'error')
     
     return render_template('login.html')
 
-@app.route('/registro', methods=['GET', 'POST'])
+@rota('/registro', methods=['GET', 'POST'])
 def registro():
     """Página de registro"""
     if request.method == 'POST':
@@ -87,28 +325,42 @@ def registro():
             flash('A senha deve ter pelo menos 6 caracteres', 'error')
             return redirect(url_for('registro'))
         
+        # Emails já registrados contam como falha do IP (limita a enumeração de contas)
+        limite_ip = current_app.extensions['login_limites']['ip']
+        ip = request.remote_addr or ''
+        espera = limite_ip.espera(ip)
+        if espera:
+            return _bloqueado('registro.html', espera, 'ip')
+        
         # Verificar se email já existe
         with get_db() as conn:
             existing = conn.execute('SELECT id FROM usuarios WHERE email = ?', (email,)).fetchone()
         
         if existing:
+            limite_ip.falha(ip)
             flash('Este email já está registrado', 'error')
             return redirect(url_for('registro'))
         
-        # Criar novo usuário
-        senha_hash = generate_password_hash(senha)
-        with get_db() as conn:
-            conn.execute(
-                'INSERT INTO usuarios (email, nome, senha_hash) VALUES (?, ?, ?)',
-                (email, nome, senha_hash)
-            )
+        # Criar novo usuário (o INSERT ignora o email registrado por outra requisição nesse meio tempo)
+        try:
+            senha_hash = password_hasher.gerar(senha)
+        except password_hasher.HashIndisponivel:
+            return _hash_indisponivel('registro.html')
+        criado = escrever(lambda conn: conn.execute(
+            'INSERT OR IGNORE INTO usuarios (email, nome, senha_hash) VALUES (?, ?, ?)',
+            (email, nome, senha_hash)
+        ).rowcount)
+        
+        if not criado:
+            flash('Este email já está registrado', 'error')
+            return redirect(url_for('registro'))
         
         flash('Registro realizado com sucesso! Faça login para continuar.', 'success')
         return redirect(url_for('login'))
     
     return render_template('registro.html')
 
-@app.route('/logout')
+@rota('/logout')
 @login_required
 def logout():
     """Fazer logout"""
@@ -120,37 +372,27 @@ def logout():
 # ROTAS DO DASHBOARD
 # ============================================================================
 
-@app.route('/')
-@app.route('/dashboard')
+@rota('/')
+@rota('/dashboard')
 @login_required
 def dashboard():
     """Dashboard principal"""
     with get_db() as conn:
-        # Total de projetos
-        total_projetos = conn.execute(
-            'SELECT COUNT(*) as count FROM projetos WHERE usuario_id = ?',
+        # Métricas mantidas incrementalmente pelos triggers de projetos
+        resumo = conn.execute(
+            '''SELECT total_projetos, potencia_total, projetos_concluidos, total_modulos, versao
+               FROM resumo_usuarios WHERE usuario_id = ?''',
             (current_user.id,)
-        ).fetchone()['count']
-        
-        # Potência total instalada
-        potencia_total = conn.execute(
-            'SELECT COALESCE(SUM(potencia_kwp), 0) as total FROM projetos WHERE usuario_id = ?',
-            (current_user.id,)
-        ).fetchone()['total']
-        
-        # Projetos concluídos
-        projetos_concluidos = conn.execute(
-            'SELECT COUNT(*) as count FROM projetos WHERE usuario_id = ? AND status = ?',
-            (current_user.id, 'Concluído')
-        ).fetchone()['count']
+        ).fetchone()
         
-        # Total de módulos
-        total_modulos = conn.execute(
-            'SELECT COALESCE(SUM(quantidade_modulos), 0) as total FROM projetos WHERE usuario_id = ?',
-            (current_user.id,)
-        ).fetchone()['total']
+        # A versão do resumo muda a cada alteração nos projetos do usuário
+        tag = http_cache.etag('dashboard', current_user.id, resumo['versao'] if resumo else 0,
+                              static_assets.versao_paginas())
+        nao_modificado = http_cache.nao_modificado(tag)
+        if nao_modificado:
+            return nao_modificado
         
-        # Projetos recentes
+        # Projetos recentes (índice de cobertura idx_projetos_usuario_atualizacao)
         projetos_recentes = conn.execute(
             '''SELECT id, nome_cliente, cidade, uf, potencia_kwp, status, data_atualizacao
                FROM projetos WHERE usuario_id = ?
@@ -159,55 +401,141 @@ def dashboard():
         ).fetchall()
     
     metricas = {
-        'total_projetos': total_projetos,
-        'potencia_total': round(potencia_total, 2),
-        'projetos_concluidos': projetos_concluidos,
-        'total_modulos': int(total_modulos)
+        'total_projetos': resumo['total_projetos'] if resumo else 0,
+        'potencia_total': round(resumo['potencia_total'], 2) if resumo else 0,
+        'projetos_concluidos': resumo['projetos_concluidos'] if resumo else 0,
+        'total_modulos': int(resumo['total_modulos']) if resumo else 0
     }
     
-    return render_template('dashboard.html', metricas=metricas, projetos=projetos_recentes)
+    return http_cache.condicional(
+        render_template('dashboard.html', metricas=metricas, projetos=projetos_recentes), tag
+    )
 
 # ============================================================================
 # ROTAS DE PROJETOS
 # ============================================================================
 
-@app.route('/projeto/novo')
+@rota('/projeto/novo')
 @login_required
 def novo_projeto():
     """Criar novo projeto"""
     return render_template('editor.html', projeto=None)
 
-@app.route('/projeto/<int:projeto_id>')
+@rota('/projeto/<int:projeto_id>')
 @login_required
 def editar_projeto(projeto_id):
     """Editar projeto existente"""
     with get_db() as conn:
-        projeto = conn.execute(
-            'SELECT * FROM projetos WHERE id = ? AND usuario_id = ?',
+        versao = conn.execute(
+            'SELECT versao, data_atualizacao FROM projetos WHERE id = ? AND usuario_id = ?',
             (projeto_id, current_user.id)
         ).fetchone()
+        
+        if versao:
+            # Projeto inalterado desde a última visita: 304 sem carregar nem renderizar
+            tag = http_cache.etag('projeto', current_user.id, projeto_id, versao['versao'],
+                                  versao['data_atualizacao'], static_assets.versao_paginas())
+            ultima_modificacao = http_cache.data_http(versao['data_atualizacao'])
+            nao_modificado = http_cache.nao_modificado(tag, ultima_modificacao)
+            if nao_modificado:
+                return nao_modificado
+            
+            projeto = conn.execute('SELECT * FROM projetos WHERE id = ?', (projeto_id,)).fetchone()
+            # Converter para dicionário com os equipamentos das tabelas normalizadas
+            projeto_dict = anexar_equipamentos(conn, [dict(projeto)])[0]
     
-    if not projeto:
+    if not versao:
         flash('Projeto não encontrado', 'error')
         return redirect(url_for('dashboard'))
     
-    # Converter para dicionário
-    projeto_dict = dict(projeto)
+    return http_cache.condicional(render_template('editor.html', projeto=projeto_dict), tag, ultima_modificacao)
+
+@rota('/api/projetos')
+@login_required
+def api_listar_projetos():
+    """API de listagem de projetos com filtros e paginação por cursor"""
+    filtros = {campo: request.args[campo] for campo in FILTROS_LISTAGEM if request.args.get(campo)}
+    ordem = request.args.get('ordem', 'data_atualizacao')
+    desc = request.args.get('direcao', 'desc').lower() != 'asc'
+    cursor = request.args.get('cursor')
+    limite = min(max(request.args.get('limite', 25, type=int), 1), 100)
     
-    # Parsear JSON dos campos de equipamentos
-    if projeto_dict.get('modulos_novos'):
-        projeto_dict['modulos_novos'] = json.loads(projeto_dict['modulos_novos'])
-    else:
-        projeto_dict['modulos_novos'] = []
+    try:
+        with get_db() as conn:
+            tag = http_cache.etag('projetos', current_user.id, versao_resumo(conn, current_user.id),
+                                  request.full_path)
+            nao_modificado = http_cache.nao_modificado(tag)
+            if nao_modificado:
+                return nao_modificado
+            
+            projetos, proximo_cursor = listar_projetos(
+                conn, current_user.id, filtros, ordem, desc, cursor, limite
+            )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return http_cache.condicional(jsonify({
+        'success': True,
+        'projetos': projetos,
+        'proximo_cursor': proximo_cursor
+    }), tag)
+
+@rota('/api/projetos/busca')
+@login_required
+def api_buscar_projetos():
+    """API de busca textual de projetos"""
+    termo = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+    
+    with get_db() as conn:
+        tag = http_cache.etag('busca', current_user.id, versao_resumo(conn, current_user.id), request.full_path)
+        nao_modificado = http_cache.nao_modificado(tag)
+        if nao_modificado:
+            return nao_modificado
+        
+        projetos = buscar_projetos(conn, current_user.id, termo, limite)
     
-    if projeto_dict.get('inversores_novos'):
-        projeto_dict['inversores_novos'] = json.loads(projeto_dict['inversores_novos'])
-    else:
-        projeto_dict['inversores_novos'] = []
+    return http_cache.condicional(jsonify({'success': True, 'projetos': projetos}), tag)
+
+@rota('/api/equipamentos/estatisticas')
+@login_required
+def estatisticas_equipamentos():
+    """API com agregados de uso de equipamentos"""
+    tipo = request.args.get('tipo', 'modulo')
+    if tipo not in TIPOS_EQUIPAMENTO:
+        return jsonify({'success': False, 'message': f'Tipo inválido: {tipo}'}), 400
+    potencia = request.args.get('potencia', type=float)
     
-    return render_template('editor.html', projeto=projeto_dict)
+    with get_db() as conn:
+        modelos = uso_por_modelo(conn, current_user.id, tipo)
+        por_mes = kwp_modulos_por_mes(conn, current_user.id, potencia)
+    
+    return jsonify({'success': True, 'modelos': modelos, 'kwp_modulos_por_mes': por_mes})
 
-@app.route('/api/projeto/salvar', methods=['POST'])
+@rota('/api/analise')
+@login_required
+def api_analise():
+    """API de análise da carteira: kWp, módulos e projetos por período e dimensão"""
+    with get_db() as conn:
+        tag = http_cache.etag('analise', current_user.id, versao_resumo(conn, current_user.id), request.full_path)
+        nao_modificado = http_cache.nao_modificado(tag)
+        if nao_modificado:
+            return nao_modificado
+        
+        try:
+            serie, totais = analise.consultar(
+                conn, current_user.id,
+                request.args.get('dimensao', 'total'),
+                request.args.get('inicio') or None,
+                request.args.get('fim') or None,
+                request.args.get('granularidade', 'mes')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return http_cache.condicional(jsonify({'success': True, 'serie': serie, 'totais': totais}), tag)
+
+@rota('/api/projeto/salvar', methods=['POST'])
 @login_required
 def salvar_projeto():
     """API para salvar projeto"""
@@ -238,8 +566,8 @@ def salvar_projeto():
         fator_carga = dados.get('fator_carga', 0)
         fator_ajuste = dados.get('fator_ajuste', 0)
         
-        modulos_novos = json.dumps(dados.get('modulos_novos', []))
-        inversores_novos = json.dumps(dados.get('inversores_novos', []))
+        modulos_novos = dados.get('modulos_novos') or []
+        inversores_novos = dados.get('inversores_novos') or []
         
         potencia_kwp = dados.get('potencia_kwp', 0)
         geracao_kwh_mes = dados.get('geracao_kwh_mes', 0)
@@ -248,62 +576,169 @@ def salvar_projeto():
         quantidade_modulos = dados.get('quantidade_modulos', 0)
         
         status = dados.get('status', 'Rascunho')
+        versao = dados.get('versao')
         
-        with get_db() as conn:
+        # Totais recalculados no servidor a partir dos equipamentos e do consumo
+        if current_app.config['DIMENSIONAMENTO_NO_SALVAR']:
+            from dimensionamento import dimensionar_projeto
+            totais = dimensionar_projeto(
+                {'modulos_novos': modulos_novos, 'uf': uf, 'media_consumo': media_consumo}
+            )
+            potencia_kwp = totais['potencia_kwp']
+            quantidade_modulos = totais['quantidade_modulos']
+            area_arranjos = totais['area_arranjos']
+            geracao_kwh_mes = totais['geracao_kwh_mes']
+            reducao_percentual = totais.get('reducao_percentual', reducao_percentual)
+        
+        usuario_id = current_user.id
+        historico = current_app.config['HISTORICO_REVISOES']
+        
+        def gravar(conn):
+            novo_id = projeto_id
             if projeto_id:
                 # Atualizar projeto existente
-                conn.execute('''
+                cursor = conn.execute('''
                     UPDATE projetos SET
                     nome_cliente = ?, cpf_cnpj = ?, uc = ?, endereco = ?,
                     cidade = ?, uf = ?, cep = ?, concessionaria = ?, data_projeto = ?,
                     tipo_projeto = ?, modulos_existentes = ?, inversores_existentes = ?,
                     controlador = ?, transdutor_tc = ?, chave_seccionadora = ?,
                     media_consumo = ?, fator_carga = ?, fator_ajuste = ?,
-                    modulos_novos = ?, inversores_novos = ?,
+                    modulos_novos = NULL, inversores_novos = NULL,
                     potencia_kwp = ?, geracao_kwh_mes = ?, reducao_percentual = ?,
                     area_arranjos = ?, quantidade_modulos = ?, status = ?,
-                    data_atualizacao = CURRENT_TIMESTAMP
-                    WHERE id = ? AND usuario_id = ?
+                    versao = versao + 1, data_atualizacao = CURRENT_TIMESTAMP
+                    WHERE id = ? AND usuario_id = ? AND (? IS NULL OR versao = ?)
                 ''', (
                     nome_cliente, cpf_cnpj, uc, endereco, cidade, uf, cep, concessionaria, data_projeto,
                     tipo_projeto, modulos_existentes, inversores_existentes,
                     controlador, transdutor_tc, chave_seccionadora,
                     media_consumo, fator_carga, fator_ajuste,
-                    modulos_novos, inversores_novos,
                     potencia_kwp, geracao_kwh_mes, reducao_percentual,
                     area_arranjos, quantidade_modulos, status,
-                    projeto_id, current_user.id
+                    projeto_id, usuario_id, versao, versao
                 ))
+                if cursor.rowcount == 0:
+                    atual = conn.execute(
+                        'SELECT versao FROM projetos WHERE id = ? AND usuario_id = ?',
+                        (projeto_id, usuario_id)
+                    ).fetchone()
+                    if atual is None:
+                        return None
+                    raise project_update.ConflitoVersao(atual['versao'])
             else:
                 # Criar novo projeto
-                conn.execute('''
+                cursor = conn.execute('''
                     INSERT INTO projetos (
                     usuario_id, nome_cliente, cpf_cnpj, uc, endereco,
                     cidade, uf, cep, concessionaria, data_projeto,
                     tipo_projeto, modulos_existentes, inversores_existentes,
                     controlador, transdutor_tc, chave_seccionadora,
                     media_consumo, fator_carga, fator_ajuste,
-                    modulos_novos, inversores_novos,
                     potencia_kwp, geracao_kwh_mes, reducao_percentual,
                     area_arranjos, quantidade_modulos, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
-                    current_user.id, nome_cliente, cpf_cnpj, uc, endereco,
+                    usuario_id, nome_cliente, cpf_cnpj, uc, endereco,
                     cidade, uf, cep, concessionaria, data_projeto,
                     tipo_projeto, modulos_existentes, inversores_existentes,
                     controlador, transdutor_tc, chave_seccionadora,
                     media_consumo, fator_carga, fator_ajuste,
-                    modulos_novos, inversores_novos,
                     potencia_kwp, geracao_kwh_mes, reducao_percentual,
                     area_arranjos, quantidade_modulos, status
                 ))
+                novo_id = cursor.lastrowid
+            
+            # Equipamentos nas tabelas normalizadas
+            salvar_equipamentos(conn, novo_id, modulos_novos, inversores_novos)
+            if historico:
+                project_history.registrar(conn, novo_id)
+            return novo_id, conn.execute('SELECT versao FROM projetos WHERE id = ?', (novo_id,)).fetchone()['versao']
+        
+        try:
+            salvo = escrever(gravar)
+        except project_update.ConflitoVersao as e:
+            return jsonify({
+                'success': False,
+                'message': 'Projeto alterado em outra sessão. Recarregue para continuar.',
+                'versao_atual': e.versao_atual
+            }), 409
+        if salvo is None:
+            return jsonify({'success': False, 'message': 'Projeto não encontrado'}), 404
+        projeto_id, versao = salvo
         
-        return jsonify({'success': True, 'message': 'Projeto salvo com sucesso!'})
+        return jsonify({
+            'success': True,
+            'message': 'Projeto salvo com sucesso!',
+            'projeto_id': projeto_id,
+            'versao': versao,
+            'totais': {
+                'potencia_kwp': potencia_kwp,
+                'quantidade_modulos': quantidade_modulos,
+                'area_arranjos': area_arranjos,
+                'geracao_kwh_mes': geracao_kwh_mes,
+                'reducao_percentual': reducao_percentual
+            }
+        })
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro ao salvar: {str(e)}'}), 400
 
-@app.route('/api/projeto/<int:projeto_id>/gerar-docx', methods=['POST'])
+@rota('/api/projeto/<int:projeto_id>', methods=['PATCH'])
+@login_required
+def atualizar_projeto(projeto_id):
+    """API de atualização parcial (autosave): grava só os campos enviados"""
+    dados = request.json or {}
+    if not isinstance(dados, dict):
+        return jsonify({'success': False, 'message': 'Corpo deve ser um objeto JSON'}), 400
+    dados = dict(dados)
+    versao = dados.pop('versao', None)
+    
+    try:
+        resultado = project_update.atualizar_projeto(current_user.id, projeto_id, versao, dados)
+    except project_update.ConflitoVersao as e:
+        return jsonify({
+            'success': False,
+            'message': 'Projeto alterado em outra sessão. Recarregue para continuar.',
+            'versao_atual': e.versao_atual
+        }), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if resultado is None:
+        return jsonify({'success': False, 'message': 'Projeto não encontrado'}), 404
+    
+    return jsonify({'success': True, **resultado})
+
+@rota('/api/projeto/<int:projeto_id>/revisoes')
+@login_required
+def revisoes_projeto(projeto_id):
+    """API do histórico de revisões do projeto, com os documentos gerados de cada revisão"""
+    with get_db() as conn:
+        projeto = conn.execute(
+            'SELECT versao FROM projetos WHERE id = ? AND usuario_id = ?', (projeto_id, current_user.id)
+        ).fetchone()
+        if not projeto:
+            return jsonify({'success': False, 'message': 'Projeto não encontrado'}), 404
+        revisoes = project_history.listar(conn, projeto_id)
+    
+    return jsonify({'success': True, 'versao_atual': projeto['versao'], 'revisoes': revisoes})
+
+@rota('/api/projeto/<int:projeto_id>/revisoes/<int:versao>')
+@login_required
+def revisao_projeto(projeto_id, versao):
+    """API com o estado do projeto numa revisão"""
+    with get_db() as conn:
+        projeto = conn.execute(
+            'SELECT 1 FROM projetos WHERE id = ? AND usuario_id = ?', (projeto_id, current_user.id)
+        ).fetchone()
+        estado = project_history.reconstruir(conn, projeto_id, versao) if projeto else None
+    
+    if estado is None:
+        return jsonify({'success': False, 'message': 'Revisão não encontrada'}), 404
+    return jsonify({'success': True, 'versao': versao, 'projeto': estado})
+
+@rota('/api/projeto/<int:projeto_id>/gerar-docx', methods=['POST'])
 @login_required
 def gerar_docx(projeto_id):
     """API para gerar DOCX do memorial"""
@@ -313,18 +748,62 @@ def gerar_docx(projeto_id):
                 'SELECT * FROM projetos WHERE id = ? AND usuario_id = ?',
                 (projeto_id, current_user.id)
             ).fetchone()
+            
+            if projeto:
+                # Converter para dicionário com os equipamentos
+                projeto_dict = anexar_equipamentos(conn, [dict(projeto)])[0]
+                revisao_registrada = project_history.existe(conn, projeto_id, projeto['versao'])
         
         if not projeto:
             return jsonify({'success': False, 'message': 'Projeto não encontrado'}), 404
         
-        # Converter para dicionário
-        projeto_dict = dict(projeto)
+        # O documento fica ligado à revisão renderizada; projetos salvos antes do histórico a ganham aqui
+        if current_app.config['HISTORICO_REVISOES'] and not revisao_registrada:
+            escrever(lambda conn: project_history.registrar(conn, projeto_id))
         
-        # Parsear JSON
-        if projeto_dict.get('modulos_novos'):
-            projeto_dict['modulos_novos'] = json.loads(projeto_dict['modulos_novos'])
-        if projeto_dict.get('inversores_novos'):
-            projeto_dict['inversores_novos'] = json.loads(projeto_dict['inversores_novos'])
+        # Modo job: enfileirar e responder imediatamente
+        modo = request.args.get('modo', 'job' if current_app.config['DOCX_JOBS_ENABLED'] else 'sincrono')
+        if modo == 'job':
+            import docx_jobs
+            try:
+                job_id = docx_jobs.enfileirar(
+                    current_user.id, projeto_dict,
+                    current_app.config['DOCX_JOB_WORKERS'], current_app.config['DOCX_JOB_MAX_QUEUE']
+                )
+            except docx_jobs.FilaCheia:
+                response = jsonify({
+                    'success': False,
+                    'message': 'Fila de geração cheia, tente novamente em instantes'
+                })
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            except docx_jobs.PoolIndisponivel:
+                response = jsonify({
+                    'success': False,
+                    'message': 'Geração de DOCX indisponível no momento, tente novamente'
+                })
+                response.headers['Retry-After'] = '5'
+                return response, 503
+            
+            return jsonify({
+                'success': True,
+                'message': 'Geração do DOCX iniciada',
+                'job_id': job_id,
+                'status_url': url_for('status_job', job_id=job_id)
+            }), 202
+        
+        # Modo direto: renderizar em memória e devolver o arquivo na própria resposta
+        from docx_generator import generate_memorial_docx, render_memorial_bytes, nome_download, DOCX_MIMETYPE
+        if modo == 'direto':
+            response = send_file(
+                io.BytesIO(render_memorial_bytes(projeto_dict)),
+                mimetype=DOCX_MIMETYPE,
+                as_attachment=True,
+                download_name=nome_download(projeto_dict)
+            )
+            response.headers['Cache-Control'] = 'no-store'
+            response.headers['X-Projeto-Versao'] = str(projeto_dict['versao'])
+            return response
         
         # Gerar DOCX
         arquivo_path = generate_memorial_docx(projeto_dict)
@@ -332,35 +811,205 @@ def gerar_docx(projeto_id):
         return jsonify({
             'success': True,
             'message': 'DOCX gerado com sucesso!',
-            'arquivo': os.path.basename(arquivo_path)
+            'arquivo': document_store.relativo(arquivo_path),
+            'download_url': url_for('download_arquivo', filename=document_store.relativo(arquivo_path)),
+            'versao_projeto': projeto_dict['versao']
         })
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro ao gerar DOCX: {str(e)}'}), 400
 
-@app.route('/downloads/<filename>')
+@rota('/api/projetos/exportar-memoriais', methods=['POST'])
+@login_required
+def exportar_memoriais():
+    """API para gerar memoriais de vários projetos e baixar como ZIP"""
+    dados = request.json or {}
+    ids = dados.get('ids')
+    filtros = dados.get('filtros') or {}
+    
+    if not ids and not filtros:
+        return jsonify({'success': False, 'message': 'Informe ids ou filtros'}), 400
+    
+    limite = current_app.config['BATCH_EXPORT_MAX_PROJETOS']
+    try:
+        import batch_export
+        projetos = batch_export.buscar_projetos(current_user.id, ids, filtros, limite + 1)
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not projetos:
+        return jsonify({'success': False, 'message': 'Nenhum projeto encontrado'}), 404
+    
+    if len(projetos) > limite:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {limite} projetos por exportação'
+        }), 400
+    
+    if not batch_export.reservar():
+        response = jsonify({
+            'success': False,
+            'message': 'Muitas exportações em andamento, tente novamente em instantes'
+        })
+        response.headers['Retry-After'] = '10'
+        return response, 429
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    stream = batch_export.stream_memoriais_zip(projetos, current_app.config['BATCH_EXPORT_WORKERS'])
+    response = Response(
+        stream_with_context(stream),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="Memoriais_{timestamp}.zip"'}
+    )
+    # A vaga é devolvida quando a resposta termina (ou o cliente desconecta)
+    response.call_on_close(batch_export.liberar)
+    return response
+
+@rota('/api/projetos/recalcular', methods=['POST'])
+@login_required
+def recalcular_projetos():
+    """API para recalcular os totais de dimensionamento de vários projetos"""
+    dados = request.json or {}
+    
+    try:
+        from dimensionamento import recalcular_projetos as recalcular
+        relatorio = recalcular(
+            current_user.id, dados.get('ids'), dados.get('filtros') or {}
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, **relatorio})
+
+@rota('/api/projetos/importar', methods=['POST'])
+@login_required
+def importar_projetos():
+    """API para importar projetos de um arquivo CSV ou JSONL"""
+    arquivo = request.files.get('arquivo')
+    nome = arquivo.filename if arquivo else ''
+    formato = request.args.get('formato') or (
+        'jsonl' if nome.endswith(('.jsonl', '.ndjson')) or 'json' in (request.mimetype or '') else 'csv'
+    )
+    if formato not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': f'Formato inválido: {formato}'}), 400
+    
+    # Upload multipart ou corpo bruto, lidos em streaming
+    stream = arquivo.stream if arquivo else request.stream
+    relatorio = project_import.importar_projetos(
+        current_user.id, project_import.abrir_texto(stream), formato,
+        current_app.config['IMPORT_BATCH_SIZE'], current_app.config['IMPORT_BATCHES_PER_TRANSACTION']
+    )
+    
+    return jsonify({'success': True, **relatorio})
+
+@rota('/api/projetos/exportar')
+@login_required
+def exportar_projetos():
+    """API para exportar os projetos do usuário em CSV ou JSONL"""
+    formato = request.args.get('formato', 'csv')
+    filtros = {campo: request.args[campo] for campo in FILTROS_LISTAGEM if request.args.get(campo)}
+    
+    try:
+        stream = project_export.stream_projetos(
+            current_user.id, formato, filtros, current_app.config['EXPORT_BATCH_SIZE']
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        stream_with_context(stream),
+        content_type=project_export.MIMETYPES[formato],
+        headers={'Content-Disposition': f'attachment; filename="Projetos_{timestamp}.{formato}"'}
+    )
+
+@rota('/api/jobs/<job_id>')
+@login_required
+def status_job(job_id):
+    """API para consultar o status de um job de geração"""
+    import docx_jobs
+    job = docx_jobs.obter_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job não encontrado'}), 404
+    
+    resultado = {
+        'success': True,
+        'job_id': job['id'],
+        'projeto_id': job['projeto_id'],
+        'status': job['status'],
+        'data_criacao': job['data_criacao'],
+        'data_conclusao': job['data_conclusao']
+    }
+    if job['status'] == docx_jobs.STATUS_CONCLUIDO:
+        resultado['arquivo'] = job['arquivo']
+        resultado['download_url'] = url_for('download_arquivo', filename=job['arquivo'])
+    elif job['status'] == docx_jobs.STATUS_ERRO:
+        resultado['message'] = f"Erro ao gerar DOCX: {job['erro']}"
+    
+    return jsonify(resultado)
+
+@rota('/assets/<path:nome>')
+def asset(nome):
+    """Arquivo de static/ com o hash do conteúdo no nome (ver static_assets.asset_url)"""
+    filename, hash_nome = static_assets.resolver(nome)
+    if hash_nome is None:
+        abort(404)
+    
+    # Só o nome com o hash atual é imutável; um hash antigo recebe o conteúdo atual sem cache longo
+    atual = hash_nome == static_assets.fingerprint(filename)
+    response = send_from_directory(
+        current_app.static_folder, filename,
+        max_age=static_assets.MAX_AGE_VERSIONADO if atual else 0
+    )
+    if atual:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+@rota('/downloads/<path:filename>')
 @login_required
 def download_arquivo(filename):
-    """Download de arquivo gerado"""
-    from flask import send_file
-    arquivo_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    """Download de arquivo gerado (só o dono do documento tem acesso)"""
+    arquivo_path = document_store.abrir(filename, current_user.id)
     
-    if os.path.exists(arquivo_path):
-        return send_file(arquivo_path, as_attachment=True)
+    if arquivo_path:
+        return send_file(arquivo_path, as_attachment=True, download_name=os.path.basename(arquivo_path))
     
     flash('Arquivo não encontrado', 'error')
     return redirect(url_for('dashboard'))
 
-@app.route('/projeto/<int:projeto_id>/deletar', methods=['POST'])
+@rota('/api/templates/cache')
+@operacional
+def templates_cache():
+    """Estatísticas do cache de templates DOCX e de memoriais gerados"""
+    return jsonify({
+        **_template_stats(),
+        'memoriais': memorial_cache.stats(),
+        'documentos': document_store.stats()
+    })
+
+@rota('/api/db/pool')
+@operacional
+def db_pool():
+    """Estatísticas do pool de conexões do banco de dados"""
+    return jsonify(pool_stats())
+
+@rota('/api/usuarios/cache')
+@operacional
+def usuarios_cache():
+    """Estatísticas do cache de usuários da sessão"""
+    return jsonify(current_app.extensions['user_cache'].stats())
+
+@rota('/projeto/<int:projeto_id>/deletar', methods=['POST'])
 @login_required
 def deletar_projeto(projeto_id):
     """Deletar projeto"""
     try:
-        with get_db() as conn:
-            conn.execute(
-                'DELETE FROM projetos WHERE id = ? AND usuario_id = ?',
-                (projeto_id, current_user.id)
-            )
+        usuario_id = current_user.id
+        escrever(lambda conn: conn.execute(
+            'DELETE FROM projetos WHERE id = ? AND usuario_id = ?',
+            (projeto_id, usuario_id)
+        ).rowcount)
         
         flash('Projeto deletado com sucesso', 'success')
         return redirect(url_for('dashboard'))
@@ -373,8 +1022,4 @@ def deletar_projeto(projeto_id):
 # ============================================================================
 
 if __name__ == '__main__':
-    # Inicializar banco de dados se não existir
-    if not os.path.exists(os.path.join(os.path.dirname(__file__), 'solar_memorials.db')):
-        init_database()
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
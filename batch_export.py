@@ -0,0 +1,175 @@
+import os
+import re
+import sys
+import zipfile
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from database.connection import get_db
+from database.listagem import FILTROS as FILTROS_PERMITIDOS
+from database.equipamentos import anexar_equipamentos
+from docx_generator import render_memorial_bytes
+import metrics
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Exportações simultâneas no processo; as demais recebem 429 (ver reservar)
+_exportacoes = threading.BoundedSemaphore(Config.BATCH_EXPORT_MAX_SIMULTANEAS)
+
+def _contexto():
+    """forkserver (ou spawn): os filhos não herdam as threads e locks do processo web"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(['docx_generator'])
+        return contexto
+    return multiprocessing.get_context('spawn')
+
+def _get_executor(workers):
+    """Pool de renderização compartilhado pelas exportações do processo"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=_contexto())
+            _executor_pid = os.getpid()
+        return _executor
+
+def _descartar_executor(executor):
+    """Descarta um pool quebrado; a próxima exportação cria outro"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def reservar():
+    """Reserva uma das BATCH_EXPORT_MAX_SIMULTANEAS vagas de exportação; False se não houver"""
+    return _exportacoes.acquire(blocking=False)
+
+def liberar():
+    _exportacoes.release()
+
+class _ChunkBuffer:
+    """Destino não-seekable do ZipFile: acumula os bytes escritos até serem consumidos"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        dados = b''.join(self._chunks)
+        self._chunks = []
+        return dados
+
+def buscar_projetos(usuario_id, ids=None, filtros=None, limite=None):
+    """Retorna os projetos do usuário selecionados por lista de ids e/ou filtros"""
+    where = ['usuario_id = ?']
+    params = [usuario_id]
+
+    if ids:
+        where.append(f"id IN ({', '.join('?' for _ in ids)})")
+        params.extend(int(i) for i in ids)
+
+    for campo, valor in (filtros or {}).items():
+        if campo not in FILTROS_PERMITIDOS:
+            raise ValueError(f'Filtro inválido: {campo}')
+        where.append(f'{campo} = ?')
+        params.append(valor)
+
+    query = f"SELECT * FROM projetos WHERE {' AND '.join(where)} ORDER BY id"
+    if limite:
+        query += ' LIMIT ?'
+        params.append(limite)
+
+    with get_db() as conn:
+        projetos = [dict(row) for row in conn.execute(query, params)]
+        return anexar_equipamentos(conn, projetos)
+
+def nome_arquivo_zip(projeto):
+    """Nome do memorial dentro do ZIP, único por projeto"""
+    cliente = re.sub(r'[\\/:*?"<>|\s]+', '_', projeto.get('nome_cliente') or '').strip('_')
+    return f"Memorial_{cliente or 'projeto'}_{projeto['id']}.docx"
+
+def stream_memoriais_zip(projetos, workers=None):
+    """Gera os memoriais em paralelo e produz o ZIP em pedaços, na ordem em que ficam prontos.
+
+    Usa o pool compartilhado do processo; no máximo 2 documentos por worker desta
+    exportação ficam em memória ao mesmo tempo.
+    """
+    workers = workers or Config.BATCH_EXPORT_WORKERS
+    executor = _get_executor(workers)
+    buffer = _ChunkBuffer()
+    pendentes = iter(projetos)
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        em_execucao = {}
+
+        def submeter():
+            for projeto in pendentes:
+                try:
+                    em_execucao[executor.submit(metrics.com_fases, render_memorial_bytes, projeto)] = projeto
+                except (BrokenProcessPool, RuntimeError):
+                    _descartar_executor(executor)
+                    raise
+                if len(em_execucao) >= workers * 2:
+                    break
+
+        submeter()
+        while em_execucao:
+            prontos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for future in prontos:
+                projeto = em_execucao.pop(future)
+                try:
+                    conteudo, fases = future.result()
+                    metrics.observar_fases(fases)
+                    arquivo_zip.writestr(nome_arquivo_zip(projeto), conteudo)
+                except BrokenProcessPool:
+                    _descartar_executor(executor)
+                    raise
+                except Exception as e:
+                    arquivo_zip.writestr(
+                        f"ERRO_{nome_arquivo_zip(projeto)}.txt",
+                        f"Erro ao gerar memorial do projeto {projeto['id']}: {e}"
+                    )
+                yield buffer.drain()
+            submeter()
+
+    # Diretório central do ZIP
+    yield buffer.drain()
+
+def main(argv=None):
+    """Exporta memoriais de vários projetos para um arquivo ZIP"""
+    parser = argparse.ArgumentParser(description='Exportação em lote de memoriais DOCX')
+    parser.add_argument('--usuario', type=int, required=True, help='ID do usuário dono dos projetos')
+    parser.add_argument('--ids', type=int, nargs='*', help='IDs dos projetos')
+    for campo in FILTROS_PERMITIDOS:
+        parser.add_argument(f'--{campo}', help=f'Filtrar por {campo}')
+    parser.add_argument('--workers', type=int, default=None, help='Processos de renderização')
+    parser.add_argument('-o', '--saida', default='memoriais.zip', help='Arquivo ZIP de saída')
+    args = parser.parse_args(argv)
+
+    filtros = {campo: getattr(args, campo) for campo in FILTROS_PERMITIDOS if getattr(args, campo)}
+    projetos = buscar_projetos(args.usuario, args.ids, filtros)
+    if not projetos:
+        print('Nenhum projeto encontrado', file=sys.stderr)
+        return 1
+
+    with open(args.saida, 'wb') as f:
+        for chunk in stream_memoriais_zip(projetos, args.workers):
+            f.write(chunk)
+
+    print(f"✓ {len(projetos)} memoriais exportados em: {args.saida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
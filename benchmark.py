@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import contextlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from werkzeug.security import generate_password_hash
+from config import Config
+from database import connection
+from database.init_db import init_database
+from database.equipamentos import inserir_equipamentos_lote
+
+CENARIOS = ('salvar', 'dashboard', 'editar', 'docx', 'docx-direto')
+
+UFS = ('SP', 'MG', 'RJ', 'PR', 'SC', 'RS', 'BA', 'GO')
+TIPOS_PROJETO = ('Instalação Nova', 'Ampliação', 'Grid Zero', 'Art. 73-A')
+STATUS = ('Rascunho', 'Em Andamento', 'Concluído')
+
+def _catalogo(rng, modelos):
+    """Modelos de módulos e inversores usados pelos projetos sintéticos"""
+    return {
+        'modulos': [
+            {'modelo': f'Modulo Bench {i}', 'potencia': rng.choice((450, 500, 550, 600)),
+             'largura_mm': 1134, 'altura_mm': rng.choice((2094, 2278, 2384))}
+            for i in range(modelos)
+        ],
+        'inversores': [
+            {'modelo': f'Inversor Bench {i}', 'potencia': rng.choice((5000, 8000, 10000, 15000))}
+            for i in range(max(modelos // 5, 1))
+        ],
+    }
+
+def _equipamentos(rng, catalogo, modulos, inversores):
+    return (
+        [{**rng.choice(catalogo['modulos']), 'quantidade': rng.randint(4, 40)} for _ in range(modulos)],
+        [{**rng.choice(catalogo['inversores']), 'quantidade': rng.randint(1, 3)} for _ in range(inversores)],
+    )
+
+def criar_banco(caminho, usuarios, projetos, modulos, inversores, modelos, seed):
+    """Cria um banco SQLite sintético e retorna {usuario_id: [projeto_ids]}"""
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    with contextlib.redirect_stdout(sys.stderr):
+        init_database(caminho)
+
+    rng = random.Random(seed)
+    catalogo = _catalogo(rng, modelos)
+    senha_hash = generate_password_hash('benchmark')
+    mapa = {}
+
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    with conn:
+        for u in range(usuarios):
+            usuario_id = conn.execute(
+                'INSERT INTO usuarios (email, nome, senha_hash) VALUES (?, ?, ?)',
+                (f'bench{u}@example.com', f'Usuário {u}', senha_hash)
+            ).lastrowid
+            ids = []
+            lote = []
+            for p in range(projetos):
+                mods, invs = _equipamentos(rng, catalogo, modulos, inversores)
+                kwp = sum(m['potencia'] * m['quantidade'] for m in mods) / 1000
+                projeto_id = conn.execute(
+                    '''INSERT INTO projetos (
+                       usuario_id, nome_cliente, cpf_cnpj, uc, endereco, cidade, uf, concessionaria,
+                       data_projeto, tipo_projeto, media_consumo, fator_carga, fator_ajuste,
+                       potencia_kwp, quantidade_modulos, status
+                       ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (usuario_id, f'Cliente {u}-{p}', f'{rng.randint(0, 99999999999):011d}',
+                     str(rng.randint(10**9, 10**10 - 1)), f'Rua {p}, {rng.randint(1, 999)}',
+                     f'Cidade {rng.randint(1, 50)}', rng.choice(UFS), rng.choice(('EDP', 'CEMIG', 'CPFL')),
+                     f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', rng.choice(TIPOS_PROJETO),
+                     rng.randint(300, 5000), round(rng.uniform(0.3, 0.9), 2), round(rng.uniform(0.8, 1.2), 2),
+                     kwp, sum(m['quantidade'] for m in mods), rng.choice(STATUS))
+                ).lastrowid
+                ids.append(projeto_id)
+                lote.append((projeto_id, mods, invs))
+            inserir_equipamentos_lote(conn, lote)
+            mapa[usuario_id] = ids
+    conn.close()
+    return mapa, catalogo
+
+class _Cliente:
+    """Cliente de teste Flask autenticado como um usuário sintético"""
+
+    def __init__(self, app, usuario_id, projeto_ids, catalogo, args, seed):
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(usuario_id)
+            sess['_fresh'] = True
+        self.projeto_ids = projeto_ids
+        self.catalogo = catalogo
+        self.args = args
+        self.rng = random.Random(seed)
+
+    def requisicao(self, cenario):
+        projeto_id = self.rng.choice(self.projeto_ids)
+        if cenario == 'dashboard':
+            return self.client.get('/dashboard')
+        if cenario == 'editar':
+            return self.client.get(f'/projeto/{projeto_id}')
+        if cenario == 'docx':
+            return self.client.post(f'/api/projeto/{projeto_id}/gerar-docx?modo=sincrono')
+        if cenario == 'docx-direto':
+            return self.client.post(f'/api/projeto/{projeto_id}/gerar-docx?modo=direto')
+
+        mods, invs = _equipamentos(self.rng, self.catalogo, self.args.modulos, self.args.inversores)
+        return self.client.post('/api/projeto/salvar', json={
+            'projeto_id': projeto_id,
+            'nome_cliente': f'Cliente {projeto_id}',
+            'cidade': 'Cidade Bench',
+            'uf': self.rng.choice(UFS),
+            'tipo_projeto': 'Instalação Nova',
+            'media_consumo': self.rng.randint(300, 5000),
+            'modulos_novos': mods,
+            'inversores_novos': invs,
+            'status': self.rng.choice(STATUS),
+        })
+
+def _percentis(latencias):
+    ms = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {
+        'media': round(float(ms.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'max': round(float(ms.max()), 3),
+    }
+
+def executar_cenario(clientes, cenario, requisicoes, aquecimento=5):
+    """Executa as requisições do cenário distribuídas entre os clientes, uma thread por cliente"""
+    for cliente in clientes:
+        for _ in range(aquecimento):
+            cliente.requisicao(cenario)
+
+    latencias = []
+    erros = 0
+    lock = threading.Lock()
+    restantes = iter(range(requisicoes))
+
+    def trabalhar(cliente):
+        nonlocal erros
+        locais, falhas = [], 0
+        while True:
+            with lock:
+                if next(restantes, None) is None:
+                    break
+            inicio = time.perf_counter()
+            resposta = cliente.requisicao(cenario)
+            locais.append(time.perf_counter() - inicio)
+            if resposta.status_code >= 400:
+                falhas += 1
+        with lock:
+            latencias.extend(locais)
+            erros += falhas
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clientes)) as executor:
+        list(executor.map(trabalhar, clientes))
+    duracao = time.perf_counter() - inicio
+
+    return {
+        'cenario': cenario,
+        'clientes': len(clientes),
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'duracao_s': round(duracao, 3),
+        'throughput_rps': round(len(latencias) / duracao, 2) if duracao else 0.0,
+        'latencia_ms': _percentis(latencias),
+    }
+
+# Roda num interpretador novo: mede a importação de app e o create_app a frio
+_SCRIPT_INICIALIZACAO = """
+import sys, json, time
+inicio = time.perf_counter()
+import app
+importacao = time.perf_counter() - inicio
+from config import Config
+from database import connection
+connection.DATABASE_PATH, Config.UPLOAD_FOLDER = sys.argv[1], sys.argv[2]
+aplicacao = app.create_app(aquecer=sys.argv[3] == '1')
+print(json.dumps({**aplicacao.extensions['inicializacao'], 'importacao_s': importacao,
+                  'total_s': time.perf_counter() - inicio}))
+"""
+
+def medir_inicializacao(caminho, uploads, aquecer, repeticoes):
+    """Mediana dos tempos de inicialização em processos novos"""
+    amostras = []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, '-c', _SCRIPT_INICIALIZACAO, caminho, uploads, '1' if aquecer else '0'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout
+        amostras.append(json.loads(saida.strip().splitlines()[-1]))
+    return {
+        chave: round(float(np.median([a[chave] for a in amostras])), 4)
+        for chave in amostras[0]
+    }
+
+def comparar(atual, anterior):
+    """Variação percentual de throughput e p95 em relação a um resultado anterior"""
+    base = {(r['cenario'], r['clientes']): r for r in anterior['resultados']}
+    comparacao = []
+    for r in atual['resultados']:
+        b = base.get((r['cenario'], r['clientes']))
+        if not b:
+            continue
+        comparacao.append({
+            'cenario': r['cenario'],
+            'clientes': r['clientes'],
+            'throughput_var_pct': round((r['throughput_rps'] / b['throughput_rps'] - 1) * 100, 2)
+                                  if b['throughput_rps'] else None,
+            'p95_var_pct': round((r['latencia_ms']['p95'] / b['latencia_ms']['p95'] - 1) * 100, 2)
+                           if b['latencia_ms']['p95'] else None,
+        })
+    return comparacao
+
+def main(argv=None):
+    """Benchmark das rotas de salvar, dashboard, editor e geração de DOCX"""
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos críticos da aplicação')
+    parser.add_argument('--usuarios', type=int, default=5)
+    parser.add_argument('--projetos', type=int, default=200, help='Projetos por usuário')
+    parser.add_argument('--modulos', type=int, default=2, help='Linhas de módulos por projeto')
+    parser.add_argument('--inversores', type=int, default=1, help='Linhas de inversores por projeto')
+    parser.add_argument('--modelos', type=int, default=50, help='Modelos de módulo no catálogo')
+    parser.add_argument('--requisicoes', type=int, default=200, help='Requisições por cenário')
+    parser.add_argument('--requisicoes-docx', type=int, default=20, help='Requisições do cenário docx')
+    parser.add_argument('--clientes', type=int, default=8, help='Clientes do teste concorrente')
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help='Cenários separados por vírgula')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='Caminho do banco sintético (padrão: diretório temporário)')
+    parser.add_argument('--memorial-cache', action='store_true', help='Mantém o cache de memoriais ligado')
+    parser.add_argument('--repeticoes-inicializacao', type=int, default=3,
+                        help='Processos novos para medir a inicialização (0 desliga)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de saída (padrão: saída padrão)')
+    args = parser.parse_args(argv)
+
+    cenarios = [c.strip() for c in args.cenarios.split(',') if c.strip()]
+    invalidos = set(cenarios) - set(CENARIOS)
+    if invalidos:
+        parser.error(f"cenários inválidos: {', '.join(sorted(invalidos))}")
+
+    tmp = tempfile.mkdtemp(prefix='solar_bench_')
+    caminho = args.db or os.path.join(tmp, 'benchmark.db')
+    inicio = time.perf_counter()
+    mapa, catalogo = criar_banco(caminho, args.usuarios, args.projetos, args.modulos,
+                                 args.inversores, args.modelos, args.seed)
+    tempo_banco = time.perf_counter() - inicio
+
+    inicializacao = {}
+    if args.repeticoes_inicializacao > 0:
+        for aquecer in (False, True):
+            inicializacao['com_aquecimento' if aquecer else 'sem_aquecimento'] = medir_inicializacao(
+                caminho, os.path.join(tmp, 'uploads'), aquecer, args.repeticoes_inicializacao
+            )
+    
+    # O pool passa a abrir conexões no banco sintético; os memoriais vão para o diretório temporário
+    connection.pool.close_all()
+    connection.DATABASE_PATH = caminho
+    Config.UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+    Config.MEMORIAL_CACHE_ENABLED = args.memorial_cache
+    from app import app
+    app.config.update(UPLOAD_FOLDER=Config.UPLOAD_FOLDER, MEMORIAL_CACHE_ENABLED=args.memorial_cache)
+
+    usuarios = sorted(mapa)
+    resultados = []
+    for cenario in cenarios:
+        requisicoes = args.requisicoes_docx if cenario.startswith('docx') else args.requisicoes
+        for n in sorted({1, args.clientes}):
+            clientes = [
+                _Cliente(app, usuarios[i % len(usuarios)], mapa[usuarios[i % len(usuarios)]],
+                         catalogo, args, args.seed + i)
+                for i in range(n)
+            ]
+            resultados.append(executar_cenario(clientes, cenario, requisicoes))
+    connection.pool.close_all()
+
+    relatorio = {
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('saida', 'comparar')},
+        'ambiente': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'banco': {'caminho': caminho, 'criacao_s': round(tempo_banco, 3),
+                  'projetos': sum(len(ids) for ids in mapa.values())},
+        'inicializacao': inicializacao,
+        'resultados': resultados,
+    }
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            relatorio['comparacao'] = comparar(relatorio, json.load(f))
+
+    saida = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(saida + '\n')
+    else:
+        print(saida)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+
+class Config:
+    """Configurações da aplicação Flask"""
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///solar_memorials.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Configurações de upload
+    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+    ALLOWED_EXTENSIONS = {'docx', 'doc'}
+    
+    # Configurações de sessão
+    PERMANENT_SESSION_LIFETIME = 86400  # 24 horas
+    SESSION_COOKIE_SECURE = False  # Mude para True em produção com HTTPS
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    
+    # Geração assíncrona de memoriais
+    DOCX_JOBS_ENABLED = os.environ.get('DOCX_JOBS_ENABLED', '1') == '1'
+    DOCX_JOB_WORKERS = int(os.environ.get('DOCX_JOB_WORKERS', os.cpu_count() or 2))
+    DOCX_JOB_MAX_QUEUE = int(os.environ.get('DOCX_JOB_MAX_QUEUE', 50))
+    DOCX_JOB_TIMEOUT_S = int(os.environ.get('DOCX_JOB_TIMEOUT_S', 600))  # jobs pendentes há mais tempo viram erro
+    DOCX_JOB_RETENCAO_DIAS = int(os.environ.get('DOCX_JOB_RETENCAO_DIAS', 7))  # jobs encerrados são apagados depois
+    
+    # Exportação em lote de memoriais
+    BATCH_EXPORT_WORKERS = int(os.environ.get('BATCH_EXPORT_WORKERS', os.cpu_count() or 2))
+    BATCH_EXPORT_MAX_PROJETOS = int(os.environ.get('BATCH_EXPORT_MAX_PROJETOS', 500))
+    BATCH_EXPORT_MAX_SIMULTANEAS = int(os.environ.get('BATCH_EXPORT_MAX_SIMULTANEAS', 2))  # por processo
+    
+    # Cache de memoriais gerados (por conteúdo)
+    MEMORIAL_CACHE_ENABLED = os.environ.get('MEMORIAL_CACHE_ENABLED', '1') == '1'
+    MEMORIAL_CACHE_MAX_BYTES = int(os.environ.get('MEMORIAL_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+    
+    # Banco de dados SQLite
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))  # ms
+    DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+    DB_CACHED_STATEMENTS = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+    
+    # Escritor único: mutações das rotas aplicadas por uma thread em lotes (group commit)
+    DB_WRITE_QUEUE = os.environ.get('DB_WRITE_QUEUE', '0') == '1'
+    DB_WRITE_BATCH_MAX = int(os.environ.get('DB_WRITE_BATCH_MAX', 64))
+    DB_WRITE_BATCH_WAIT_MS = float(os.environ.get('DB_WRITE_BATCH_WAIT_MS', 0))  # espera por mais escritas antes do commit
+    DB_WRITE_TIMEOUT_S = float(os.environ.get('DB_WRITE_TIMEOUT_S', 30))  # espera máxima pelo commit de uma escrita
+    
+    # Cache de usuários da sessão (Flask-Login)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))  # segundos
+    
+    # Hash de senhas: custo do KDF (formato do Werkzeug) e pool limitado que o calcula, por
+    # processo. Pool + fila abaixo das threads do worker (GUNICORN_THREADS) para sobrar
+    # thread para as outras rotas durante uma rajada de logins
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(2, os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_FILA = int(os.environ.get('PASSWORD_HASH_MAX_FILA', 4))  # hashes aguardando além dos workers
+    PASSWORD_HASH_ESPERA_S = float(os.environ.get('PASSWORD_HASH_ESPERA_S', 2.0))  # espera por vaga antes do 503
+    
+    # Limite de tentativas de login com senha errada (por processo)
+    LOGIN_JANELA_S = int(os.environ.get('LOGIN_JANELA_S', 300))
+    LOGIN_MAX_FALHAS_IP = int(os.environ.get('LOGIN_MAX_FALHAS_IP', 50))
+    LOGIN_MAX_FALHAS_EMAIL = int(os.environ.get('LOGIN_MAX_FALHAS_EMAIL', 5))
+    
+    # Proxies reversos confiáveis na frente da aplicação (0 = acesso direto). Com N > 0, o IP
+    # do cliente (limites de login) e o esquema vêm de X-Forwarded-For/-Proto via ProxyFix
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
+    # Importação em lote de projetos
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    IMPORT_BATCHES_PER_TRANSACTION = int(os.environ.get('IMPORT_BATCHES_PER_TRANSACTION', 10))
+    
+    # Exportação em lote de projetos (linhas por fetchmany)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    
+    # Dimensionamento no servidor (potência, área, geração e redução)
+    DIMENSIONAMENTO_NO_SALVAR = os.environ.get('DIMENSIONAMENTO_NO_SALVAR', '1') == '1'
+    DIMENSIONAMENTO_RENDIMENTO = float(os.environ.get('DIMENSIONAMENTO_RENDIMENTO', 0.80))
+    DIMENSIONAMENTO_IRRADIACAO_PADRAO = float(os.environ.get('DIMENSIONAMENTO_IRRADIACAO_PADRAO', 5.0))  # kWh/m²/dia
+    DIMENSIONAMENTO_AREA_MODULO_M2 = float(os.environ.get('DIMENSIONAMENTO_AREA_MODULO_M2', 2.6))
+    DIMENSIONAMENTO_LOTE = int(os.environ.get('DIMENSIONAMENTO_LOTE', 2000))
+    
+    # Instrumentação (/metrics no formato Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # se definido, exigido como Bearer em /metrics e nas estatísticas /api/*/cache, /api/db/pool
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 0))  # 0 desliga o log de requisições lentas
+    
+    # Retenção dos documentos gerados em uploads/
+    DOCUMENTOS_MAX_BYTES = int(os.environ.get('DOCUMENTOS_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+    DOCUMENTOS_MAX_IDADE_DIAS = int(os.environ.get('DOCUMENTOS_MAX_IDADE_DIAS', 30))
+    DOCUMENTOS_VARREDURA_INTERVALO = int(os.environ.get('DOCUMENTOS_VARREDURA_INTERVALO', 3600))  # segundos, 0 desliga
+    
+    # Histórico de revisões: snapshot completo a cada N revisões, deltas entre eles
+    HISTORICO_REVISOES = os.environ.get('HISTORICO_REVISOES', '1') == '1'
+    HISTORICO_SNAPSHOT_INTERVALO = int(os.environ.get('HISTORICO_SNAPSHOT_INTERVALO', 16))
+    
+    # Inicialização: compila o template do memorial em create_app (antes do fork com preload)
+    PREWARM_TEMPLATES = os.environ.get('PREWARM_TEMPLATES', '0') == '1'
+    
+    # Cache HTTP: segundos entre dois cálculos do hash de static/ e templates/ usado nos ETags das páginas
+    PAGINAS_VERSAO_TTL = int(os.environ.get('PAGINAS_VERSAO_TTL', 30))
@@ -0,0 +1,93 @@
+import re
+from database.connection import get_db
+from database.init_db import init_database
+
+# Mês de referência do projeto (o mesmo usado pelos triggers de resumo_mensal)
+MES_SQL = "COALESCE(strftime('%Y-%m', COALESCE(NULLIF(data_projeto, ''), data_criacao)), '0000-00')"
+
+# Dimensões da análise e a expressão do valor de cada uma (espelhadas nos triggers)
+DIMENSOES = {
+    'total': "''",
+    'uf': "COALESCE(uf, '')",
+    'cidade': "COALESCE(uf, '') || '/' || COALESCE(cidade, '')",
+    'concessionaria': "COALESCE(concessionaria, '')",
+    'tipo_projeto': "COALESCE(tipo_projeto, '')",
+}
+
+# Agrupamento do período: mês ('2025-03') ou ano ('2025')
+GRANULARIDADES = {'mes': 7, 'ano': 4}
+
+_MES_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+def _validar_mes(valor, campo):
+    if valor is not None and not _MES_RE.match(valor):
+        raise ValueError(f'{campo}: use o formato AAAA-MM')
+    return valor
+
+def consultar(conn, usuario_id, dimensao='total', inicio=None, fim=None, granularidade='mes'):
+    """Série e totais do período a partir de resumo_mensal.
+
+    O custo depende do número de meses e de valores distintos da dimensão no
+    período, não da quantidade de projetos.
+    """
+    if dimensao not in DIMENSOES:
+        raise ValueError(f'Dimensão inválida: {dimensao}')
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f'Granularidade inválida: {granularidade}')
+    _validar_mes(inicio, 'inicio')
+    _validar_mes(fim, 'fim')
+
+    where = ['usuario_id = ?', 'dimensao = ?', 'projetos <> 0']
+    params = [usuario_id, dimensao]
+    if inicio:
+        where.append('mes >= ?')
+        params.append(inicio)
+    if fim:
+        where.append('mes <= ?')
+        params.append(fim)
+    filtro = ' AND '.join(where)
+
+    serie = [dict(row) for row in conn.execute(
+        f'''SELECT substr(mes, 1, {GRANULARIDADES[granularidade]}) as periodo, valor,
+                   SUM(projetos) as projetos,
+                   ROUND(SUM(potencia_kwp), 3) as potencia_kwp,
+                   SUM(quantidade_modulos) as quantidade_modulos
+            FROM resumo_mensal WHERE {filtro}
+            GROUP BY periodo, valor
+            ORDER BY periodo, valor''',
+        params
+    )]
+    totais = [dict(row) for row in conn.execute(
+        f'''SELECT valor, SUM(projetos) as projetos,
+                   ROUND(SUM(potencia_kwp), 3) as potencia_kwp,
+                   SUM(quantidade_modulos) as quantidade_modulos
+            FROM resumo_mensal WHERE {filtro}
+            GROUP BY valor
+            ORDER BY potencia_kwp DESC''',
+        params
+    )]
+    return serie, totais
+
+def rebuild_resumo_mensal():
+    """Recalcula a tabela resumo_mensal a partir de todos os projetos"""
+    with get_db() as conn:
+        conn.execute('DELETE FROM resumo_mensal')
+        for dimensao, expressao in DIMENSOES.items():
+            conn.execute(
+                f'''INSERT INTO resumo_mensal
+                    (usuario_id, dimensao, valor, mes, projetos, potencia_kwp, quantidade_modulos)
+                    SELECT usuario_id, ?, {expressao} as valor, {MES_SQL} as mes, COUNT(*),
+                           COALESCE(SUM(potencia_kwp), 0), COALESCE(SUM(quantidade_modulos), 0)
+                    FROM projetos
+                    GROUP BY usuario_id, valor, mes''',
+                (dimensao,)
+            )
+        total = conn.execute('SELECT COUNT(*) as count FROM resumo_mensal').fetchone()['count']
+
+    return total
+
+if __name__ == '__main__':
+    # Garante a tabela e os triggers em bancos criados antes da análise
+    init_database()
+    total = rebuild_resumo_mensal()
+    print(f"✓ Resumo mensal recalculado ({total} linhas)")
@@ -0,0 +1,70 @@
+import re
+from database.connection import get_db
+from database.init_db import init_database
+
+# Pesos do bm25 por coluna de projetos_fts (usuario não conta para o ranking)
+PESOS_BM25 = (0.0, 10.0, 8.0, 8.0, 2.0, 3.0)
+
+_TERMO_RE = re.compile(r'\w+', re.UNICODE)
+
+def montar_consulta(termo):
+    """Converte o texto digitado numa consulta FTS5 com prefixo em cada palavra.
+
+    Retorna None quando não há nenhuma palavra pesquisável.
+    """
+    palavras = _TERMO_RE.findall(termo or '')
+    if not palavras:
+        return None
+
+    consulta = ' '.join(f'"{p}"*' for p in palavras)
+    # CPF/CNPJ/UC digitado com pontuação também casa com o valor salvo só com dígitos
+    digitos = ''.join(palavras)
+    if len(palavras) > 1 and digitos.isdigit():
+        consulta = f'({consulta}) OR "{digitos}"*'
+    return consulta
+
+def buscar_projetos(conn, usuario_id, termo, limite=20):
+    """Busca projetos do usuário por cliente, CPF/CNPJ, UC, endereço ou cidade"""
+    consulta = montar_consulta(termo)
+    if consulta is None:
+        return []
+
+    pesos = ', '.join(str(p) for p in PESOS_BM25)
+    rows = conn.execute(
+        f'''SELECT p.id, p.nome_cliente, p.cpf_cnpj, p.uc, p.endereco, p.cidade, p.uf,
+                   p.potencia_kwp, p.status, p.data_atualizacao
+            FROM (
+                SELECT rowid, bm25(projetos_fts, {pesos}) as score
+                FROM projetos_fts
+                WHERE projetos_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ) f
+            JOIN projetos p ON p.id = f.rowid
+            ORDER BY f.score''',
+        (f'usuario:"u{int(usuario_id)}" AND ({consulta})', limite)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def rebuild_indice_busca():
+    """Recria o índice de busca a partir de todos os projetos"""
+    with get_db() as conn:
+        conn.execute("INSERT INTO projetos_fts (projetos_fts) VALUES ('delete-all')")
+        conn.execute('''
+            INSERT INTO projetos_fts (rowid, usuario, nome_cliente, documento, uc, endereco, cidade)
+            SELECT id, 'u' || usuario_id, nome_cliente,
+                   COALESCE(cpf_cnpj, '') || ' ' || replace(replace(replace(replace(COALESCE(cpf_cnpj, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+                   COALESCE(uc, '') || ' ' || replace(replace(replace(replace(COALESCE(uc, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+                   endereco, cidade
+            FROM projetos
+        ''')
+        conn.execute("INSERT INTO projetos_fts (projetos_fts) VALUES ('optimize')")
+        total = conn.execute('SELECT COUNT(*) as count FROM projetos').fetchone()['count']
+
+    return total
+
+if __name__ == '__main__':
+    # Garante a tabela FTS e os triggers em bancos criados antes da busca
+    init_database()
+    total = rebuild_indice_busca()
+    print(f"✓ Índice de busca recriado com {total} projetos")
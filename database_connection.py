@@ -0,0 +1,191 @@
+import sqlite3
+import os
+import time
+import threading
+from contextlib import contextmanager
+from config import Config
+import metrics
+
+DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'solar_memorials.db')
+
+# PRAGMAs aplicados em cada conexão nova
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -Config.DB_CACHE_SIZE_KB),  # negativo = KiB
+    ('mmap_size', Config.DB_MMAP_SIZE),
+    ('temp_store', 'MEMORY'),
+)
+
+def _medir(executar, sql, *args):
+    inicio = time.perf_counter()
+    try:
+        resultado = executar(sql, *args)
+    except Exception:
+        metrics.registrar_sql(sql, time.perf_counter() - inicio, erro=True)
+        raise
+    metrics.registrar_sql(sql, time.perf_counter() - inicio)
+    return resultado
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que registra tempo e contagem de cada statement em metrics"""
+
+    def execute(self, sql, *args):
+        return _medir(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _medir(super().executemany, sql, *args)
+
+    def executescript(self, sql):
+        return _medir(super().executescript, sql)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos atalhos execute* e cursores passam pela instrumentação"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, *args):
+        return _medir(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _medir(super().executemany, sql, *args)
+
+    def executescript(self, sql):
+        return _medir(super().executescript, sql)
+
+def get_connection():
+    """Retorna uma conexão com o banco de dados SQLite"""
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=Config.DB_BUSY_TIMEOUT / 1000,
+        cached_statements=Config.DB_CACHED_STATEMENTS,
+        check_same_thread=False,
+        factory=InstrumentedConnection if Config.METRICS_ENABLED else sqlite3.Connection
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT)}')
+    for pragma, valor in PRAGMAS:
+        conn.execute(f'PRAGMA {pragma} = {valor}')
+    return conn
+
+class ConnectionPool:
+    """Pool de conexões SQLite reutilizadas entre requisições.
+
+    As conexões ociosas ficam numa pilha (a mais recente é reutilizada primeiro,
+    com cache de página e de statements ainda quente). Quando todas estão em uso,
+    uma conexão extra é aberta e fechada ao ser devolvida se a pilha estiver cheia.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self.em_uso = 0
+        self.criadas = 0
+        self.reutilizadas = 0
+        self.descartadas = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo filho após fork: não reutilizar conexões herdadas
+                self._reset()
+            self.em_uso += 1
+            if self._idle:
+                self.reutilizadas += 1
+                return self._idle.pop()
+            self.criadas += 1
+        try:
+            return get_connection()
+        except Exception:
+            with self._lock:
+                self.em_uso -= 1
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self.em_uso -= 1
+            if self._pid == os.getpid() and len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+            self.descartadas += 1
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            total = self.criadas + self.reutilizadas
+            return {
+                'max_size': self.max_size,
+                'ociosas': len(self._idle),
+                'em_uso': self.em_uso,
+                'criadas': self.criadas,
+                'reutilizadas': self.reutilizadas,
+                'descartadas': self.descartadas,
+                'taxa_reuso': round(self.reutilizadas / total, 4) if total else 0.0,
+            }
+
+pool = ConnectionPool(Config.DB_POOL_SIZE)
+
+@contextmanager
+def get_db():
+    """Context manager para conexão com banco de dados"""
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+def pool_stats():
+    """Estatísticas do pool de conexões"""
+    return pool.stats()
+
+def execute_query(query, params=None):
+    """Executa uma query e retorna os resultados"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return cursor.fetchall()
+
+def execute_single(query, params=None):
+    """Executa uma query e retorna um único resultado"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return cursor.fetchone()
+
+def execute_insert(query, params):
+    """Executa uma inserção e retorna o ID"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.lastrowid
+
+def execute_update(query, params):
+    """Executa uma atualização"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.rowcount
@@ -0,0 +1,233 @@
+import json
+import math
+from database.connection import get_db
+from database.init_db import init_database
+
+TIPO_MODULO = 'modulo'
+TIPO_INVERSOR = 'inversor'
+
+# Tabela filha de cada tipo de equipamento
+TABELAS = {
+    TIPO_MODULO: 'projeto_modulos',
+    TIPO_INVERSOR: 'projeto_inversores',
+}
+
+# Maior valor aceito numa coluna INTEGER do SQLite
+MAX_INTEIRO = 2 ** 63 - 1
+
+# Campos numéricos de um item de equipamento
+CAMPOS_NUMERICOS = ('quantidade', 'potencia', 'largura_mm', 'altura_mm')
+
+def _numero(valor, padrao=0):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError, OverflowError):
+        return padrao
+    return numero if math.isfinite(numero) else padrao
+
+def validar_itens(itens):
+    """Levanta ValueError se algum item tiver número infinito ou fora do intervalo do SQLite.
+
+    Valores não numéricos continuam valendo 0, como no salvamento.
+    """
+    for posicao, item in enumerate(itens, start=1):
+        for campo in CAMPOS_NUMERICOS:
+            valor = item.get(campo)
+            try:
+                numero = float(valor)
+            except OverflowError:
+                numero = math.inf
+            except (TypeError, ValueError):
+                continue
+            if not math.isfinite(numero) or abs(numero) > MAX_INTEIRO:
+                raise ValueError(f'item {posicao}: {campo} com valor inválido ({valor!r})')
+
+def _dimensao(valor):
+    """Largura/altura em mm, ou None se ausente ou inválida"""
+    if valor is None or valor == '':
+        return None
+    return _numero(valor, None)
+
+def _chave_catalogo(tipo, item):
+    """Identidade do equipamento no catálogo: tipo, modelo, potência e dimensões"""
+    return (tipo, str(item.get('modelo') or '').strip(), _numero(item.get('potencia')),
+            _dimensao(item.get('largura_mm')), _dimensao(item.get('altura_mm')))
+
+def _equipamento_id(conn, tipo, item):
+    """Retorna o id do equipamento no catálogo, cadastrando se for novo.
+
+    Linhas do catálogo são imutáveis: o equipamento de um projeto nunca muda
+    as medidas mostradas nos projetos (e memoriais) de outros usuários.
+    """
+    chave = _chave_catalogo(tipo, item)
+    conn.execute(
+        'INSERT OR IGNORE INTO equipamentos (tipo, modelo, potencia, largura_mm, altura_mm) VALUES (?, ?, ?, ?, ?)',
+        chave
+    )
+    return conn.execute(
+        '''SELECT id FROM equipamentos
+           WHERE tipo = ? AND modelo = ? AND potencia = ?
+             AND IFNULL(largura_mm, -1) = IFNULL(?, -1) AND IFNULL(altura_mm, -1) = IFNULL(?, -1)''',
+        chave
+    ).fetchone()['id']
+
+def salvar_lista(conn, projeto_id, tipo, itens):
+    """Substitui a lista de um tipo de equipamento do projeto"""
+    tabela = TABELAS[tipo]
+    conn.execute(f'DELETE FROM {tabela} WHERE projeto_id = ?', (projeto_id,))
+    conn.executemany(
+        f'INSERT INTO {tabela} (projeto_id, equipamento_id, quantidade, posicao) VALUES (?, ?, ?, ?)',
+        [
+            (projeto_id, _equipamento_id(conn, tipo, item), int(_numero(item.get('quantidade'))), posicao)
+            for posicao, item in enumerate(itens or [])
+        ]
+    )
+
+def salvar_equipamentos(conn, projeto_id, modulos, inversores):
+    """Substitui as listas de módulos e inversores do projeto"""
+    salvar_lista(conn, projeto_id, TIPO_MODULO, modulos)
+    salvar_lista(conn, projeto_id, TIPO_INVERSOR, inversores)
+
+def inserir_equipamentos_lote(conn, projetos):
+    """Insere os equipamentos de vários projetos novos com executemany.
+
+    projetos: iterável de (projeto_id, modulos, inversores).
+    """
+    catalogo = {}
+    linhas = {tipo: [] for tipo in TABELAS}
+    for projeto_id, modulos, inversores in projetos:
+        for tipo, itens in ((TIPO_MODULO, modulos), (TIPO_INVERSOR, inversores)):
+            for posicao, item in enumerate(itens or []):
+                chave = _chave_catalogo(tipo, item)
+                if chave not in catalogo:
+                    catalogo[chave] = _equipamento_id(conn, tipo, item)
+                linhas[tipo].append(
+                    (projeto_id, catalogo[chave], int(_numero(item.get('quantidade'))), posicao)
+                )
+
+    for tipo, valores in linhas.items():
+        conn.executemany(
+            f'INSERT INTO {TABELAS[tipo]} (projeto_id, equipamento_id, quantidade, posicao) VALUES (?, ?, ?, ?)',
+            valores
+        )
+
+def carregar_equipamentos(conn, projeto_ids):
+    """Listas de equipamentos de vários projetos, no formato usado pelo editor e pelo template.
+
+    Retorna {projeto_id: {'modulos_novos': [...], 'inversores_novos': [...]}}.
+    """
+    resultado = {pid: {'modulos_novos': [], 'inversores_novos': []} for pid in projeto_ids}
+    if not resultado:
+        return resultado
+
+    marcadores = ', '.join('?' for _ in resultado)
+    for tipo, chave in ((TIPO_MODULO, 'modulos_novos'), (TIPO_INVERSOR, 'inversores_novos')):
+        rows = conn.execute(
+            f'''SELECT pe.projeto_id, pe.posicao, pe.quantidade,
+                       e.modelo, e.potencia, e.largura_mm, e.altura_mm
+                FROM {TABELAS[tipo]} pe JOIN equipamentos e ON e.id = pe.equipamento_id
+                WHERE pe.projeto_id IN ({marcadores})
+                ORDER BY pe.projeto_id, pe.posicao''',
+            list(resultado)
+        )
+        for row in rows:
+            item = {
+                'id': row['posicao'] + 1,
+                'modelo': row['modelo'],
+                'potencia': row['potencia'],
+                'quantidade': row['quantidade'],
+            }
+            if row['largura_mm'] is not None:
+                item['largura_mm'] = row['largura_mm']
+            if row['altura_mm'] is not None:
+                item['altura_mm'] = row['altura_mm']
+            resultado[row['projeto_id']][chave].append(item)
+
+    return resultado
+
+def anexar_equipamentos(conn, projetos):
+    """Preenche modulos_novos/inversores_novos de cada dicionário de projeto.
+
+    Projetos ainda não migrados (sem linhas nas tabelas filhas) usam o JSON antigo.
+    """
+    equipamentos = carregar_equipamentos(conn, [p['id'] for p in projetos])
+    for projeto in projetos:
+        listas = equipamentos[projeto['id']]
+        for chave in ('modulos_novos', 'inversores_novos'):
+            legado = projeto.get(chave)
+            if not listas[chave] and isinstance(legado, str) and legado:
+                projeto[chave] = json.loads(legado)
+            else:
+                projeto[chave] = listas[chave]
+    return projetos
+
+def uso_por_modelo(conn, usuario_id, tipo=TIPO_MODULO):
+    """Quantos projetos usam cada modelo, quantidade e potência instalada"""
+    return [dict(row) for row in conn.execute(
+        f'''SELECT e.id, e.modelo, e.potencia,
+                   COUNT(DISTINCT pe.projeto_id) as projetos,
+                   SUM(pe.quantidade) as quantidade,
+                   SUM(pe.quantidade * e.potencia) / 1000.0 as potencia_total_kw
+            FROM {TABELAS[tipo]} pe
+            JOIN equipamentos e ON e.id = pe.equipamento_id
+            JOIN projetos p ON p.id = pe.projeto_id
+            WHERE p.usuario_id = ?
+            GROUP BY e.id
+            ORDER BY quantidade DESC''',
+        (usuario_id,)
+    )]
+
+def kwp_modulos_por_mes(conn, usuario_id, potencia=None):
+    """kWp de módulos por mês do projeto, opcionalmente só de uma potência de módulo"""
+    where = ['p.usuario_id = ?']
+    params = [usuario_id]
+    if potencia is not None:
+        where.append('e.potencia = ?')
+        params.append(potencia)
+
+    return [dict(row) for row in conn.execute(
+        f'''SELECT strftime('%Y-%m', COALESCE(NULLIF(p.data_projeto, ''), p.data_criacao)) as mes,
+                   SUM(pm.quantidade) as modulos,
+                   SUM(pm.quantidade * e.potencia) / 1000.0 as kwp
+            FROM projeto_modulos pm
+            JOIN equipamentos e ON e.id = pm.equipamento_id
+            JOIN projetos p ON p.id = pm.projeto_id
+            WHERE {' AND '.join(where)}
+            GROUP BY mes
+            ORDER BY mes''',
+        params
+    )]
+
+def migrar_json(lote=500):
+    """Move os equipamentos das colunas JSON de projetos para as tabelas normalizadas"""
+    migrados = 0
+    while True:
+        with get_db() as conn:
+            projetos = conn.execute(
+                '''SELECT id, modulos_novos, inversores_novos FROM projetos
+                   WHERE modulos_novos IS NOT NULL OR inversores_novos IS NOT NULL
+                   LIMIT ?''',
+                (lote,)
+            ).fetchall()
+            if not projetos:
+                break
+
+            for projeto in projetos:
+                salvar_equipamentos(
+                    conn, projeto['id'],
+                    json.loads(projeto['modulos_novos'] or '[]'),
+                    json.loads(projeto['inversores_novos'] or '[]')
+                )
+            conn.executemany(
+                'UPDATE projetos SET modulos_novos = NULL, inversores_novos = NULL WHERE id = ?',
+                [(projeto['id'],) for projeto in projetos]
+            )
+            migrados += len(projetos)
+
+    return migrados
+
+if __name__ == '__main__':
+    # Garante as tabelas de equipamentos em bancos criados antes da normalização
+    init_database()
+    total = migrar_json()
+    print(f"✓ Equipamentos de {total} projetos migrados para as tabelas normalizadas")
@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FuturesTimeout
+from config import Config
+from database.connection import get_connection, get_db
+import metrics
+
+class EscritaExpirada(sqlite3.OperationalError):
+    """A operação não foi confirmada pelo escritor dentro de DB_WRITE_TIMEOUT_S"""
+
+class FilaEscrita:
+    """Escritas aplicadas por uma única thread do processo, em lotes (group commit).
+
+    Cada operação é uma função que recebe a conexão. O escritor junta as operações
+    pendentes (até max_lote) numa transação BEGIN IMMEDIATE, isola cada uma num
+    SAVEPOINT e só entrega os resultados depois do COMMIT. Uma operação que levanta
+    exceção é desfeita sozinha e a exceção é repassada a quem a enviou.
+    """
+
+    def __init__(self, max_lote, espera_ms=0, timeout=None):
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._fila = queue.Queue()
+        self._thread = None
+        self.lotes = 0
+        self.operacoes = 0
+        self.erros = 0
+        self.expiradas = 0
+
+    def _garantir_escritor(self):
+        """Inicia a thread do escritor na primeira escrita (e de novo no processo filho após fork)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name='escritor-sqlite', daemon=True)
+                self._thread.start()
+            return self._fila
+
+    def executar(self, operacao):
+        """Enfileira operacao(conn) e espera o commit do lote; retorna o resultado da operação.
+
+        Levanta EscritaExpirada se o commit não vier em self.timeout segundos; a operação
+        que ainda não começou a rodar é descartada.
+        """
+        futuro = Future()
+        self._garantir_escritor().put((operacao, futuro, time.perf_counter()))
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturesTimeout:
+            descartada = futuro.cancel()
+            with self._lock:
+                self.expiradas += 1
+            raise EscritaExpirada(
+                f'Escrita não confirmada em {self.timeout}s'
+                + ('' if descartada else ' (a operação já estava em andamento)')
+            ) from None
+
+    def _proximo_lote(self, fila):
+        lote = [fila.get()]
+        limite = time.perf_counter() + self.espera
+        while len(lote) < self.max_lote:
+            restante = limite - time.perf_counter()
+            try:
+                lote.append(fila.get(timeout=restante) if restante > 0 else fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _executar(self):
+        fila = self._fila
+        conn = None
+        while True:
+            lote = self._proximo_lote(fila)
+            try:
+                if conn is None:
+                    conn = get_connection()
+                self._aplicar(conn, lote)
+            except Exception as e:
+                # Falha fora das operações (conexão, BEGIN, COMMIT): o lote inteiro falha
+                print(f'Erro no escritor SQLite: {e}', file=sys.stderr)
+                for _, futuro, _ in lote:
+                    try:
+                        futuro.set_exception(e)
+                    except InvalidStateError:
+                        pass  # já resolvida ou descartada por EscritaExpirada
+                with self._lock:
+                    self.erros += len(lote)
+                if conn is not None:
+                    try:
+                        if conn.in_transaction:
+                            conn.rollback()
+                    except Exception:
+                        conn.close()
+                        conn = None
+
+    def _aplicar(self, conn, lote):
+        inicio = time.perf_counter()
+        metrics.escrita_lote.observar(len(lote))
+        for _, _, enfileirada in lote:
+            metrics.escrita_espera.observar(inicio - enfileirada)
+
+        concluidas = []
+        falhas = 0
+        conn.execute('BEGIN IMMEDIATE')
+        for operacao, futuro, _ in lote:
+            if not futuro.set_running_or_notify_cancel():
+                continue  # quem enviou desistiu de esperar (EscritaExpirada)
+            conn.execute('SAVEPOINT operacao')
+            try:
+                resultado = operacao(conn)
+            except Exception as e:
+                conn.execute('ROLLBACK TO operacao')
+                conn.execute('RELEASE operacao')
+                futuro.set_exception(e)
+                falhas += 1
+                continue
+            conn.execute('RELEASE operacao')
+            concluidas.append((futuro, resultado))
+        conn.commit()
+        metrics.escrita_commit.observar(time.perf_counter() - inicio)
+
+        with self._lock:
+            self.lotes += 1
+            self.operacoes += len(lote)
+            self.erros += falhas
+        for futuro, resultado in concluidas:
+            futuro.set_result(resultado)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ativa': int(Config.DB_WRITE_QUEUE),
+                'pendentes': self._fila.qsize(),
+                'lotes': self.lotes,
+                'operacoes': self.operacoes,
+                'erros': self.erros,
+                'expiradas': self.expiradas,
+                'media_lote': round(self.operacoes / self.lotes, 2) if self.lotes else 0.0,
+            }
+
+fila = FilaEscrita(Config.DB_WRITE_BATCH_MAX, Config.DB_WRITE_BATCH_WAIT_MS, Config.DB_WRITE_TIMEOUT_S)
+
+def escrever(operacao):
+    """Aplica operacao(conn) numa transação e retorna o resultado.
+
+    Com DB_WRITE_QUEUE ligado a operação vai para o escritor único do processo;
+    senão roda numa conexão do pool, como get_db(). A operação não deve depender
+    do contexto da requisição (current_user etc.), que não existe na thread do escritor.
+    """
+    if Config.DB_WRITE_QUEUE:
+        return fila.executar(operacao)
+    with get_db() as conn:
+        return operacao(conn)
+
+def escrita_stats():
+    """Estatísticas do escritor único"""
+    return fila.stats()
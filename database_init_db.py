@@ -2,9 +2,41 @@ import sqlite3
 import os
 from pathlib import Path
 
-def init_database():
+# (tabela, coluna, definição) que CREATE TABLE IF NOT EXISTS não acrescenta em bancos antigos
+COLUNAS_ADICIONADAS = (
+    ('projetos', 'versao', 'INTEGER NOT NULL DEFAULT 0'),
+    ('documentos_gerados', 'versao_projeto', 'INTEGER'),
+    ('revisoes_projeto', 'dicionario', 'INTEGER NOT NULL DEFAULT 1'),
+)
+
+def _migrar_catalogo_equipamentos(cursor):
+    """Recria equipamentos sem o UNIQUE (tipo, modelo, potencia) dos bancos antigos.
+
+    A identidade agora inclui as dimensões (idx_equipamentos_identidade); os ids
+    são preservados, então projeto_modulos/projeto_inversores continuam válidos.
+    """
+    sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'equipamentos'"
+    ).fetchone()
+    if sql is None or 'UNIQUE' not in sql[0]:
+        return
+    cursor.execute('''CREATE TABLE equipamentos_novo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        potencia REAL NOT NULL DEFAULT 0,
+        largura_mm REAL,
+        altura_mm REAL
+    )''')
+    cursor.execute('INSERT INTO equipamentos_novo SELECT id, tipo, modelo, potencia, largura_mm, altura_mm FROM equipamentos')
+    cursor.execute('DROP TABLE equipamentos')
+    cursor.execute('ALTER TABLE equipamentos_novo RENAME TO equipamentos')
+    cursor.execute('''CREATE UNIQUE INDEX idx_equipamentos_identidade
+        ON equipamentos(tipo, modelo, potencia, IFNULL(largura_mm, -1), IFNULL(altura_mm, -1))''')
+
+def init_database(db_path=None):
     """Inicializa o banco de dados com o schema"""
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'solar_memorials.db')
+    db_path = db_path or os.path.join(os.path.dirname(__file__), '..', 'solar_memorials.db')
     schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
     
     # Criar conexão
@@ -16,6 +48,14 @@ def init_database():
         schema = f.read()
         cursor.executescript(schema)
     
+    # Colunas adicionadas depois da criação de bancos existentes
+    for tabela, coluna, definicao in COLUNAS_ADICIONADAS:
+        existentes = {linha[1] for linha in cursor.execute(f'PRAGMA table_info({tabela})')}
+        if coluna not in existentes:
+            cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}')
+    
+    _migrar_catalogo_equipamentos(cursor)
+    
     conn.commit()
     conn.close()
     
@@ -0,0 +1,91 @@
+import json
+import base64
+
+# Filtros aceitos (coluna de projetos = valor)
+FILTROS = ('status', 'uf', 'cidade', 'tipo_projeto', 'concessionaria')
+
+# Ordenações aceitas
+ORDENACOES = ('data_atualizacao', 'potencia_kwp')
+
+COLUNAS_LISTAGEM = (
+    'id', 'nome_cliente', 'cidade', 'uf', 'concessionaria', 'tipo_projeto',
+    'potencia_kwp', 'quantidade_modulos', 'status', 'data_atualizacao'
+)
+
+def encode_cursor(valor, projeto_id):
+    """Cursor opaco com a chave de ordenação do último item da página"""
+    raw = json.dumps([valor, projeto_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverso de encode_cursor. Levanta ValueError se o cursor for inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, projeto_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(projeto_id, int) or isinstance(valor, (list, dict)):
+        raise ValueError('Cursor inválido')
+    return valor, projeto_id
+
+def _segmentos_keyset(coluna, valor, projeto_id, desc):
+    """Condições (em ordem) que continuam a listagem depois de (valor, id).
+
+    NULLs ordenam antes de qualquer valor no SQLite, então ficam no fim da
+    ordem decrescente e no começo da crescente. Cada segmento é uma faixa
+    contígua do índice, evitando um OR que obrigaria a varrer as páginas anteriores.
+    """
+    op = '<' if desc else '>'
+    if valor is None:
+        segmentos = [(f'{coluna} IS NULL AND id {op} ?', [projeto_id])]
+        if not desc:
+            segmentos.append((f'{coluna} IS NOT NULL', []))
+        return segmentos
+
+    segmentos = [(f'({coluna}, id) {op} (?, ?)', [valor, projeto_id])]
+    if desc:
+        segmentos.append((f'{coluna} IS NULL', []))
+    return segmentos
+
+def listar_projetos(conn, usuario_id, filtros=None, ordem='data_atualizacao', desc=True,
+                    cursor=None, limite=25):
+    """Página de projetos do usuário com paginação por keyset (sem OFFSET).
+
+    Retorna (projetos, proximo_cursor); proximo_cursor é None na última página.
+    """
+    if ordem not in ORDENACOES:
+        raise ValueError(f'Ordenação inválida: {ordem}')
+
+    where = ['usuario_id = ?']
+    params = [usuario_id]
+
+    for campo, valor in (filtros or {}).items():
+        if campo not in FILTROS:
+            raise ValueError(f'Filtro inválido: {campo}')
+        where.append(f'{campo} = ?')
+        params.append(valor)
+
+    segmentos = [(None, [])]
+    if cursor:
+        segmentos = _segmentos_keyset(ordem, *decode_cursor(cursor), desc)
+
+    direcao = 'DESC' if desc else 'ASC'
+    projetos = []
+    for condicao, valores in segmentos:
+        faltam = limite + 1 - len(projetos)
+        if faltam <= 0:
+            break
+        condicoes = where + [condicao] if condicao else where
+        query = f'''SELECT {', '.join(COLUNAS_LISTAGEM)} FROM projetos
+                    WHERE {' AND '.join(condicoes)}
+                    ORDER BY {ordem} {direcao}, id {direcao}
+                    LIMIT ?'''
+        projetos.extend(dict(row) for row in conn.execute(query, params + valores + [faltam]))
+
+    proximo_cursor = None
+    if len(projetos) > limite:
+        projetos = projetos[:limite]
+        ultimo = projetos[-1]
+        proximo_cursor = encode_cursor(ultimo[ordem], ultimo['id'])
+
+    return projetos, proximo_cursor
@@ -0,0 +1,39 @@
+from database.connection import get_db
+from database.init_db import init_database
+
+def versao_resumo(conn, usuario_id):
+    """Versão do resumo do usuário, incrementada pelos triggers a cada alteração em projetos"""
+    linha = conn.execute('SELECT versao FROM resumo_usuarios WHERE usuario_id = ?', (usuario_id,)).fetchone()
+    return linha['versao'] if linha else 0
+
+def rebuild_resumo_usuarios():
+    """Recalcula a tabela resumo_usuarios a partir de todos os projetos"""
+    with get_db() as conn:
+        conn.execute('''
+            INSERT INTO resumo_usuarios (
+                usuario_id, total_projetos, potencia_total, projetos_concluidos, total_modulos, versao
+            )
+            SELECT u.id,
+                   COUNT(p.id),
+                   COALESCE(SUM(p.potencia_kwp), 0),
+                   COALESCE(SUM(p.status = 'Concluído'), 0),
+                   COALESCE(SUM(p.quantidade_modulos), 0),
+                   1
+            FROM usuarios u LEFT JOIN projetos p ON p.usuario_id = u.id
+            GROUP BY u.id
+            ON CONFLICT(usuario_id) DO UPDATE SET
+                total_projetos = excluded.total_projetos,
+                potencia_total = excluded.potencia_total,
+                projetos_concluidos = excluded.projetos_concluidos,
+                total_modulos = excluded.total_modulos,
+                versao = resumo_usuarios.versao + 1
+        ''')
+        total = conn.execute('SELECT COUNT(*) as count FROM resumo_usuarios').fetchone()['count']
+    
+    return total
+
+if __name__ == '__main__':
+    # Garante tabelas, índices e triggers em bancos criados antes do resumo
+    init_database()
+    total = rebuild_resumo_usuarios()
+    print(f"✓ Resumo recalculado para {total} usuários")
@@ -49,6 +49,7 @@ CREATE TABLE IF NOT EXISTS projetos (
     
     -- Status e datas
     status TEXT DEFAULT 'Rascunho',
+    versao INTEGER NOT NULL DEFAULT 0,
     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
@@ -58,3 +59,329 @@ CREATE TABLE IF NOT EXISTS projetos (
 -- Índices para melhor performance
 CREATE INDEX IF NOT EXISTS idx_projetos_usuario ON projetos(usuario_id);
 CREATE INDEX IF NOT EXISTS idx_projetos_status ON projetos(status);
+
+-- Jobs de geração de memoriais
+CREATE TABLE IF NOT EXISTS jobs_docx (
+    id TEXT PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    projeto_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendente',
+    arquivo TEXT,
+    erro TEXT,
+    worker_pid INTEGER,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_inicio TIMESTAMP,
+    data_conclusao TIMESTAMP,
+    
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_docx_status ON jobs_docx(status);
+
+-- Índice do cache de memoriais gerados (endereçado por conteúdo)
+CREATE TABLE IF NOT EXISTS cache_memoriais (
+    chave TEXT PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    projeto_id INTEGER,
+    tamanho INTEGER NOT NULL,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ultimo_acesso TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cache_memoriais_acesso ON cache_memoriais(ultimo_acesso);
+
+-- Resumo por usuário para o dashboard (mantido pelos triggers abaixo)
+CREATE TABLE IF NOT EXISTS resumo_usuarios (
+    usuario_id INTEGER PRIMARY KEY,
+    total_projetos INTEGER NOT NULL DEFAULT 0,
+    potencia_total REAL NOT NULL DEFAULT 0,
+    projetos_concluidos INTEGER NOT NULL DEFAULT 0,
+    total_modulos INTEGER NOT NULL DEFAULT 0,
+    versao INTEGER NOT NULL DEFAULT 0,
+    
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+-- Índice de cobertura para a lista de projetos recentes do dashboard
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_atualizacao
+    ON projetos(usuario_id, data_atualizacao, nome_cliente, cidade, uf, potencia_kwp, status);
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_insert AFTER INSERT ON projetos
+BEGIN
+    INSERT OR IGNORE INTO resumo_usuarios (usuario_id) VALUES (NEW.usuario_id);
+    UPDATE resumo_usuarios SET
+        total_projetos = total_projetos + 1,
+        potencia_total = potencia_total + COALESCE(NEW.potencia_kwp, 0),
+        projetos_concluidos = projetos_concluidos + (NEW.status = 'Concluído'),
+        total_modulos = total_modulos + COALESCE(NEW.quantidade_modulos, 0),
+        versao = versao + 1
+    WHERE usuario_id = NEW.usuario_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_update AFTER UPDATE ON projetos
+BEGIN
+    UPDATE resumo_usuarios SET
+        total_projetos = total_projetos - 1,
+        potencia_total = potencia_total - COALESCE(OLD.potencia_kwp, 0),
+        projetos_concluidos = projetos_concluidos - (OLD.status = 'Concluído'),
+        total_modulos = total_modulos - COALESCE(OLD.quantidade_modulos, 0),
+        versao = versao + 1
+    WHERE usuario_id = OLD.usuario_id;
+    INSERT OR IGNORE INTO resumo_usuarios (usuario_id) VALUES (NEW.usuario_id);
+    UPDATE resumo_usuarios SET
+        total_projetos = total_projetos + 1,
+        potencia_total = potencia_total + COALESCE(NEW.potencia_kwp, 0),
+        projetos_concluidos = projetos_concluidos + (NEW.status = 'Concluído'),
+        total_modulos = total_modulos + COALESCE(NEW.quantidade_modulos, 0)
+    WHERE usuario_id = NEW.usuario_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_delete AFTER DELETE ON projetos
+BEGIN
+    UPDATE resumo_usuarios SET
+        total_projetos = total_projetos - 1,
+        potencia_total = potencia_total - COALESCE(OLD.potencia_kwp, 0),
+        projetos_concluidos = projetos_concluidos - (OLD.status = 'Concluído'),
+        total_modulos = total_modulos - COALESCE(OLD.quantidade_modulos, 0),
+        versao = versao + 1
+    WHERE usuario_id = OLD.usuario_id;
+END;
+
+-- Índices compostos da listagem paginada (/api/projetos); o id entra
+-- implicitamente como desempate de cada índice. A ordenação por data sem
+-- filtro usa o índice de cobertura idx_projetos_usuario_atualizacao.
+DROP INDEX IF EXISTS idx_projetos_usuario_data;
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_potencia ON projetos(usuario_id, potencia_kwp);
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_status_data ON projetos(usuario_id, status, data_atualizacao);
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_status_potencia ON projetos(usuario_id, status, potencia_kwp);
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_uf_cidade_data ON projetos(usuario_id, uf, cidade, data_atualizacao);
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_tipo_data ON projetos(usuario_id, tipo_projeto, data_atualizacao);
+CREATE INDEX IF NOT EXISTS idx_projetos_usuario_concessionaria_data ON projetos(usuario_id, concessionaria, data_atualizacao);
+
+-- Busca textual de projetos (FTS5 sem conteúdo próprio, mantido pelos triggers).
+-- A coluna usuario guarda 'u<id>' para filtrar pelo dono dentro do próprio índice;
+-- documento e uc recebem também a versão só com dígitos do valor.
+CREATE VIRTUAL TABLE IF NOT EXISTS projetos_fts USING fts5(
+    usuario, nome_cliente, documento, uc, endereco, cidade,
+    content='',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_fts_insert AFTER INSERT ON projetos
+BEGIN
+    INSERT INTO projetos_fts (rowid, usuario, nome_cliente, documento, uc, endereco, cidade)
+    VALUES (
+        NEW.id, 'u' || NEW.usuario_id, NEW.nome_cliente,
+        COALESCE(NEW.cpf_cnpj, '') || ' ' || replace(replace(replace(replace(COALESCE(NEW.cpf_cnpj, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        COALESCE(NEW.uc, '') || ' ' || replace(replace(replace(replace(COALESCE(NEW.uc, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        NEW.endereco, NEW.cidade
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_fts_delete AFTER DELETE ON projetos
+BEGIN
+    INSERT INTO projetos_fts (projetos_fts, rowid, usuario, nome_cliente, documento, uc, endereco, cidade)
+    VALUES (
+        'delete', OLD.id, 'u' || OLD.usuario_id, OLD.nome_cliente,
+        COALESCE(OLD.cpf_cnpj, '') || ' ' || replace(replace(replace(replace(COALESCE(OLD.cpf_cnpj, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        COALESCE(OLD.uc, '') || ' ' || replace(replace(replace(replace(COALESCE(OLD.uc, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        OLD.endereco, OLD.cidade
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_fts_update
+AFTER UPDATE OF usuario_id, nome_cliente, cpf_cnpj, uc, endereco, cidade ON projetos
+BEGIN
+    INSERT INTO projetos_fts (projetos_fts, rowid, usuario, nome_cliente, documento, uc, endereco, cidade)
+    VALUES (
+        'delete', OLD.id, 'u' || OLD.usuario_id, OLD.nome_cliente,
+        COALESCE(OLD.cpf_cnpj, '') || ' ' || replace(replace(replace(replace(COALESCE(OLD.cpf_cnpj, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        COALESCE(OLD.uc, '') || ' ' || replace(replace(replace(replace(COALESCE(OLD.uc, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        OLD.endereco, OLD.cidade
+    );
+    INSERT INTO projetos_fts (rowid, usuario, nome_cliente, documento, uc, endereco, cidade)
+    VALUES (
+        NEW.id, 'u' || NEW.usuario_id, NEW.nome_cliente,
+        COALESCE(NEW.cpf_cnpj, '') || ' ' || replace(replace(replace(replace(COALESCE(NEW.cpf_cnpj, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        COALESCE(NEW.uc, '') || ' ' || replace(replace(replace(replace(COALESCE(NEW.uc, ''), '.', ''), '-', ''), '/', ''), ' ', ''),
+        NEW.endereco, NEW.cidade
+    );
+END;
+
+-- Catálogo de equipamentos compartilhado entre projetos. As linhas nunca são
+-- alteradas: as dimensões fazem parte da identidade, então o mesmo modelo com
+-- outras medidas vira outra linha em vez de mudar os projetos de outros usuários.
+CREATE TABLE IF NOT EXISTS equipamentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    potencia REAL NOT NULL DEFAULT 0,
+    largura_mm REAL,
+    altura_mm REAL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_equipamentos_identidade
+    ON equipamentos(tipo, modelo, potencia, IFNULL(largura_mm, -1), IFNULL(altura_mm, -1));
+
+-- Módulos e inversores de cada projeto (substituem o JSON de modulos_novos/inversores_novos)
+CREATE TABLE IF NOT EXISTS projeto_modulos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    projeto_id INTEGER NOT NULL,
+    equipamento_id INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    posicao INTEGER NOT NULL DEFAULT 0,
+    
+    FOREIGN KEY (projeto_id) REFERENCES projetos(id) ON DELETE CASCADE,
+    FOREIGN KEY (equipamento_id) REFERENCES equipamentos(id)
+);
+
+CREATE TABLE IF NOT EXISTS projeto_inversores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    projeto_id INTEGER NOT NULL,
+    equipamento_id INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    posicao INTEGER NOT NULL DEFAULT 0,
+    
+    FOREIGN KEY (projeto_id) REFERENCES projetos(id) ON DELETE CASCADE,
+    FOREIGN KEY (equipamento_id) REFERENCES equipamentos(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_projeto_modulos_projeto ON projeto_modulos(projeto_id, posicao);
+CREATE INDEX IF NOT EXISTS idx_projeto_modulos_equipamento ON projeto_modulos(equipamento_id, projeto_id, quantidade);
+CREATE INDEX IF NOT EXISTS idx_projeto_inversores_projeto ON projeto_inversores(projeto_id, posicao);
+CREATE INDEX IF NOT EXISTS idx_projeto_inversores_equipamento ON projeto_inversores(equipamento_id, projeto_id, quantidade);
+
+-- foreign_keys não é habilitado nas conexões, então a remoção em cascata é feita aqui
+CREATE TRIGGER IF NOT EXISTS trg_projetos_equipamentos_delete AFTER DELETE ON projetos
+BEGIN
+    DELETE FROM projeto_modulos WHERE projeto_id = OLD.id;
+    DELETE FROM projeto_inversores WHERE projeto_id = OLD.id;
+END;
+
+-- Índice dos documentos gerados em uploads/ (dono, tamanho e acesso para a retenção).
+-- arquivo é o caminho relativo a uploads/, nos subdiretórios ab/cd/ derivados do nome
+CREATE TABLE IF NOT EXISTS documentos_gerados (
+    arquivo TEXT PRIMARY KEY,
+    usuario_id INTEGER,
+    projeto_id INTEGER,
+    versao_projeto INTEGER,  -- revisão do projeto (revisoes_projeto) usada na renderização
+    tamanho INTEGER NOT NULL,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ultimo_acesso TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_documentos_gerados_acesso ON documentos_gerados(ultimo_acesso, data_criacao);
+CREATE INDEX IF NOT EXISTS idx_cache_memoriais_arquivo ON cache_memoriais(arquivo);
+
+-- Histórico de revisões dos projetos, uma por versao salva. dados é JSON comprimido
+-- com zlib: o estado completo (completa = 1) ou só os campos alterados desde a
+-- revisão anterior (completa = 0)
+CREATE TABLE IF NOT EXISTS revisoes_projeto (
+    projeto_id INTEGER NOT NULL,
+    versao INTEGER NOT NULL,
+    completa INTEGER NOT NULL,
+    dicionario INTEGER NOT NULL DEFAULT 1,  -- versão do dicionário zlib (project_history.DICIONARIOS)
+    dados BLOB NOT NULL,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (projeto_id, versao)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_documentos_gerados_projeto ON documentos_gerados(projeto_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_revisoes_delete AFTER DELETE ON projetos
+BEGIN
+    DELETE FROM revisoes_projeto WHERE projeto_id = OLD.id;
+END;
+
+-- Séries mensais por dimensão (total, uf, cidade, concessionaria, tipo_projeto) para
+-- /api/analise, mantidas pelos triggers abaixo; o mês é o de data_projeto (ou da
+-- criação). As expressões espelham DIMENSOES/MES_SQL em database/analise.py,
+-- que recalcula a tabela inteira. Linhas que voltam a zero projetos ficam até o
+-- próximo recálculo e são ignoradas nas consultas
+CREATE TABLE IF NOT EXISTS resumo_mensal (
+    usuario_id INTEGER NOT NULL,
+    dimensao TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    mes TEXT NOT NULL,
+    projetos INTEGER NOT NULL DEFAULT 0,
+    potencia_kwp REAL NOT NULL DEFAULT 0,
+    quantidade_modulos INTEGER NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (usuario_id, dimensao, mes, valor)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_mensal_insert AFTER INSERT ON projetos
+BEGIN
+    INSERT INTO resumo_mensal (usuario_id, dimensao, valor, mes, projetos, potencia_kwp, quantidade_modulos)
+    SELECT NEW.usuario_id, d.dimensao, d.valor,
+           COALESCE(strftime('%Y-%m', COALESCE(NULLIF(NEW.data_projeto, ''), NEW.data_criacao)), '0000-00'),
+           1, COALESCE(NEW.potencia_kwp, 0), COALESCE(NEW.quantidade_modulos, 0)
+    FROM (SELECT 'total' AS dimensao, '' AS valor
+          UNION ALL SELECT 'uf', COALESCE(NEW.uf, '')
+          UNION ALL SELECT 'cidade', COALESCE(NEW.uf, '') || '/' || COALESCE(NEW.cidade, '')
+          UNION ALL SELECT 'concessionaria', COALESCE(NEW.concessionaria, '')
+          UNION ALL SELECT 'tipo_projeto', COALESCE(NEW.tipo_projeto, '')) d
+    WHERE 1
+    ON CONFLICT(usuario_id, dimensao, mes, valor) DO UPDATE SET
+        projetos = projetos + excluded.projetos,
+        potencia_kwp = potencia_kwp + excluded.potencia_kwp,
+        quantidade_modulos = quantidade_modulos + excluded.quantidade_modulos;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_mensal_delete AFTER DELETE ON projetos
+BEGIN
+    INSERT INTO resumo_mensal (usuario_id, dimensao, valor, mes, projetos, potencia_kwp, quantidade_modulos)
+    SELECT OLD.usuario_id, d.dimensao, d.valor,
+           COALESCE(strftime('%Y-%m', COALESCE(NULLIF(OLD.data_projeto, ''), OLD.data_criacao)), '0000-00'),
+           -1, -COALESCE(OLD.potencia_kwp, 0), -COALESCE(OLD.quantidade_modulos, 0)
+    FROM (SELECT 'total' AS dimensao, '' AS valor
+          UNION ALL SELECT 'uf', COALESCE(OLD.uf, '')
+          UNION ALL SELECT 'cidade', COALESCE(OLD.uf, '') || '/' || COALESCE(OLD.cidade, '')
+          UNION ALL SELECT 'concessionaria', COALESCE(OLD.concessionaria, '')
+          UNION ALL SELECT 'tipo_projeto', COALESCE(OLD.tipo_projeto, '')) d
+    WHERE 1
+    ON CONFLICT(usuario_id, dimensao, mes, valor) DO UPDATE SET
+        projetos = projetos + excluded.projetos,
+        potencia_kwp = potencia_kwp + excluded.potencia_kwp,
+        quantidade_modulos = quantidade_modulos + excluded.quantidade_modulos;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_projetos_resumo_mensal_update
+AFTER UPDATE OF usuario_id, data_projeto, data_criacao, uf, cidade, concessionaria, tipo_projeto,
+                potencia_kwp, quantidade_modulos ON projetos
+WHEN OLD.usuario_id IS NOT NEW.usuario_id OR OLD.data_projeto IS NOT NEW.data_projeto
+  OR OLD.data_criacao IS NOT NEW.data_criacao OR OLD.uf IS NOT NEW.uf OR OLD.cidade IS NOT NEW.cidade
+  OR OLD.concessionaria IS NOT NEW.concessionaria OR OLD.tipo_projeto IS NOT NEW.tipo_projeto
+  OR OLD.potencia_kwp IS NOT NEW.potencia_kwp OR OLD.quantidade_modulos IS NOT NEW.quantidade_modulos
+BEGIN
+    INSERT INTO resumo_mensal (usuario_id, dimensao, valor, mes, projetos, potencia_kwp, quantidade_modulos)
+    SELECT OLD.usuario_id, d.dimensao, d.valor,
+           COALESCE(strftime('%Y-%m', COALESCE(NULLIF(OLD.data_projeto, ''), OLD.data_criacao)), '0000-00'),
+           -1, -COALESCE(OLD.potencia_kwp, 0), -COALESCE(OLD.quantidade_modulos, 0)
+    FROM (SELECT 'total' AS dimensao, '' AS valor
+          UNION ALL SELECT 'uf', COALESCE(OLD.uf, '')
+          UNION ALL SELECT 'cidade', COALESCE(OLD.uf, '') || '/' || COALESCE(OLD.cidade, '')
+          UNION ALL SELECT 'concessionaria', COALESCE(OLD.concessionaria, '')
+          UNION ALL SELECT 'tipo_projeto', COALESCE(OLD.tipo_projeto, '')) d
+    WHERE 1
+    ON CONFLICT(usuario_id, dimensao, mes, valor) DO UPDATE SET
+        projetos = projetos + excluded.projetos,
+        potencia_kwp = potencia_kwp + excluded.potencia_kwp,
+        quantidade_modulos = quantidade_modulos + excluded.quantidade_modulos;
+    INSERT INTO resumo_mensal (usuario_id, dimensao, valor, mes, projetos, potencia_kwp, quantidade_modulos)
+    SELECT NEW.usuario_id, d.dimensao, d.valor,
+           COALESCE(strftime('%Y-%m', COALESCE(NULLIF(NEW.data_projeto, ''), NEW.data_criacao)), '0000-00'),
+           1, COALESCE(NEW.potencia_kwp, 0), COALESCE(NEW.quantidade_modulos, 0)
+    FROM (SELECT 'total' AS dimensao, '' AS valor
+          UNION ALL SELECT 'uf', COALESCE(NEW.uf, '')
+          UNION ALL SELECT 'cidade', COALESCE(NEW.uf, '') || '/' || COALESCE(NEW.cidade, '')
+          UNION ALL SELECT 'concessionaria', COALESCE(NEW.concessionaria, '')
+          UNION ALL SELECT 'tipo_projeto', COALESCE(NEW.tipo_projeto, '')) d
+    WHERE 1
+    ON CONFLICT(usuario_id, dimensao, mes, valor) DO UPDATE SET
+        projetos = projetos + excluded.projetos,
+        potencia_kwp = potencia_kwp + excluded.potencia_kwp,
+        quantidade_modulos = quantidade_modulos + excluded.quantidade_modulos;
+END;
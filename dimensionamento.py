@@ -0,0 +1,205 @@
+import sys
+import json
+import argparse
+import numpy as np
+from config import Config
+from database.connection import get_db
+from database.listagem import FILTROS as FILTROS_PERMITIDOS
+import project_history
+
+# Irradiação solar média por UF (HSP, kWh/m²/dia), usada na estimativa de geração
+IRRADIACAO_UF = {
+    'AC': 4.6, 'AL': 5.4, 'AM': 4.5, 'AP': 4.9, 'BA': 5.5, 'CE': 5.6, 'DF': 5.3,
+    'ES': 5.0, 'GO': 5.4, 'MA': 5.2, 'MG': 5.3, 'MS': 5.1, 'MT': 5.2, 'PA': 4.9,
+    'PB': 5.6, 'PE': 5.6, 'PI': 5.7, 'PR': 4.7, 'RJ': 5.0, 'RN': 5.7, 'RO': 4.7,
+    'RR': 4.8, 'RS': 4.6, 'SC': 4.6, 'SE': 5.4, 'SP': 5.0, 'TO': 5.4,
+}
+
+DIAS_MES = 30
+
+# Colunas de projetos preenchidas pelo dimensionamento
+COLUNAS_TOTAIS = ('potencia_kwp', 'quantidade_modulos', 'area_arranjos', 'geracao_kwh_mes', 'reducao_percentual')
+
+def _numero(valor, padrao=0.0):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return padrao
+
+def _linhas_modulos(itens):
+    """(potencia_w, quantidade, largura_mm, altura_mm) de uma lista de módulos do editor"""
+    return [
+        (_numero(item.get('potencia')), int(_numero(item.get('quantidade'))),
+         _numero(item.get('largura_mm')), _numero(item.get('altura_mm')))
+        for item in itens or []
+    ]
+
+def irradiacao(ufs):
+    """Vetor de HSP para uma sequência de UFs, com o padrão da configuração para UFs desconhecidas"""
+    padrao = Config.DIMENSIONAMENTO_IRRADIACAO_PADRAO
+    return np.array([IRRADIACAO_UF.get((uf or '').strip().upper(), padrao) for uf in ufs], dtype=float)
+
+def dimensionar(indices, modulos, n_projetos, hsp, consumo, rendimento=None, area_padrao=None):
+    """Calcula os totais de n_projetos de uma vez.
+
+    indices: posição do projeto de cada linha de módulo; modulos: matriz (n, 4) com
+    potência (W), quantidade, largura e altura (mm). Módulos sem dimensões usam a
+    área padrão da configuração. Retorna um dicionário de vetores por coluna de totais.
+    """
+    rendimento = Config.DIMENSIONAMENTO_RENDIMENTO if rendimento is None else rendimento
+    area_padrao = Config.DIMENSIONAMENTO_AREA_MODULO_M2 if area_padrao is None else area_padrao
+
+    indices = np.asarray(indices, dtype=np.intp)
+    modulos = np.asarray(modulos, dtype=float).reshape(-1, 4)
+    potencia, quantidade, largura, altura = modulos.T
+
+    area_modulo = np.where((largura > 0) & (altura > 0), largura * altura / 1e6, area_padrao)
+
+    kwp = np.bincount(indices, weights=potencia * quantidade, minlength=n_projetos) / 1000
+    total_modulos = np.bincount(indices, weights=quantidade, minlength=n_projetos)
+    area = np.bincount(indices, weights=area_modulo * quantidade, minlength=n_projetos)
+
+    geracao = kwp * np.asarray(hsp, dtype=float) * DIAS_MES * rendimento
+    consumo = np.asarray(consumo, dtype=float)
+    reducao = np.divide(geracao * 100, consumo, out=np.zeros(n_projetos), where=consumo > 0)
+
+    return {
+        'potencia_kwp': np.round(kwp, 2),
+        'quantidade_modulos': total_modulos.astype(np.int64),
+        'area_arranjos': np.round(area, 2),
+        'geracao_kwh_mes': np.round(geracao, 2),
+        'reducao_percentual': np.round(np.minimum(reducao, 100), 2),
+    }
+
+def dimensionar_projeto(projeto):
+    """Totais de um único projeto (dicionário com modulos_novos, uf e media_consumo).
+
+    Sem consumo informado não há como estimar a redução: ela não entra no resultado.
+    """
+    linhas = _linhas_modulos(projeto.get('modulos_novos'))
+    consumo = _numero(projeto.get('media_consumo'))
+    totais = dimensionar([0] * len(linhas), linhas, 1, irradiacao([projeto.get('uf')]), [consumo])
+
+    resultado = {coluna: valores[0].item() for coluna, valores in totais.items()}
+    if consumo <= 0:
+        del resultado['reducao_percentual']
+    return resultado
+
+def _carregar_lote(conn, where, params, ultimo_id, tamanho_lote):
+    """Próximo lote de projetos (por id) e as linhas de módulos de cada um"""
+    projetos = conn.execute(
+        f'''SELECT id, uf, media_consumo, modulos_novos, {', '.join(COLUNAS_TOTAIS)}
+            FROM projetos WHERE {' AND '.join(where + ['id > ?'])}
+            ORDER BY id LIMIT ?''',
+        params + [ultimo_id, tamanho_lote]
+    ).fetchall()
+    if not projetos:
+        return projetos, np.empty(0, dtype=np.intp), np.empty((0, 4))
+
+    ids = np.array([p['id'] for p in projetos], dtype=np.int64)
+    linhas = conn.execute(
+        f'''SELECT pm.projeto_id, e.potencia, pm.quantidade,
+                   COALESCE(e.largura_mm, 0), COALESCE(e.altura_mm, 0)
+            FROM projeto_modulos pm JOIN equipamentos e ON e.id = pm.equipamento_id
+            WHERE pm.projeto_id IN ({', '.join('?' for _ in projetos)})''',
+        ids.tolist()
+    ).fetchall()
+    dados = np.array([tuple(linha) for linha in linhas], dtype=float).reshape(-1, 5)
+    indices = np.searchsorted(ids, dados[:, 0].astype(np.int64))
+    modulos = dados[:, 1:]
+
+    # Projetos ainda não migrados para as tabelas normalizadas usam o JSON antigo
+    com_linhas = set(dados[:, 0].astype(np.int64).tolist())
+    legado_indices, legado_modulos = [], []
+    for i, projeto in enumerate(projetos):
+        if projeto['id'] not in com_linhas and projeto['modulos_novos']:
+            itens = _linhas_modulos(json.loads(projeto['modulos_novos']))
+            legado_indices.extend([i] * len(itens))
+            legado_modulos.extend(itens)
+    if legado_modulos:
+        indices = np.concatenate([indices, np.array(legado_indices, dtype=np.intp)])
+        modulos = np.vstack([modulos, np.array(legado_modulos, dtype=float)])
+
+    return projetos, indices, modulos
+
+def recalcular_projetos(usuario_id=None, ids=None, filtros=None, tamanho_lote=None):
+    """Recalcula os totais de vários projetos e grava só os que mudaram.
+
+    Percorre os projetos em lotes por id, cada um calculado de forma vetorizada e
+    gravado com executemany na sua própria transação. Projetos sem consumo informado
+    mantêm a redução percentual que já tinham. Cada projeto alterado ganha uma nova versão,
+    registrada no histórico de revisões.
+    """
+    tamanho_lote = tamanho_lote or Config.DIMENSIONAMENTO_LOTE
+    where, params = [], []
+    if usuario_id is not None:
+        where.append('usuario_id = ?')
+        params.append(usuario_id)
+    if ids:
+        where.append(f"id IN ({', '.join('?' for _ in ids)})")
+        params.extend(int(i) for i in ids)
+    for campo, valor in (filtros or {}).items():
+        if campo not in FILTROS_PERMITIDOS:
+            raise ValueError(f'Filtro inválido: {campo}')
+        where.append(f'{campo} = ?')
+        params.append(valor)
+
+    processados = atualizados = 0
+    ultimo_id = 0
+    while True:
+        with get_db() as conn:
+            projetos, indices, modulos = _carregar_lote(conn, where, params, ultimo_id, tamanho_lote)
+            if not projetos:
+                break
+
+            n = len(projetos)
+            consumo = np.array([_numero(p['media_consumo']) for p in projetos])
+            totais = dimensionar(indices, modulos, n, irradiacao(p['uf'] for p in projetos), consumo)
+            atuais = np.array(
+                [[_numero(p[coluna], np.nan) for coluna in COLUNAS_TOTAIS] for p in projetos]
+            ).reshape(n, len(COLUNAS_TOTAIS))
+            totais['reducao_percentual'] = np.where(
+                consumo > 0, totais['reducao_percentual'], np.nan_to_num(atuais[:, -1])
+            )
+
+            novos = np.column_stack([totais[coluna] for coluna in COLUNAS_TOTAIS])
+            mudou = ~np.isclose(novos, atuais, atol=0.005).all(axis=1)
+            alterados = np.flatnonzero(mudou)
+            linhas = []
+            for i in alterados:
+                valores = novos[i].tolist()
+                valores[1] = int(valores[1])  # quantidade_modulos
+                linhas.append((*valores, projetos[i]['id']))
+            # Nova versão e data: o editor (ETag) e o histórico enxergam a mudança dos totais
+            conn.executemany(
+                f'''UPDATE projetos SET {', '.join(f'{c} = ?' for c in COLUNAS_TOTAIS)},
+                        versao = versao + 1, data_atualizacao = CURRENT_TIMESTAMP
+                    WHERE id = ?''',
+                linhas
+            )
+            if Config.HISTORICO_REVISOES:
+                for projeto_id in (linha[-1] for linha in linhas):
+                    project_history.registrar(conn, projeto_id)
+
+            processados += n
+            atualizados += len(alterados)
+            ultimo_id = projetos[-1]['id']
+
+    return {'processados': processados, 'atualizados': atualizados}
+
+def main(argv=None):
+    """Recalcula os totais de dimensionamento gravados nos projetos"""
+    parser = argparse.ArgumentParser(description='Recálculo em lote do dimensionamento dos projetos')
+    parser.add_argument('--usuario', type=int, help='ID do usuário (padrão: todos)')
+    for campo in FILTROS_PERMITIDOS:
+        parser.add_argument(f'--{campo}', help=f'Filtrar por {campo}')
+    parser.add_argument('--lote', type=int, help='Projetos por lote')
+    args = parser.parse_args(argv)
+
+    filtros = {campo: getattr(args, campo) for campo in FILTROS_PERMITIDOS if getattr(args, campo)}
+    relatorio = recalcular_projetos(args.usuario, filtros=filtros, tamanho_lote=args.lote)
+    print(f"✓ {relatorio['processados']} projetos recalculados, {relatorio['atualizados']} atualizados")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from config import Config
+from database.connection import get_db
+from database.init_db import init_database
+
+_varredura = None
+_varredura_lock = threading.Lock()
+
+def _raiz():
+    return Config.UPLOAD_FOLDER
+
+def caminho_absoluto(arquivo):
+    return os.path.join(_raiz(), arquivo)
+
+def relativo(caminho):
+    """Nome do documento no índice: caminho relativo a uploads/ com '/'"""
+    return os.path.relpath(caminho, _raiz()).replace(os.sep, '/')
+
+def caminho_novo(nome):
+    """Caminho absoluto para um documento novo, em subdiretórios ab/cd/ derivados do nome"""
+    shard = hashlib.sha1(nome.encode('utf-8')).hexdigest()
+    pasta = os.path.join(_raiz(), shard[:2], shard[2:4])
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, nome)
+
+def registrar(caminho, usuario_id=None, projeto_id=None, versao_projeto=None):
+    """Registra um documento recém-gravado no índice e devolve o nome relativo.
+
+    versao_projeto liga o documento à revisão do projeto (project_history) usada na renderização.
+    """
+    arquivo = relativo(caminho)
+    with get_db() as conn:
+        conn.execute(
+            '''INSERT INTO documentos_gerados (arquivo, usuario_id, projeto_id, versao_projeto, tamanho)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(arquivo) DO UPDATE SET
+                   tamanho = excluded.tamanho, ultimo_acesso = CURRENT_TIMESTAMP''',
+            (arquivo, usuario_id, projeto_id, versao_projeto, os.path.getsize(caminho))
+        )
+    return arquivo
+
+def tocar(arquivo, projeto_id=None, versao_projeto=None):
+    """Atualiza o último acesso de um documento (ex.: reaproveitado pelo cache de memoriais).
+
+    Com versao_projeto, o documento passa a valer para essa revisão do projeto: o cache
+    só o reaproveita quando o conteúdo renderizado seria o mesmo.
+    """
+    with get_db() as conn:
+        conn.execute(
+            '''UPDATE documentos_gerados SET ultimo_acesso = CURRENT_TIMESTAMP,
+                   versao_projeto = CASE WHEN ? IS NOT NULL AND projeto_id = ? THEN ? ELSE versao_projeto END
+               WHERE arquivo = ?''',
+            (versao_projeto, projeto_id, versao_projeto, arquivo)
+        )
+
+def abrir(arquivo, usuario_id):
+    """Caminho absoluto do documento se ele existir e pertencer ao usuário, ou None.
+
+    Só nomes presentes no índice são resolvidos, então o nome recebido da URL
+    nunca é usado para montar um caminho arbitrário.
+    """
+    with get_db() as conn:
+        entrada = conn.execute(
+            'SELECT arquivo FROM documentos_gerados WHERE arquivo = ? AND usuario_id = ?',
+            (arquivo, usuario_id)
+        ).fetchone()
+        if not entrada:
+            return None
+
+        caminho = caminho_absoluto(entrada['arquivo'])
+        if not os.path.exists(caminho):
+            remover_entradas(conn, [entrada['arquivo']])
+            return None
+
+        conn.execute(
+            'UPDATE documentos_gerados SET ultimo_acesso = CURRENT_TIMESTAMP WHERE arquivo = ?',
+            (arquivo,)
+        )
+        return caminho
+
+def remover_entradas(conn, arquivos):
+    """Tira os documentos do índice e do cache de memoriais.
+
+    Os arquivos são apagados depois do commit, com apagar_arquivos, para não
+    segurar o lock de escrita do SQLite durante o acesso ao disco.
+    """
+    parametros = [(arquivo,) for arquivo in arquivos]
+    conn.executemany('DELETE FROM documentos_gerados WHERE arquivo = ?', parametros)
+    conn.executemany('DELETE FROM cache_memoriais WHERE arquivo = ?', parametros)
+
+def apagar_arquivos(arquivos, lote=500):
+    """Apaga de uploads/ os arquivos já removidos do índice, fora de qualquer transação.
+
+    Pula os que voltaram ao índice nesse meio tempo (nomes de antes dos nomes únicos por renderização).
+    """
+    arquivos = list(arquivos)
+    for inicio in range(0, len(arquivos), lote):
+        parte = arquivos[inicio:inicio + lote]
+        marcadores = ', '.join('?' for _ in parte)
+        with get_db() as conn:
+            reindexados = {linha['arquivo'] for linha in conn.execute(
+                f'''SELECT arquivo FROM documentos_gerados WHERE arquivo IN ({marcadores})
+                    UNION SELECT arquivo FROM cache_memoriais WHERE arquivo IN ({marcadores})''',
+                parte + parte
+            )}
+        for arquivo in parte:
+            if arquivo in reindexados:
+                continue
+            try:
+                os.remove(caminho_absoluto(arquivo))
+            except FileNotFoundError:
+                pass
+
+def _remover_orfaos(max_idade_dias):
+    """Arquivos em uploads/ fora do índice (ex.: de antes dele) mais antigos que o limite de idade.
+
+    O índice é lido numa transação curta e a pasta percorrida fora dela; arquivos
+    gravados durante a varredura são novos demais para passar do limite de idade.
+    """
+    with get_db() as conn:
+        conhecidos = {linha['arquivo'] for linha in conn.execute(
+            'SELECT arquivo FROM documentos_gerados UNION SELECT arquivo FROM cache_memoriais'
+        )}
+    limite = time.time() - max_idade_dias * 86400
+    removidos = 0
+    for pasta, _, nomes in os.walk(_raiz()):
+        for nome in nomes:
+            caminho = os.path.join(pasta, nome)
+            if relativo(caminho) in conhecidos:
+                continue
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except FileNotFoundError:
+                pass
+    return removidos
+
+def varrer(max_bytes=None, max_idade_dias=None, orfaos=True):
+    """Aplica os limites de idade e de tamanho a uploads/.
+
+    Primeiro remove os documentos sem acesso há mais de max_idade_dias; depois,
+    se o total ainda passar de max_bytes, remove os menos usados recentemente (LRU).
+    Só as remoções do índice ficam na transação; os arquivos são apagados e a
+    pasta percorrida depois do commit.
+    """
+    max_bytes = Config.DOCUMENTOS_MAX_BYTES if max_bytes is None else max_bytes
+    max_idade_dias = Config.DOCUMENTOS_MAX_IDADE_DIAS if max_idade_dias is None else max_idade_dias
+
+    with get_db() as conn:
+        expirados = [linha['arquivo'] for linha in conn.execute(
+            "SELECT arquivo FROM documentos_gerados WHERE ultimo_acesso < datetime('now', ?)",
+            (f'-{int(max_idade_dias)} days',)
+        )]
+        remover_entradas(conn, expirados)
+
+        total = conn.execute(
+            'SELECT COALESCE(SUM(tamanho), 0) as total FROM documentos_gerados'
+        ).fetchone()['total']
+        excedentes = []
+        if total > max_bytes:
+            for entrada in conn.execute(
+                'SELECT arquivo, tamanho FROM documentos_gerados ORDER BY ultimo_acesso, data_criacao'
+            ).fetchall():
+                if total <= max_bytes:
+                    break
+                excedentes.append(entrada['arquivo'])
+                total -= entrada['tamanho']
+            remover_entradas(conn, excedentes)
+
+    apagar_arquivos(expirados + excedentes)
+    orfaos_removidos = _remover_orfaos(max_idade_dias) if orfaos else 0
+
+    return {
+        'expirados': len(expirados),
+        'excedentes': len(excedentes),
+        'orfaos': orfaos_removidos,
+        'bytes': total,
+    }
+
+def indexar_legado():
+    """Indexa os memoriais do cache gravados antes do índice, com o dono do projeto de origem"""
+    with get_db() as conn:
+        entradas = conn.execute(
+            '''SELECT c.arquivo, c.projeto_id, c.tamanho, c.data_criacao, c.ultimo_acesso, p.usuario_id
+               FROM cache_memoriais c LEFT JOIN projetos p ON p.id = c.projeto_id
+               WHERE c.arquivo NOT IN (SELECT arquivo FROM documentos_gerados)'''
+        ).fetchall()
+        conn.executemany(
+            '''INSERT INTO documentos_gerados
+               (arquivo, usuario_id, projeto_id, tamanho, data_criacao, ultimo_acesso)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            [(e['arquivo'], e['usuario_id'], e['projeto_id'], e['tamanho'], e['data_criacao'], e['ultimo_acesso'])
+             for e in entradas]
+        )
+    return len(entradas)
+
+def iniciar_varredura_periodica(intervalo):
+    """Roda varrer() a cada intervalo segundos numa thread daemon (uma por processo)"""
+    global _varredura
+    if intervalo <= 0:
+        return None
+
+    def executar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                varrer()
+            except Exception as e:
+                print(f'Erro na varredura de documentos: {e}', file=sys.stderr)
+
+    with _varredura_lock:
+        if _varredura is None or not _varredura.is_alive():
+            _varredura = threading.Thread(target=executar, name='varredura-documentos', daemon=True)
+            _varredura.start()
+    return _varredura
+
+def stats():
+    """Tamanho atual de uploads/ segundo o índice"""
+    with get_db() as conn:
+        linha = conn.execute(
+            'SELECT COUNT(*) as documentos, COALESCE(SUM(tamanho), 0) as bytes FROM documentos_gerados'
+        ).fetchone()
+    return {
+        'documentos': linha['documentos'],
+        'bytes': linha['bytes'],
+        'max_bytes': Config.DOCUMENTOS_MAX_BYTES,
+        'max_idade_dias': Config.DOCUMENTOS_MAX_IDADE_DIAS,
+    }
+
+def main(argv=None):
+    """Aplica a política de retenção aos documentos gerados em uploads/"""
+    parser = argparse.ArgumentParser(description='Retenção dos documentos gerados em uploads/')
+    parser.add_argument('--max-bytes', type=int, help='Tamanho máximo de uploads/ (padrão: configuração)')
+    parser.add_argument('--max-idade-dias', type=int, help='Dias sem acesso até a remoção (padrão: configuração)')
+    parser.add_argument('--sem-orfaos', action='store_true', help='Não remove arquivos fora do índice')
+    parser.add_argument('--indexar-legado', action='store_true',
+                        help='Indexa antes os memoriais do cache gravados sem o índice')
+    args = parser.parse_args(argv)
+
+    # Garante a tabela do índice em bancos criados antes dela
+    init_database()
+    if args.indexar_legado:
+        print(f'✓ {indexar_legado()} documentos legados indexados')
+    relatorio = varrer(args.max_bytes, args.max_idade_dias, not args.sem_orfaos)
+    print(f"✓ {relatorio['expirados']} expirados, {relatorio['excedentes']} acima do limite e "
+          f"{relatorio['orfaos']} órfãos removidos; {relatorio['bytes']} bytes em uso")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
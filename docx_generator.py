@@ -1,41 +1,130 @@
 import os
+import io
+import re
 import json
+import uuid
 from datetime import datetime
-from docxtpl import DocxTemplate
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from config import Config
+from template_registry import registry as template_registry
+import memorial_cache
+import document_store
+import metrics
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'modelo_memorial_v2.docx')
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Projeto de exemplo renderizado no aquecimento, antes de atender requisições
+PROJETO_AQUECIMENTO = {
+    'nome_cliente': 'Aquecimento',
+    'tipo_projeto': 'Instalação Nova',
+    'modulos_novos': [{'modelo': 'Modulo', 'potencia': 550, 'quantidade': 10}],
+    'inversores_novos': [{'modelo': 'Inversor', 'potencia': 5000, 'quantidade': 1}],
+}
 
 def generate_memorial_docx(projeto):
-    """Gera um documento DOCX do memorial descritivo fotovoltaico"""
+    """Gera um documento DOCX do memorial descritivo fotovoltaico.
     
-    # Caminho do template
-    template_path = os.path.join(os.path.dirname(__file__), 'templates', 'modelo_memorial_v2.docx')
-    
-    # Se o template não existir, criar um documento básico
-    if not os.path.exists(template_path):
-        return generate_memorial_from_scratch(projeto)
-    
-    # Carregar template
-    doc = DocxTemplate(template_path)
+    Se um memorial com o mesmo conteúdo e versão de template já foi gerado,
+    retorna o arquivo existente sem renderizar novamente.
+    """
     
     # Preparar contexto para o template
-    context = prepare_context(projeto)
+    with metrics.fase('contexto'):
+        context = prepare_context(projeto)
     
-    # Renderizar template
-    doc.render(context)
+    chave = None
+    if Config.MEMORIAL_CACHE_ENABLED:
+        with metrics.fase('cache'):
+            versao = template_registry.versao(TEMPLATE_PATH) or 'sem-template'
+            chave = memorial_cache.calcular_chave(context, versao, projeto.get('usuario_id'))
+            cached_path = memorial_cache.buscar(chave)
+        if cached_path:
+            document_store.tocar(document_store.relativo(cached_path), projeto.get('id'), projeto.get('versao'))
+            return cached_path
     
-    # Salvar documento
-    output_folder = os.path.join(os.path.dirname(__file__), 'uploads')
-    os.makedirs(output_folder, exist_ok=True)
+    doc = build_memorial_document(projeto, context)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    nome_arquivo = f"Memorial_{projeto['nome_cliente']}_{timestamp}.docx"
-    output_path = os.path.join(output_folder, nome_arquivo)
+    # Salvar documento
+    output_path = _output_path(projeto)
+    with metrics.fase('save'):
+        doc.save(output_path)
+    document_store.registrar(output_path, projeto.get('usuario_id'), projeto.get('id'), projeto.get('versao'))
     
-    doc.save(output_path)
+    if chave:
+        memorial_cache.registrar(chave, output_path, projeto.get('id'))
     
     return output_path
 
+def render_memorial_bytes(projeto):
+    """Gera o memorial em memória e retorna o conteúdo do DOCX, sem gravar em uploads/.
+
+    Como o documento não entra em documentos_gerados, o projeto e a revisão usada
+    ficam gravados nas propriedades do próprio arquivo.
+    """
+    buffer = io.BytesIO()
+    doc = build_memorial_document(projeto)
+    _carimbar_revisao(doc, projeto)
+    with metrics.fase('save'):
+        doc.save(buffer)
+    return buffer.getvalue()
+
+def _carimbar_revisao(doc, projeto):
+    """Grava id e versão do projeto nas propriedades do DOCX (identifier e version)"""
+    if projeto.get('id') is None:
+        return
+    propriedades = doc.core_properties
+    propriedades.identifier = f"projeto:{projeto['id']}"
+    versao = projeto.get('versao')
+    propriedades.version = '' if versao is None else str(versao)
+
+def aquecer():
+    """Carrega e compila o template renderizando um memorial de exemplo em memória.
+
+    Chamado antes do fork dos workers (ver create_app), o template compilado fica
+    compartilhado entre eles em copy-on-write. Retorna o tamanho do DOCX gerado.
+    """
+    return len(render_memorial_bytes(PROJETO_AQUECIMENTO))
+
+def build_memorial_document(projeto, context=None):
+    """Renderiza o memorial e retorna o documento pronto para salvar"""
+    
+    # Carregar template já compilado do registro
+    with metrics.fase('template'):
+        doc = template_registry.get(TEMPLATE_PATH)
+    
+    # Se o template não existir, criar um documento básico
+    if doc is None:
+        return build_memorial_from_scratch(projeto)
+    
+    # Preparar contexto para o template
+    if context is None:
+        with metrics.fase('contexto'):
+            context = prepare_context(projeto)
+    
+    # Renderizar template
+    with metrics.fase('render'):
+        doc.render(context)
+    
+    return doc
+
+def _nome_cliente(projeto):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', projeto.get('nome_cliente') or '').strip('_') or 'projeto'
+
+def nome_download(projeto):
+    """Nome sugerido para o memorial baixado diretamente, sem passar por uploads/"""
+    return f"Memorial_{_nome_cliente(projeto)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+
+def _output_path(projeto):
+    """Caminho do arquivo gerado em uploads/ (em subdiretórios, ver document_store).
+
+    O nome é único por renderização: um arquivo removido do índice e ainda não apagado
+    (document_store.apagar_arquivos) nunca é o mesmo de um memorial gerado depois.
+    """
+    sufixo = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+    nome_arquivo = f"Memorial_{_nome_cliente(projeto)}_{projeto.get('id') or 'novo'}_{sufixo}.docx"
+    return document_store.caminho_novo(nome_arquivo)
+
 def prepare_context(projeto):
     """Prepara o contexto para renderizar o template Jinja"""
     
@@ -113,6 +202,13 @@ def prepare_context(projeto):
 
 def generate_memorial_from_scratch(projeto):
     """Gera um memorial do zero se o template não existir"""
+    output_path = _output_path(projeto)
+    build_memorial_from_scratch(projeto).save(output_path)
+    document_store.registrar(output_path, projeto.get('usuario_id'), projeto.get('id'), projeto.get('versao'))
+    return output_path
+
+def build_memorial_from_scratch(projeto):
+    """Monta o documento do memorial sem template"""
     from docx import Document
     from docx.shared import Pt, RGBColor, Inches
     from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -193,14 +289,4 @@ def generate_memorial_from_scratch(projeto):
     footer = doc.add_paragraph(f"Documento gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
     
-    # Salvar
-    output_folder = os.path.join(os.path.dirname(__file__), 'uploads')
-    os.makedirs(output_folder, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    nome_arquivo = f"Memorial_{projeto['nome_cliente']}_{timestamp}.docx"
-    output_path = os.path.join(output_folder, nome_arquivo)
-    
-    doc.save(output_path)
-    
-    return output_path
+    return doc
@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import uuid
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from database.connection import get_db
+import document_store
+import metrics
+
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+_executor = None
+_executor_lock = threading.Lock()
+_ultima_limpeza = 0.0
+
+# Intervalo mínimo entre duas remoções de jobs antigos (segundos)
+LIMPEZA_INTERVALO = 600
+
+class FilaCheia(Exception):
+    """A fila de geração atingiu o limite configurado"""
+
+class PoolIndisponivel(Exception):
+    """O pool de processos não aceitou o job nem depois de recriado"""
+
+def _pid_ativo(pid):
+    """Verifica se um processo ainda está rodando"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _recuperar_jobs_orfaos():
+    """Marca como erro os jobs cujo processo dono não existe mais"""
+    with get_db() as conn:
+        jobs = conn.execute(
+            'SELECT id, worker_pid FROM jobs_docx WHERE status IN (?, ?)',
+            (STATUS_PENDENTE, STATUS_PROCESSANDO)
+        ).fetchall()
+        orfaos = [(job['id'],) for job in jobs if not job['worker_pid'] or not _pid_ativo(job['worker_pid'])]
+        conn.executemany(
+            '''UPDATE jobs_docx SET status = 'erro', erro = 'Job interrompido',
+               data_conclusao = CURRENT_TIMESTAMP WHERE id = ?''',
+            orfaos
+        )
+
+def _get_executor(max_workers):
+    """Cria o pool de processos na primeira utilização (e de novo depois de descartado)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from batch_export import _contexto
+                _recuperar_jobs_orfaos()
+                # Mesmo contexto das exportações: fork copiaria threads e locks do processo web
+                _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=_contexto())
+    return _executor
+
+def _descartar_executor(executor):
+    """Descarta um pool quebrado (processo filho morto ou pool encerrado); o próximo job cria outro"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _marcar_erro(job_id, mensagem):
+    with get_db() as conn:
+        conn.execute(
+            '''UPDATE jobs_docx SET status = ?, erro = ?, data_conclusao = CURRENT_TIMESTAMP
+               WHERE id = ?''',
+            (STATUS_ERRO, mensagem, job_id)
+        )
+
+def _expirar_jobs(conn, timeout):
+    """Marca como erro os jobs pendentes/processando há mais de timeout segundos.
+
+    Cobre jobs cujo callback não gravou o resultado, para que não contem na fila para sempre.
+    """
+    conn.execute(
+        '''UPDATE jobs_docx SET status = ?, erro = 'Tempo esgotado', data_conclusao = CURRENT_TIMESTAMP
+           WHERE status IN (?, ?) AND data_criacao < datetime('now', ?)''',
+        (STATUS_ERRO, STATUS_PENDENTE, STATUS_PROCESSANDO, f'-{int(timeout)} seconds')
+    )
+
+def _remover_jobs_antigos(conn, dias):
+    """Apaga os jobs encerrados há mais de `dias` dias (no máximo uma vez a cada LIMPEZA_INTERVALO)"""
+    global _ultima_limpeza
+    agora = time.monotonic()
+    if agora - _ultima_limpeza < LIMPEZA_INTERVALO:
+        return
+    _ultima_limpeza = agora
+    conn.execute(
+        '''DELETE FROM jobs_docx WHERE status IN (?, ?) AND data_criacao < datetime('now', ?)''',
+        (STATUS_CONCLUIDO, STATUS_ERRO, f'-{int(dias)} days')
+    )
+
+def _executar_job(job_id, projeto):
+    """Roda no processo filho: renderiza o memorial e devolve o nome do arquivo em uploads/
+    e os tempos das fases, registrados em /metrics pelo processo web"""
+    from docx_generator import generate_memorial_docx
+    with get_db() as conn:
+        conn.execute(
+            'UPDATE jobs_docx SET status = ?, data_inicio = CURRENT_TIMESTAMP WHERE id = ?',
+            (STATUS_PROCESSANDO, job_id)
+        )
+    arquivo, fases = metrics.com_fases(generate_memorial_docx, projeto)
+    return document_store.relativo(arquivo), fases
+
+def _finalizar_job(job_id, executor, future):
+    """Callback no processo web: grava o resultado do job"""
+    try:
+        arquivo, fases = future.result()
+    except BrokenProcessPool as e:
+        _descartar_executor(executor)
+        erro = str(e) or e.__class__.__name__
+    except Exception as e:
+        erro = str(e) or e.__class__.__name__
+    else:
+        erro = None
+
+    # Falhas aqui deixariam o job 'processando' até expirar (DOCX_JOB_TIMEOUT_S)
+    try:
+        if erro is not None:
+            _marcar_erro(job_id, erro)
+            return
+        metrics.observar_fases(fases)
+        with get_db() as conn:
+            conn.execute(
+                '''UPDATE jobs_docx SET status = ?, arquivo = ?, data_conclusao = CURRENT_TIMESTAMP
+                   WHERE id = ?''',
+                (STATUS_CONCLUIDO, arquivo, job_id)
+            )
+    except Exception as e:
+        print(f'Erro ao gravar o resultado do job {job_id}: {e}', file=sys.stderr)
+
+def enfileirar(usuario_id, projeto, max_workers, max_fila):
+    """Registra um job de geração e envia para o pool.
+
+    Levanta FilaCheia quando já existem max_fila jobs pendentes/processando e
+    PoolIndisponivel quando o pool recusa o job mesmo depois de recriado.
+    """
+    job_id = uuid.uuid4().hex
+
+    with get_db() as conn:
+        _expirar_jobs(conn, Config.DOCX_JOB_TIMEOUT_S)
+        _remover_jobs_antigos(conn, Config.DOCX_JOB_RETENCAO_DIAS)
+        # Checagem e inserção numa única instrução para não estourar o limite sob concorrência
+        cursor = conn.execute(
+            '''INSERT INTO jobs_docx (id, usuario_id, projeto_id, status, worker_pid)
+               SELECT ?, ?, ?, ?, ?
+               WHERE (SELECT COUNT(*) FROM jobs_docx WHERE status IN (?, ?)) < ?''',
+            (job_id, usuario_id, projeto['id'], STATUS_PENDENTE, os.getpid(),
+             STATUS_PENDENTE, STATUS_PROCESSANDO, max_fila)
+        )
+        if cursor.rowcount == 0:
+            raise FilaCheia()
+
+    # Um pool quebrado (filho morto, shutdown) é descartado e recriado uma vez
+    for tentativa in range(2):
+        executor = _get_executor(max_workers)
+        try:
+            future = executor.submit(_executar_job, job_id, projeto)
+            break
+        except (BrokenProcessPool, RuntimeError) as e:
+            _descartar_executor(executor)
+            erro = str(e) or e.__class__.__name__
+    else:
+        _marcar_erro(job_id, erro)
+        raise PoolIndisponivel(erro)
+
+    future.add_done_callback(lambda f: _finalizar_job(job_id, executor, f))
+    return job_id
+
+def obter_job(job_id, usuario_id):
+    """Retorna o job do usuário como dicionário, ou None"""
+    with get_db() as conn:
+        job = conn.execute(
+            'SELECT * FROM jobs_docx WHERE id = ? AND usuario_id = ?',
+            (job_id, usuario_id)
+        ).fetchone()
+    return dict(job) if job else None
+
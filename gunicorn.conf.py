@@ -0,0 +1,17 @@
+# Configuração do Gunicorn: gunicorn -c gunicorn.conf.py
+#
+# Com preload_app a aplicação é criada uma vez no processo mestre, já com o template
+# do memorial compilado (create_app(aquecer=True)); os workers a herdam no fork e
+# compartilham essa memória em copy-on-write.
+#
+# Workers com threads (gthread): o escritor único do SQLite (DB_WRITE_QUEUE) e o pool de
+# hash de senhas são por processo, então só agrupam e limitam as requisições que chegam
+# ao mesmo worker. Poucos processos com várias threads concentram essas requisições.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+wsgi_app = 'app:create_app(aquecer=True)'
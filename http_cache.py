@@ -0,0 +1,41 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import request, session, make_response
+from werkzeug.http import is_resource_modified
+
+# Páginas e JSON por usuário: o navegador guarda, mas revalida a cada uso (304 se nada mudou)
+CACHE_CONTROL = 'private, no-cache'
+
+def etag(*partes):
+    """ETag a partir das versões que determinam o conteúdo da resposta"""
+    return hashlib.sha1('|'.join(map(str, partes)).encode('utf-8')).hexdigest()[:24]
+
+def data_http(valor):
+    """Converte um timestamp do SQLite (CURRENT_TIMESTAMP, UTC) para Last-Modified"""
+    if not valor:
+        return None
+    try:
+        data = datetime.fromisoformat(str(valor))
+    except ValueError:
+        return None
+    return data.replace(tzinfo=timezone.utc) if data.tzinfo is None else data
+
+def nao_modificado(tag, ultima_modificacao=None):
+    """Resposta 304 se o cliente já tem essa versão (If-None-Match/If-Modified-Since), senão None.
+
+    Com mensagens flash pendentes a página precisa ser renderizada para exibi-las.
+    """
+    if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+        return None
+    if is_resource_modified(request.environ, etag=tag, last_modified=ultima_modificacao):
+        return None
+    return condicional(make_response('', 304), tag, ultima_modificacao)
+
+def condicional(response, tag, ultima_modificacao=None):
+    """Adiciona ETag, Last-Modified e Cache-Control a uma resposta"""
+    response = make_response(response)
+    response.set_etag(tag)
+    if ultima_modificacao is not None:
+        response.last_modified = ultima_modificacao
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
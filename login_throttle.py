@@ -0,0 +1,60 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+class Limitador:
+    """Limite de falhas por chave (IP ou email) numa janela deslizante, em memória do processo"""
+
+    def __init__(self, max_falhas=5, janela=300, max_chaves=10000):
+        self.max_falhas = max_falhas
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self._falhas = OrderedDict()
+        self._lock = threading.Lock()
+        self.bloqueios = 0
+
+    def _recentes(self, chave, agora):
+        """Falhas da chave ainda dentro da janela (descarta as antigas)"""
+        falhas = self._falhas.get(chave)
+        if falhas is None:
+            return None
+        while falhas and falhas[0] <= agora - self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self._falhas[chave]
+            return None
+        return falhas
+
+    def espera(self, chave):
+        """Segundos até a chave poder tentar de novo, ou 0 se ela não estiver bloqueada"""
+        agora = time.monotonic()
+        with self._lock:
+            falhas = self._recentes(chave, agora)
+            if falhas is None or len(falhas) < self.max_falhas:
+                return 0
+            self.bloqueios += 1
+            return max(1, int(falhas[0] + self.janela - agora + 1))
+
+    def falha(self, chave):
+        with self._lock:
+            falhas = self._recentes(chave, time.monotonic())
+            if falhas is None:
+                falhas = self._falhas[chave] = deque(maxlen=self.max_falhas)
+            falhas.append(time.monotonic())
+            self._falhas.move_to_end(chave)
+            while len(self._falhas) > self.max_chaves:
+                self._falhas.popitem(last=False)
+
+    def limpar(self, chave):
+        """Zera as falhas da chave (login bem-sucedido)"""
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'chaves': len(self._falhas),
+                'max_falhas': self.max_falhas,
+                'janela': self.janela,
+                'bloqueios': self.bloqueios,
+            }
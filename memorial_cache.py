@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+from config import Config
+from database.connection import get_db
+import document_store
+
+# Campos do contexto que mudam a cada geração e não alteram o conteúdo do projeto
+CAMPOS_VOLATEIS = ('data_geracao',)
+
+def calcular_chave(context, versao_template, usuario_id=None):
+    """Chave de conteúdo: hash do contexto renderizado (sem campos voláteis) + versão do template.
+
+    O dono entra na chave para um usuário nunca receber o arquivo gerado para outro.
+    """
+    estavel = {k: v for k, v in context.items() if k not in CAMPOS_VOLATEIS}
+    payload = json.dumps(estavel, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f'{versao_template}\n{usuario_id}\n{payload}'.encode('utf-8')).hexdigest()
+
+def _caminho(arquivo):
+    return document_store.caminho_absoluto(arquivo)
+
+def buscar(chave):
+    """Retorna o caminho do memorial já gerado para a chave, ou None"""
+    with get_db() as conn:
+        entrada = conn.execute(
+            'SELECT arquivo FROM cache_memoriais WHERE chave = ?', (chave,)
+        ).fetchone()
+        if not entrada:
+            return None
+
+        if not os.path.exists(_caminho(entrada['arquivo'])):
+            conn.execute('DELETE FROM cache_memoriais WHERE chave = ?', (chave,))
+            return None
+
+        conn.execute(
+            'UPDATE cache_memoriais SET ultimo_acesso = CURRENT_TIMESTAMP WHERE chave = ?',
+            (chave,)
+        )
+        return _caminho(entrada['arquivo'])
+
+def registrar(chave, caminho, projeto_id=None):
+    """Registra um memorial recém-gerado e aplica o limite de tamanho do cache"""
+    tamanho = os.path.getsize(caminho)
+    arquivo = document_store.relativo(caminho)
+    with get_db() as conn:
+        conn.execute(
+            '''INSERT OR REPLACE INTO cache_memoriais (chave, arquivo, projeto_id, tamanho)
+               VALUES (?, ?, ?, ?)''',
+            (chave, arquivo, projeto_id, tamanho)
+        )
+    evict(Config.MEMORIAL_CACHE_MAX_BYTES)
+
+def evict(max_bytes):
+    """Remove os memoriais menos usados recentemente até o cache caber em max_bytes"""
+    with get_db() as conn:
+        total = conn.execute(
+            'SELECT COALESCE(SUM(tamanho), 0) as total FROM cache_memoriais'
+        ).fetchone()['total']
+        if total <= max_bytes:
+            return 0
+
+        removidos = []
+        for entrada in conn.execute(
+            'SELECT arquivo, tamanho FROM cache_memoriais ORDER BY ultimo_acesso, data_criacao'
+        ).fetchall():
+            if total <= max_bytes:
+                break
+            removidos.append(entrada['arquivo'])
+            total -= entrada['tamanho']
+
+        # Remove também do índice de documentos gerados
+        document_store.remover_entradas(conn, removidos)
+
+    # Arquivos apagados depois do commit, sem segurar o lock de escrita
+    document_store.apagar_arquivos(removidos)
+    return len(removidos)
+
+def stats():
+    """Tamanho atual do cache de memoriais"""
+    with get_db() as conn:
+        linha = conn.execute(
+            'SELECT COUNT(*) as documentos, COALESCE(SUM(tamanho), 0) as bytes FROM cache_memoriais'
+        ).fetchone()
+    return {'documentos': linha['documentos'], 'bytes': linha['bytes'],
+            'max_bytes': Config.MEMORIAL_CACHE_MAX_BYTES}
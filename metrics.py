@@ -0,0 +1,241 @@
+import re
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Limites (segundos) dos buckets dos histogramas de latência
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Séries (combinações de rótulos) por métrica; as que passarem disso são somadas em 'outros'
+MAX_SERIES = 200
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Contador:
+    """Contador monotônico com rótulos"""
+
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *rotulos, valor=1):
+        with self._lock:
+            if rotulos not in self._valores and len(self._valores) >= MAX_SERIES:
+                rotulos = ('outros',) * len(rotulos)
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def linhas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for rotulos, valor in valores:
+            yield f'{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}'
+
+class Histograma:
+    """Histograma com buckets cumulativos no formato do Prometheus"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *rotulos):
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                if len(self._series) >= MAX_SERIES:
+                    rotulos = ('outros',) * len(rotulos)
+                    serie = self._series.get(rotulos)
+            if serie is None:
+                # contagens por bucket (+Inf no fim), soma
+                serie = self._series[rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def linhas(self):
+        with self._lock:
+            series = sorted((rotulos, (list(contagens), soma)) for rotulos, (contagens, soma) in self._series.items())
+        for rotulos, (contagens, soma) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + ('+Inf',), contagens):
+                acumulado += contagem
+                le = limite if limite == '+Inf' else _numero(float(limite))
+                yield f'{self.nome}_bucket{_rotulos(self.rotulos, rotulos, ("le", le))} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {_numero(soma)}'
+            yield f'{self.nome}_count{_rotulos(self.rotulos, rotulos)} {acumulado}'
+
+class Registro:
+    """Métricas do processo, exportadas no formato texto do Prometheus"""
+
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS):
+        metrica = Histograma(nome, ajuda, rotulos, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica.linhas())
+        return '\n'.join(linhas) + '\n'
+
+registry = Registro()
+
+requisicoes = registry.histograma(
+    'solar_http_request_duration_seconds', 'Latência das requisições HTTP por rota',
+    ('rota', 'metodo', 'status')
+)
+sql_duracao = registry.histograma(
+    'solar_sql_statement_duration_seconds', 'Tempo de execução de cada statement SQL', ('statement',)
+)
+sql_erros = registry.contador(
+    'solar_sql_statement_errors_total', 'Statements SQL que terminaram em erro', ('statement',)
+)
+fases_memorial = registry.histograma(
+    'solar_memorial_phase_duration_seconds', 'Tempo de cada fase da geração de memoriais', ('fase',)
+)
+escrita_lote = registry.histograma(
+    'solar_db_write_batch_size', 'Escritas por transação do escritor único',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+escrita_espera = registry.histograma(
+    'solar_db_write_wait_seconds', 'Tempo de cada escrita na fila até o início do seu lote'
+)
+escrita_commit = registry.histograma(
+    'solar_db_write_batch_duration_seconds', 'Tempo de cada lote do escritor único, do BEGIN ao COMMIT'
+)
+hash_senha = registry.histograma(
+    'solar_password_hash_duration_seconds', 'Tempo de cada hash de senha no pool, incluindo a espera', ('operacao',)
+)
+hash_senha_recusados = registry.contador(
+    'solar_password_hash_rejected_total', 'Hashes de senha recusados com o pool e a fila cheios', ('operacao',)
+)
+login_bloqueios = registry.contador(
+    'solar_login_throttled_total', 'Tentativas de login ou registro bloqueadas pelo limite de falhas', ('motivo',)
+)
+
+def gauges(prefixo, ajuda, valores):
+    """Texto Prometheus de um dicionário de estatísticas numéricas (ex.: pool_stats())"""
+    linhas = []
+    for chave, valor in valores.items():
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            continue
+        nome = f'{prefixo}_{chave}'
+        linhas.append(f'# HELP {nome} {ajuda} ({chave})')
+        linhas.append(f'# TYPE {nome} gauge')
+        linhas.append(f'{nome} {_numero(valor)}')
+    return '\n'.join(linhas) + '\n' if linhas else ''
+
+_VERBO_RE = re.compile(r'\s*(\w+)')
+_TABELA_RE = {
+    'SELECT': re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE),
+    'WITH': re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE),
+    'DELETE': re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE),
+    'INSERT': re.compile(r'\bINTO\s+"?(\w+)', re.IGNORECASE),
+    'REPLACE': re.compile(r'\bINTO\s+"?(\w+)', re.IGNORECASE),
+    'UPDATE': re.compile(r'^\s*UPDATE\s+(?:OR\s+\w+\s+)?"?(\w+)', re.IGNORECASE),
+}
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql):
+    """Rótulo do statement: verbo e tabela principal ('UPDATE projetos', 'COMMIT').
+
+    O texto completo geraria uma série por combinação de campos/filtros das
+    consultas montadas dinamicamente (PATCH, listagem).
+    """
+    verbo = _VERBO_RE.match(sql)
+    if verbo is None:
+        return 'outro'
+    verbo = verbo.group(1).upper()
+    padrao = _TABELA_RE.get(verbo)
+    tabela = padrao.search(sql) if padrao else None
+    return f'{verbo} {tabela.group(1).lower()}' if tabela else verbo
+
+# Detalhamento da requisição (ou job) em andamento na thread atual
+_local = threading.local()
+
+def iniciar_detalhamento():
+    _local.detalhe = {'sql_statements': 0, 'sql_segundos': 0.0, 'fases': {}}
+
+def finalizar_detalhamento():
+    detalhe = getattr(_local, 'detalhe', None)
+    _local.detalhe = None
+    return detalhe
+
+def registrar_sql(sql, duracao, erro=False):
+    """Chamado pela camada de conexão a cada statement executado"""
+    statement = normalizar_sql(sql)
+    sql_duracao.observar(duracao, statement)
+    if erro:
+        sql_erros.inc(statement)
+    detalhe = getattr(_local, 'detalhe', None)
+    if detalhe is not None:
+        detalhe['sql_statements'] += 1
+        detalhe['sql_segundos'] += duracao
+
+def com_fases(funcao, *args):
+    """Roda funcao(*args) (num processo filho) e devolve (resultado, tempos das fases).
+
+    O registro de métricas do filho não é exportado; o processo web repassa os
+    tempos com observar_fases.
+    """
+    iniciar_detalhamento()
+    try:
+        resultado = funcao(*args)
+    finally:
+        detalhe = finalizar_detalhamento()
+    return resultado, detalhe['fases']
+
+def observar_fases(fases):
+    """Registra os tempos de fases medidos em outro processo (ver com_fases)"""
+    detalhe = getattr(_local, 'detalhe', None)
+    for nome, duracao in fases.items():
+        fases_memorial.observar(duracao, nome)
+        if detalhe is not None:
+            detalhe['fases'][nome] = detalhe['fases'].get(nome, 0.0) + duracao
+
+@contextmanager
+def fase(nome):
+    """Mede uma fase da geração de memoriais (contexto, template, render, save...)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        fases_memorial.observar(duracao, nome)
+        detalhe = getattr(_local, 'detalhe', None)
+        if detalhe is not None:
+            detalhe['fases'][nome] = detalhe['fases'].get(nome, 0.0) + duracao
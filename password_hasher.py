@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+import metrics
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_vagas = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_MAX_FILA)
+_hash_ficticio = None
+_em_andamento = 0
+
+class HashIndisponivel(Exception):
+    """Limite de cálculos de hash simultâneos atingido"""
+
+def _obter_executor():
+    """Cria o pool de threads de hash na primeira utilização (e de novo após fork)"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='hash-senha'
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+def _executar(operacao, funcao, *args):
+    """Roda o KDF no pool limitado; com o pool e a fila cheios por mais de
+    PASSWORD_HASH_ESPERA_S, levanta HashIndisponivel em vez de acumular requisições"""
+    if not _vagas.acquire(timeout=Config.PASSWORD_HASH_ESPERA_S):
+        metrics.hash_senha_recusados.inc(operacao)
+        raise HashIndisponivel('Muitos logins simultâneos, tente novamente em instantes')
+    global _em_andamento
+    with _executor_lock:
+        _em_andamento += 1
+    try:
+        inicio = time.perf_counter()
+        resultado = _obter_executor().submit(funcao, *args).result()
+        metrics.hash_senha.observar(time.perf_counter() - inicio, operacao)
+        return resultado
+    finally:
+        with _executor_lock:
+            _em_andamento -= 1
+        _vagas.release()
+
+def metodo(senha_hash):
+    """Método e custo gravados no hash do Werkzeug ('scrypt:32768:8:1', 'pbkdf2:sha256:600000'...)"""
+    return senha_hash.split('$', 1)[0] if senha_hash else None
+
+def gerar(senha):
+    """Hash da senha com o método e o custo configurados (PASSWORD_HASH_METHOD)"""
+    return _executar('gerar', generate_password_hash, senha, Config.PASSWORD_HASH_METHOD)
+
+def verificar(senha_hash, senha):
+    """Confere a senha; retorna (ok, novo_hash).
+
+    novo_hash vem preenchido quando a senha confere mas o hash gravado usa outro
+    método ou custo, para ser substituído no banco; com o pool cheio a troca fica
+    para o próximo login. Sem usuário (senha_hash None) a senha é conferida contra
+    um hash fictício, com o mesmo tempo de resposta.
+    """
+    global _hash_ficticio
+    if senha_hash is None:
+        if _hash_ficticio is None:
+            _hash_ficticio = gerar(os.urandom(16).hex())
+        _executar('verificar', check_password_hash, _hash_ficticio, senha)
+        return False, None
+
+    if not _executar('verificar', check_password_hash, senha_hash, senha):
+        return False, None
+    if metodo(senha_hash) != Config.PASSWORD_HASH_METHOD:
+        try:
+            return True, gerar(senha)
+        except HashIndisponivel:
+            return True, None
+    return True, None
+
+def stats():
+    with _executor_lock:
+        em_andamento = _em_andamento
+    return {
+        'workers': Config.PASSWORD_HASH_WORKERS,
+        'max_fila': Config.PASSWORD_HASH_MAX_FILA,
+        'em_andamento': em_andamento,
+    }
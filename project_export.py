@@ -0,0 +1,109 @@
+import io
+import sys
+import csv
+import json
+import argparse
+from database.connection import get_db
+from database.listagem import FILTROS as FILTROS_PERMITIDOS
+from database.equipamentos import anexar_equipamentos
+from project_import import COLUNAS_PROJETO, COLUNAS_DATA_HORA
+
+FORMATOS = ('csv', 'jsonl')
+
+# Mesmas colunas aceitas pela importação, para o arquivo exportado poder ser reimportado
+COLUNAS_EXPORTACAO = ('id',) + COLUNAS_PROJETO + COLUNAS_DATA_HORA + ('modulos_novos', 'inversores_novos')
+
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+def _consulta(usuario_id, filtros):
+    where = ['usuario_id = ?']
+    params = [usuario_id]
+    for campo, valor in (filtros or {}).items():
+        if campo not in FILTROS_PERMITIDOS:
+            raise ValueError(f'Filtro inválido: {campo}')
+        where.append(f'{campo} = ?')
+        params.append(valor)
+
+    colunas = ', '.join(COLUNAS_EXPORTACAO)
+    return f"SELECT {colunas} FROM projetos WHERE {' AND '.join(where)} ORDER BY id", params
+
+def iterar_projetos(usuario_id, filtros=None, tamanho_lote=500):
+    """Percorre os projetos do usuário em lotes, com as listas de equipamentos expandidas.
+
+    O cursor é consumido com fetchmany: só um lote fica em memória por vez.
+    """
+    query, params = _consulta(usuario_id, filtros)
+    with get_db() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(tamanho_lote)
+            if not rows:
+                break
+            yield anexar_equipamentos(conn, [dict(row) for row in rows])
+
+def _linha_csv(projeto):
+    linha = []
+    for coluna in COLUNAS_EXPORTACAO:
+        valor = projeto.get(coluna)
+        if coluna in ('modulos_novos', 'inversores_novos'):
+            valor = json.dumps(valor or [], ensure_ascii=False)
+        linha.append('' if valor is None else valor)
+    return linha
+
+def stream_projetos(usuario_id, formato='csv', filtros=None, tamanho_lote=500):
+    """Produz o arquivo de exportação em pedaços de bytes, um por lote de projetos.
+
+    Os filtros são validados antes do primeiro pedaço, para o erro poder virar um 400.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}')
+    _consulta(usuario_id, filtros)
+
+    def gerar():
+        buffer = io.StringIO()
+        if formato == 'csv':
+            escritor = csv.writer(buffer)
+            # BOM para o Excel reconhecer UTF-8; a importação aceita o arquivo com ou sem ele
+            buffer.write('\ufeff')
+            escritor.writerow(COLUNAS_EXPORTACAO)
+            yield buffer.getvalue().encode('utf-8')
+
+        for lote in iterar_projetos(usuario_id, filtros, tamanho_lote):
+            buffer.seek(0)
+            buffer.truncate()
+            for projeto in lote:
+                if formato == 'csv':
+                    escritor.writerow(_linha_csv(projeto))
+                else:
+                    registro = {coluna: projeto.get(coluna) for coluna in COLUNAS_EXPORTACAO}
+                    buffer.write(json.dumps(registro, ensure_ascii=False, default=str))
+                    buffer.write('\n')
+            yield buffer.getvalue().encode('utf-8')
+
+    return gerar()
+
+def main(argv=None):
+    """Exporta os projetos de um usuário para CSV ou JSONL"""
+    parser = argparse.ArgumentParser(description='Exportação em lote de projetos')
+    parser.add_argument('--usuario', type=int, required=True, help='ID do usuário dono dos projetos')
+    parser.add_argument('--formato', choices=FORMATOS, default='csv')
+    for campo in FILTROS_PERMITIDOS:
+        parser.add_argument(f'--{campo}', help=f'Filtrar por {campo}')
+    parser.add_argument('-o', '--saida', help='Arquivo de saída (padrão: saída padrão)')
+    args = parser.parse_args(argv)
+
+    filtros = {campo: getattr(args, campo) for campo in FILTROS_PERMITIDOS if getattr(args, campo)}
+    saida = open(args.saida, 'wb') if args.saida else sys.stdout.buffer
+    try:
+        for chunk in stream_projetos(args.usuario, args.formato, filtros):
+            saida.write(chunk)
+    finally:
+        if args.saida:
+            saida.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import sys
+import json
+import zlib
+import argparse
+from config import Config
+from database.connection import get_db
+from database.equipamentos import anexar_equipamentos
+from database.init_db import init_database
+from project_import import COLUNAS_PROJETO
+
+# Estado de um projeto guardado em cada revisão: colunas editáveis e listas de equipamentos
+CAMPOS_REVISAO = COLUNAS_PROJETO + ('modulos_novos', 'inversores_novos')
+
+# Dicionários pré-definidos do zlib com os nomes de campos e valores recorrentes: deltas
+# de poucas dezenas de bytes comprimem bem mesmo sem histórico. Cada revisão grava a
+# versão do dicionário usado (revisoes_projeto.dicionario); os existentes nunca mudam.
+# Para atualizar (ex.: colunas novas), acrescente uma versão e aponte DICIONARIO_ATUAL para ela.
+DICIONARIOS = {
+    1: (
+        '["nome_cliente","cpf_cnpj","uc","endereco","cidade","uf","cep","concessionaria",'
+        '"data_projeto","tipo_projeto","inversores_existentes","controlador","transdutor_tc",'
+        '"chave_seccionadora","status","modulos_existentes","quantidade_modulos","media_consumo",'
+        '"fator_carga","fator_ajuste","potencia_kwp","geracao_kwh_mes","reducao_percentual",'
+        '"area_arranjos","modulos_novos","inversores_novos"]'
+        '"modelo":"potencia":"quantidade":"largura_mm":"altura_mm":"id":'
+        'Instalação NovaAmpliaçãoGrid ZeroArt. 73-ARascunhoEm AndamentoConcluído'
+    ).encode('utf-8'),
+}
+DICIONARIO_ATUAL = 1
+
+def _comprimir(dados):
+    compressor = zlib.compressobj(9, zdict=DICIONARIOS[DICIONARIO_ATUAL])
+    texto = json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return compressor.compress(texto) + compressor.flush()
+
+def _descomprimir(blob, dicionario):
+    descompressor = zlib.decompressobj(zdict=DICIONARIOS[dicionario])
+    return json.loads(descompressor.decompress(blob) + descompressor.flush())
+
+def estado_atual(conn, projeto_id):
+    """(versao, estado) do projeto como está no banco, ou (None, None) se ele não existir"""
+    projeto = conn.execute(
+        f"SELECT id, versao, {', '.join(COLUNAS_PROJETO)}, modulos_novos, inversores_novos "
+        'FROM projetos WHERE id = ?',
+        (projeto_id,)
+    ).fetchone()
+    if projeto is None:
+        return None, None
+    projeto = anexar_equipamentos(conn, [dict(projeto)])[0]
+    return projeto['versao'], {campo: projeto.get(campo) for campo in CAMPOS_REVISAO}
+
+def reconstruir(conn, projeto_id, versao=None):
+    """Estado do projeto na revisão informada (ou na última), ou None se ela não existir.
+
+    Parte do último snapshot completo até a revisão e aplica os deltas seguintes;
+    com HISTORICO_SNAPSHOT_INTERVALO a cadeia nunca passa desse número de deltas.
+    """
+    if versao is None:
+        linha = conn.execute(
+            'SELECT MAX(versao) as versao FROM revisoes_projeto WHERE projeto_id = ?', (projeto_id,)
+        ).fetchone()
+        versao = linha['versao']
+        if versao is None:
+            return None
+
+    linhas = conn.execute(
+        '''SELECT versao, completa, dicionario, dados FROM revisoes_projeto
+           WHERE projeto_id = ? AND versao <= ? AND versao >= (
+               SELECT MAX(versao) FROM revisoes_projeto
+               WHERE projeto_id = ? AND versao <= ? AND completa = 1
+           )
+           ORDER BY versao''',
+        (projeto_id, versao, projeto_id, versao)
+    ).fetchall()
+    if not linhas or linhas[-1]['versao'] != versao:
+        return None
+
+    estado = {}
+    for linha in linhas:
+        estado.update(_descomprimir(linha['dados'], linha['dicionario']))
+    return estado
+
+def registrar(conn, projeto_id):
+    """Grava a revisão do estado atual do projeto, na transação de quem salvou.
+
+    A revisão é um delta (só os campos alterados) contra a anterior; vira snapshot
+    completo na primeira revisão, a cada HISTORICO_SNAPSHOT_INTERVALO revisões ou
+    quando o delta comprimido não for menor que o snapshot. Retorna a versão gravada.
+    """
+    versao, estado = estado_atual(conn, projeto_id)
+    if estado is None:
+        return None
+
+    anterior = conn.execute(
+        '''SELECT MAX(versao) as versao,
+                  (SELECT MAX(versao) FROM revisoes_projeto
+                   WHERE projeto_id = ? AND versao < ? AND completa = 1) as completa
+           FROM revisoes_projeto WHERE projeto_id = ? AND versao < ?''',
+        (projeto_id, versao, projeto_id, versao)
+    ).fetchone()
+
+    completo = _comprimir(estado)
+    dados, completa = completo, 1
+    if anterior['versao'] is not None and \
+            anterior['versao'] - (anterior['completa'] or 0) + 1 < Config.HISTORICO_SNAPSHOT_INTERVALO:
+        base = reconstruir(conn, projeto_id, anterior['versao'])
+        if base is not None:
+            delta = _comprimir({campo: valor for campo, valor in estado.items() if base.get(campo) != valor})
+            if len(delta) < len(completo):
+                dados, completa = delta, 0
+
+    conn.execute(
+        '''INSERT OR REPLACE INTO revisoes_projeto (projeto_id, versao, completa, dicionario, dados)
+           VALUES (?, ?, ?, ?, ?)''',
+        (projeto_id, versao, completa, DICIONARIO_ATUAL, dados)
+    )
+    return versao
+
+def existe(conn, projeto_id, versao):
+    return conn.execute(
+        'SELECT 1 FROM revisoes_projeto WHERE projeto_id = ? AND versao = ?', (projeto_id, versao)
+    ).fetchone() is not None
+
+def listar(conn, projeto_id):
+    """Revisões do projeto com o tamanho gravado e os documentos gerados a partir de cada uma"""
+    revisoes = [dict(linha) for linha in conn.execute(
+        '''SELECT versao, completa, length(dados) as bytes, data_criacao
+           FROM revisoes_projeto WHERE projeto_id = ? ORDER BY versao''',
+        (projeto_id,)
+    )]
+    documentos = {}
+    for linha in conn.execute(
+        '''SELECT arquivo, versao_projeto FROM documentos_gerados
+           WHERE projeto_id = ? AND versao_projeto IS NOT NULL ORDER BY data_criacao''',
+        (projeto_id,)
+    ):
+        documentos.setdefault(linha['versao_projeto'], []).append(linha['arquivo'])
+    for revisao in revisoes:
+        revisao['completa'] = bool(revisao['completa'])
+        revisao['documentos'] = documentos.get(revisao['versao'], [])
+    return revisoes
+
+def stats():
+    """Tamanho do histórico de revisões"""
+    with get_db() as conn:
+        linha = conn.execute(
+            '''SELECT COUNT(*) as revisoes, COALESCE(SUM(completa), 0) as snapshots,
+                      COALESCE(SUM(length(dados)), 0) as bytes
+               FROM revisoes_projeto'''
+        ).fetchone()
+    return {
+        'revisoes': linha['revisoes'],
+        'snapshots': linha['snapshots'],
+        'bytes': linha['bytes'],
+        'media_bytes': round(linha['bytes'] / linha['revisoes'], 1) if linha['revisoes'] else 0.0,
+    }
+
+def main(argv=None):
+    """Consulta o histórico de revisões de projetos"""
+    parser = argparse.ArgumentParser(description='Histórico de revisões de projetos')
+    parser.add_argument('projeto_id', type=int, nargs='?', help='Projeto a consultar')
+    parser.add_argument('--versao', type=int, help='Imprime o estado do projeto nessa revisão')
+    parser.add_argument('--registrar-atuais', action='store_true',
+                        help='Grava a revisão atual dos projetos que ainda não têm histórico')
+    args = parser.parse_args(argv)
+
+    # Garante a tabela de revisões em bancos criados antes dela
+    init_database()
+    if args.registrar_atuais:
+        with get_db() as conn:
+            ids = [linha['id'] for linha in conn.execute(
+                'SELECT id FROM projetos WHERE id NOT IN (SELECT DISTINCT projeto_id FROM revisoes_projeto)'
+            )]
+            for projeto_id in ids:
+                registrar(conn, projeto_id)
+        print(f'✓ {len(ids)} projetos com a revisão atual registrada')
+
+    if args.projeto_id is None:
+        print(json.dumps(stats(), ensure_ascii=False, indent=2))
+        return 0
+
+    with get_db() as conn:
+        if args.versao is None:
+            resultado = listar(conn, args.projeto_id)
+        else:
+            resultado = reconstruir(conn, args.projeto_id, args.versao)
+    if resultado is None:
+        print(f'Revisão {args.versao} do projeto {args.projeto_id} não encontrada', file=sys.stderr)
+        return 1
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
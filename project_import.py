@@ -0,0 +1,248 @@
+import io
+import re
+import sys
+import csv
+import json
+import math
+import sqlite3
+import argparse
+from itertools import islice
+from database.connection import get_db
+from database.equipamentos import inserir_equipamentos_lote, validar_itens, MAX_INTEIRO
+
+TIPOS_PROJETO = ('Instalação Nova', 'Ampliação', 'Grid Zero', 'Art. 73-A')
+
+# Colunas de projetos aceitas na importação e seus tipos
+COLUNAS_TEXTO = (
+    'nome_cliente', 'cpf_cnpj', 'uc', 'endereco', 'cidade', 'uf', 'cep', 'concessionaria',
+    'data_projeto', 'tipo_projeto', 'inversores_existentes',
+    'controlador', 'transdutor_tc', 'chave_seccionadora', 'status',
+)
+COLUNAS_INTEIRO = ('modulos_existentes', 'quantidade_modulos')
+COLUNAS_REAL = (
+    'media_consumo', 'fator_carga', 'fator_ajuste',
+    'potencia_kwp', 'geracao_kwh_mes', 'reducao_percentual', 'area_arranjos',
+)
+COLUNAS_DATA_HORA = ('data_criacao', 'data_atualizacao')
+
+COLUNAS_PROJETO = COLUNAS_TEXTO + COLUNAS_INTEIRO + COLUNAS_REAL
+
+MAX_ERROS_REPORTADOS = 1000
+
+_DATA_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_DATA_HORA_RE = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?$')
+
+_INSERT_PROJETO = f'''
+    INSERT INTO projetos (usuario_id, {', '.join(COLUNAS_PROJETO)}, data_criacao, data_atualizacao)
+    VALUES (?, {', '.join('?' for _ in COLUNAS_PROJETO)},
+            COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+'''
+
+class LinhaInvalida(ValueError):
+    """Linha da importação que não passa na validação"""
+
+def _vazio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+def _equipamentos(valor, campo):
+    if _vazio(valor):
+        return []
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            raise LinhaInvalida(f'{campo}: JSON inválido')
+    if not isinstance(valor, list) or not all(isinstance(item, dict) for item in valor):
+        raise LinhaInvalida(f'{campo}: deve ser uma lista de objetos')
+    try:
+        validar_itens(valor)
+    except ValueError as e:
+        raise LinhaInvalida(f'{campo}: {e}')
+    return valor
+
+def validar_projeto(registro):
+    """Valida e converte um registro de entrada nos tipos de projetos.
+
+    Retorna (valores das colunas, data_criacao, data_atualizacao, modulos, inversores).
+    Levanta LinhaInvalida com a primeira inconsistência encontrada.
+    """
+    valores = []
+    for coluna in COLUNAS_TEXTO:
+        valor = registro.get(coluna)
+        valores.append('' if _vazio(valor) else str(valor).strip())
+
+    for coluna in COLUNAS_INTEIRO:
+        valor = registro.get(coluna)
+        try:
+            numero = 0 if _vazio(valor) else int(float(valor))
+        except (TypeError, ValueError, OverflowError):
+            raise LinhaInvalida(f'{coluna}: número inteiro inválido ({valor!r})')
+        if abs(numero) > MAX_INTEIRO:
+            raise LinhaInvalida(f'{coluna}: número inteiro inválido ({valor!r})')
+        valores.append(numero)
+
+    for coluna in COLUNAS_REAL:
+        valor = registro.get(coluna)
+        try:
+            numero = 0.0 if _vazio(valor) else float(str(valor).replace(',', '.'))
+        except (TypeError, ValueError, OverflowError):
+            raise LinhaInvalida(f'{coluna}: número inválido ({valor!r})')
+        if not math.isfinite(numero):
+            raise LinhaInvalida(f'{coluna}: número inválido ({valor!r})')
+        valores.append(numero)
+
+    texto = dict(zip(COLUNAS_TEXTO, valores))
+    if not texto['nome_cliente']:
+        raise LinhaInvalida('nome_cliente é obrigatório')
+    if texto['data_projeto'] and not _DATA_RE.match(texto['data_projeto']):
+        raise LinhaInvalida(f"data_projeto: use AAAA-MM-DD ({texto['data_projeto']!r})")
+    if texto['tipo_projeto'] and texto['tipo_projeto'] not in TIPOS_PROJETO:
+        raise LinhaInvalida(f"tipo_projeto inválido ({texto['tipo_projeto']!r})")
+    if not texto['status']:
+        valores[COLUNAS_TEXTO.index('status')] = 'Rascunho'
+
+    datas = []
+    for coluna in COLUNAS_DATA_HORA:
+        valor = registro.get(coluna)
+        if _vazio(valor):
+            datas.append(None)
+        elif not _DATA_HORA_RE.match(str(valor).strip()):
+            raise LinhaInvalida(f'{coluna}: use AAAA-MM-DD HH:MM:SS ({valor!r})')
+        else:
+            datas.append(str(valor).strip().replace('T', ' '))
+
+    modulos = _equipamentos(registro.get('modulos_novos'), 'modulos_novos')
+    inversores = _equipamentos(registro.get('inversores_novos'), 'inversores_novos')
+    return valores, datas[0], datas[1], modulos, inversores
+
+def ler_registros(arquivo, formato):
+    """Lê o arquivo texto linha a linha, produzindo (número da linha, registro ou erro)"""
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        for registro in leitor:
+            yield leitor.line_num, registro
+    elif formato == 'jsonl':
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                yield numero, LinhaInvalida('JSON inválido')
+                continue
+            if not isinstance(registro, dict):
+                yield numero, LinhaInvalida('cada linha deve ser um objeto JSON')
+                continue
+            yield numero, registro
+    else:
+        raise ValueError(f'Formato inválido: {formato}')
+
+def _inserir_lote(conn, usuario_id, lote):
+    """Insere um lote validado com executemany e devolve quantos entraram.
+
+    Se o lote falhar no banco, refaz linha a linha para isolar a(s) linha(s) com erro.
+    """
+    parametros = [(usuario_id, *valores, criacao, atualizacao)
+                  for _, (valores, criacao, atualizacao, _, _) in lote]
+
+    conn.execute('SAVEPOINT lote_importacao')
+    try:
+        conn.executemany(_INSERT_PROJETO, parametros)
+        # Numa única transação de escrita os ids AUTOINCREMENT do lote são contíguos
+        ultimo_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        primeiro_id = ultimo_id - len(lote) + 1
+        inserir_equipamentos_lote(conn, (
+            (primeiro_id + i, modulos, inversores)
+            for i, (_, (_, _, _, modulos, inversores)) in enumerate(lote)
+        ))
+        conn.execute('RELEASE lote_importacao')
+        return len(lote), []
+    except sqlite3.DatabaseError:
+        conn.execute('ROLLBACK TO lote_importacao')
+        conn.execute('RELEASE lote_importacao')
+
+    inseridos, erros = 0, []
+    for (numero, (valores, criacao, atualizacao, modulos, inversores)), params in zip(lote, parametros):
+        conn.execute('SAVEPOINT linha_importacao')
+        try:
+            projeto_id = conn.execute(_INSERT_PROJETO, params).lastrowid
+            inserir_equipamentos_lote(conn, [(projeto_id, modulos, inversores)])
+            conn.execute('RELEASE linha_importacao')
+            inseridos += 1
+        except sqlite3.DatabaseError as e:
+            conn.execute('ROLLBACK TO linha_importacao')
+            conn.execute('RELEASE linha_importacao')
+            erros.append({'linha': numero, 'erro': str(e)})
+    return inseridos, erros
+
+def importar_projetos(usuario_id, arquivo, formato, tamanho_lote=500, lotes_por_transacao=10):
+    """Importa projetos de um arquivo CSV/JSONL em lotes, sem carregar o arquivo inteiro.
+
+    Retorna um relatório com total de linhas, importados e erros por linha.
+    """
+    relatorio = {'linhas': 0, 'importados': 0, 'erros': [], 'total_erros': 0}
+
+    def registrar_erro(numero, mensagem):
+        relatorio['total_erros'] += 1
+        if len(relatorio['erros']) < MAX_ERROS_REPORTADOS:
+            relatorio['erros'].append({'linha': numero, 'erro': mensagem})
+
+    def lotes_validos():
+        lote = []
+        for numero, registro in ler_registros(arquivo, formato):
+            relatorio['linhas'] += 1
+            if isinstance(registro, Exception):
+                registrar_erro(numero, str(registro))
+                continue
+            try:
+                lote.append((numero, validar_projeto(registro)))
+            except LinhaInvalida as e:
+                registrar_erro(numero, str(e))
+                continue
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    lotes = lotes_validos()
+    while True:
+        transacao = list(islice(lotes, lotes_por_transacao))
+        if not transacao:
+            break
+        with get_db() as conn:
+            # Transação explícita: os SAVEPOINTs de cada lote ficam aninhados nela
+            conn.execute('BEGIN IMMEDIATE')
+            for lote in transacao:
+                inseridos, erros = _inserir_lote(conn, usuario_id, lote)
+                relatorio['importados'] += inseridos
+                for erro in erros:
+                    registrar_erro(erro['linha'], erro['erro'])
+
+    return relatorio
+
+def abrir_texto(binario):
+    """Adapta um stream binário (upload, arquivo) para leitura de texto em UTF-8"""
+    return io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+
+def main(argv=None):
+    """Importa projetos de um arquivo CSV ou JSONL"""
+    parser = argparse.ArgumentParser(description='Importação em lote de projetos')
+    parser.add_argument('arquivo', help='Arquivo .csv ou .jsonl')
+    parser.add_argument('--usuario', type=int, required=True, help='ID do usuário dono dos projetos')
+    parser.add_argument('--formato', choices=('csv', 'jsonl'), help='Padrão: extensão do arquivo')
+    parser.add_argument('--lote', type=int, default=500, help='Linhas por executemany')
+    args = parser.parse_args(argv)
+
+    formato = args.formato or ('jsonl' if args.arquivo.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(args.arquivo, 'rb') as f:
+        relatorio = importar_projetos(args.usuario, abrir_texto(f), formato, args.lote)
+
+    for erro in relatorio['erros']:
+        print(f"linha {erro['linha']}: {erro['erro']}", file=sys.stderr)
+    print(f"✓ {relatorio['importados']} de {relatorio['linhas']} linhas importadas "
+          f"({relatorio['total_erros']} com erro)")
+    return 0 if relatorio['total_erros'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import math
+from config import Config
+from database.escrita import escrever
+from database.equipamentos import (
+    salvar_lista, anexar_equipamentos, validar_itens, TIPO_MODULO, TIPO_INVERSOR, MAX_INTEIRO,
+)
+from project_import import COLUNAS_TEXTO, COLUNAS_INTEIRO, COLUNAS_REAL
+import project_history
+
+CAMPOS_EQUIPAMENTOS = {'modulos_novos': TIPO_MODULO, 'inversores_novos': TIPO_INVERSOR}
+
+# Campos cuja alteração exige recalcular os totais no servidor
+ENTRADAS_DIMENSIONAMENTO = ('modulos_novos', 'uf', 'media_consumo')
+
+# Totais calculados pelo dimensionamento (dimensionamento.COLUNAS_TOTAIS), repetidos
+# aqui para não carregar o numpy só para validar um autosave
+COLUNAS_TOTAIS = ('potencia_kwp', 'quantidade_modulos', 'area_arranjos', 'geracao_kwh_mes', 'reducao_percentual')
+
+class ConflitoVersao(Exception):
+    """O projeto foi alterado por outra sessão desde a versão enviada"""
+
+    def __init__(self, versao_atual):
+        super().__init__(f'Projeto alterado em outra sessão (versão atual: {versao_atual})')
+        self.versao_atual = versao_atual
+
+def _converter(coluna, valor):
+    if coluna in COLUNAS_TEXTO:
+        return '' if valor is None else str(valor)
+    vazio = valor is None or (isinstance(valor, str) and not valor.strip())
+    try:
+        if coluna in COLUNAS_INTEIRO:
+            numero = 0 if vazio else int(float(valor))
+            valido = abs(numero) <= MAX_INTEIRO
+        else:
+            numero = 0.0 if vazio else float(str(valor).replace(',', '.'))
+            valido = math.isfinite(numero)
+    except (TypeError, ValueError, OverflowError):
+        valido = False
+    if not valido:
+        raise ValueError(f'{coluna}: número inválido ({valor!r})')
+    return numero
+
+def validar_alteracoes(alteracoes, dimensionar=None):
+    """Separa as alterações em colunas de projetos (já convertidas) e listas de equipamentos.
+
+    Com o dimensionamento no servidor ligado, os totais calculados enviados pelo
+    cliente são ignorados (a redução percentual continua aceita).
+    """
+    dimensionar = Config.DIMENSIONAMENTO_NO_SALVAR if dimensionar is None else dimensionar
+    colunas, equipamentos = {}, {}
+    for campo, valor in alteracoes.items():
+        if campo in CAMPOS_EQUIPAMENTOS:
+            if not isinstance(valor, list) or not all(isinstance(item, dict) for item in valor):
+                raise ValueError(f'{campo}: deve ser uma lista de objetos')
+            try:
+                validar_itens(valor)
+            except ValueError as e:
+                raise ValueError(f'{campo}: {e}')
+            equipamentos[campo] = valor
+        elif campo in COLUNAS_TEXTO or campo in COLUNAS_INTEIRO or campo in COLUNAS_REAL:
+            if dimensionar and campo in COLUNAS_TOTAIS and campo != 'reducao_percentual':
+                continue
+            colunas[campo] = _converter(campo, valor)
+        else:
+            raise ValueError(f'Campo inválido: {campo}')
+
+    if 'nome_cliente' in colunas and not colunas['nome_cliente'].strip():
+        raise ValueError('nome_cliente é obrigatório')
+    return colunas, equipamentos
+
+def atualizar_projeto(usuario_id, projeto_id, versao, alteracoes, dimensionar=None):
+    """Grava só os campos alterados, se o projeto ainda estiver na versão informada.
+
+    Retorna {'versao': nova versão, 'totais': totais recalculados ou None}, ou None se
+    o projeto não existir. Levanta ConflitoVersao se a versão não conferir.
+    """
+    dimensionar = Config.DIMENSIONAMENTO_NO_SALVAR if dimensionar is None else dimensionar
+    if isinstance(versao, bool) or not isinstance(versao, int):
+        raise ValueError('versao é obrigatória')
+    colunas, equipamentos = validar_alteracoes(alteracoes, dimensionar)
+    if not colunas and not equipamentos:
+        raise ValueError('Nenhuma alteração enviada')
+
+    # A lista salva nas tabelas normalizadas substitui o JSON legado do mesmo tipo
+    atribuicoes = [f'{coluna} = ?' for coluna in colunas]
+    atribuicoes += [f'{campo} = NULL' for campo in equipamentos]
+    atribuicoes += ['versao = versao + 1', 'data_atualizacao = CURRENT_TIMESTAMP']
+
+    def aplicar(conn):
+        cursor = conn.execute(
+            f"UPDATE projetos SET {', '.join(atribuicoes)} WHERE id = ? AND usuario_id = ? AND versao = ?",
+            (*colunas.values(), projeto_id, usuario_id, versao)
+        )
+        if cursor.rowcount == 0:
+            atual = conn.execute(
+                'SELECT versao FROM projetos WHERE id = ? AND usuario_id = ?', (projeto_id, usuario_id)
+            ).fetchone()
+            if atual is None:
+                return None
+            raise ConflitoVersao(atual['versao'])
+
+        for campo, itens in equipamentos.items():
+            salvar_lista(conn, projeto_id, CAMPOS_EQUIPAMENTOS[campo], itens)
+
+        totais = None
+        if dimensionar and any(campo in alteracoes for campo in ENTRADAS_DIMENSIONAMENTO):
+            projeto = conn.execute(
+                'SELECT id, uf, media_consumo, modulos_novos, inversores_novos FROM projetos WHERE id = ?',
+                (projeto_id,)
+            ).fetchone()
+            from dimensionamento import dimensionar_projeto
+            totais = dimensionar_projeto(anexar_equipamentos(conn, [dict(projeto)])[0])
+            # Mesma transação do UPDATE acima: os totais fazem parte da versão versao + 1
+            conn.execute(
+                f"UPDATE projetos SET {', '.join(f'{c} = ?' for c in totais)} WHERE id = ?",
+                (*totais.values(), projeto_id)
+            )
+        
+        if Config.HISTORICO_REVISOES:
+            project_history.registrar(conn, projeto_id)
+        return {'versao': versao + 1, 'totais': totais}
+
+    # Com DB_WRITE_QUEUE ligado, aplicado pelo escritor único em lote com outras escritas
+    return escrever(aplicar)
@@ -0,0 +1,82 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from functools import lru_cache
+from flask import current_app, url_for
+
+# Arquivos versionados nunca mudam: o navegador pode guardá-los por um ano sem revalidar
+MAX_AGE_VERSIONADO = 365 * 24 * 3600
+
+_VERSIONADO_RE = re.compile(r'^(?P<base>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+# (static, templates) -> (expira_em, versão) calculada por versao_paginas
+_versoes = {}
+_versoes_lock = threading.Lock()
+
+@lru_cache(maxsize=256)
+def _hash_arquivo(caminho, mtime_ns, tamanho):
+    """sha256 (12 hex) do conteúdo; a chave inclui mtime/tamanho para recalcular quando o arquivo muda"""
+    with open(caminho, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def fingerprint(filename, pasta=None):
+    """Hash do conteúdo de um arquivo de static/, ou None se ele não existir"""
+    caminho = os.path.join(pasta or current_app.static_folder, filename)
+    try:
+        stat = os.stat(caminho)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return _hash_arquivo(caminho, stat.st_mtime_ns, stat.st_size)
+
+def nome_versionado(filename):
+    """'css/style.css' -> 'css/style.<hash>.css' (o próprio nome se o arquivo não existir)"""
+    hash_conteudo = fingerprint(filename)
+    if hash_conteudo is None:
+        return filename
+    base, ext = os.path.splitext(filename)
+    return f'{base}.{hash_conteudo}{ext}'
+
+def resolver(nome):
+    """'css/style.<hash>.css' -> ('css/style.css', hash), ou (nome, None) sem hash no nome"""
+    encontrado = _VERSIONADO_RE.match(nome)
+    if not encontrado:
+        return nome, None
+    return encontrado['base'] + encontrado['ext'], encontrado['hash']
+
+def asset_url(filename):
+    """URL com o hash do conteúdo no nome, servida com cache de longo prazo (usado nos templates)"""
+    return url_for('asset', nome=nome_versionado(filename))
+
+def versao_paginas():
+    """Hash dos arquivos de static/ e dos templates HTML.
+
+    Entra no ETag das páginas, que mudam quando um asset referenciado (e portanto
+    o seu nome versionado) ou o próprio template muda. Recalculado no máximo a
+    cada PAGINAS_VERSAO_TTL segundos, em vez de percorrer as pastas a cada requisição.
+    """
+    pastas = (
+        (current_app.static_folder, None),
+        (os.path.join(current_app.root_path, current_app.template_folder), '.html'),
+    )
+    agora = time.monotonic()
+    item = _versoes.get(pastas)
+    if item is not None and item[0] > agora:
+        return item[1]
+
+    versao = _calcular_versao(pastas)
+    with _versoes_lock:
+        _versoes[pastas] = (agora + current_app.config['PAGINAS_VERSAO_TTL'], versao)
+    return versao
+
+def _calcular_versao(pastas):
+    partes = []
+    for pasta, extensao in pastas:
+        for raiz, _, nomes in os.walk(pasta):
+            for nome in nomes:
+                if extensao and not nome.endswith(extensao):
+                    continue
+                relativo = os.path.relpath(os.path.join(raiz, nome), pasta)
+                partes.append(f'{relativo}:{fingerprint(relativo, pasta)}')
+    return hashlib.sha256('|'.join(sorted(partes)).encode('utf-8')).hexdigest()[:12]
@@ -4,7 +4,9 @@
 
 const API = {
     salvarProjeto: '/api/projeto/salvar',
-    gerarDocx: (id) => `/api/projeto/${id}/gerar-docx`,
+    atualizarProjeto: (id) => `/api/projeto/${id}`,
+    gerarDocx: (id, modo = 'direto') => `/api/projeto/${id}/gerar-docx?modo=${modo}`,
+    statusJob: (id) => `/api/jobs/${id}`,
 };
 
 function showAlert(message, type = 'info') {
@@ -21,6 +23,25 @@ function showAlert(message, type = 'info') {
     setTimeout(() => alertDiv.remove(), 5000);
 }
 
+function nomeArquivoResposta(response) {
+    const disposition = response.headers.get('Content-Disposition') || '';
+    const utf8 = disposition.match(/filename\*=UTF-8''([^;]+)/i);
+    if (utf8) return decodeURIComponent(utf8[1]);
+    const simples = disposition.match(/filename="?([^";]+)"?/i);
+    return simples ? simples[1] : null;
+}
+
+function baixarArquivo(blob, nome) {
+    const url = URL.createObjectURL(blob);
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = nome;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    setTimeout(() => URL.revokeObjectURL(url), 1000);
+}
+
 function formatCurrency(value) {
     return new Intl.NumberFormat('pt-BR', {
         style: 'currency',
@@ -88,11 +109,17 @@ function applyMasks() {
 // EDITOR DE MEMORIAL
 // ============================================================================
 
+const AUTOSAVE_DELAY = 1500; // ms sem alterações antes de enviar o diff
+
 class MemorialEditor {
     constructor() {
         this.projeto = null;
         this.modulos = [];
         this.inversores = [];
+        this.ultimoSalvo = null;
+        this.autosaveTimer = null;
+        this.salvando = null; // promessa do envio em andamento (autosave ou salvar)
+        this.conflito = false;
         this.init();
     }
     
@@ -121,6 +148,11 @@ class MemorialEditor {
         document.querySelectorAll('[data-calculate]').forEach(input => {
             input.addEventListener('change', () => this.calcularTotais());
         });
+        
+        // Autosave dos campos alterados
+        const form = document.getElementById('editor-form');
+        form?.addEventListener('input', () => this.agendarAutosave());
+        form?.addEventListener('change', () => this.agendarAutosave());
     }
     
     loadProjectData() {
@@ -130,6 +162,7 @@ class MemorialEditor {
             try {
                 this.projeto = JSON.parse(projectDataEl.textContent);
                 this.populateForm();
+                this.ultimoSalvo = this.coletarDados();
             } catch (e) {
                 console.error('Erro ao carregar dados do projeto:', e);
             }
@@ -225,6 +258,7 @@ class MemorialEditor {
     removeModulo(id) {
         this.modulos = this.modulos.filter(m => m.id !== id);
         this.renderModulos();
+        this.agendarAutosave();
     }
     
     renderModulos() {
@@ -268,6 +302,7 @@ class MemorialEditor {
         if (modulo) {
             modulo[field] = isNaN(value) ? value : parseFloat(value);
             this.calcularTotais();
+            this.agendarAutosave();
         }
     }
     
@@ -285,6 +320,7 @@ class MemorialEditor {
     removeInversor(id) {
         this.inversores = this.inversores.filter(i => i.id !== id);
         this.renderInversores();
+        this.agendarAutosave();
     }
     
     renderInversores() {
@@ -328,6 +364,7 @@ class MemorialEditor {
         if (inversor) {
             inversor[field] = isNaN(value) ? value : parseFloat(value);
             this.calcularTotais();
+            this.agendarAutosave();
         }
     }
     
@@ -387,16 +424,8 @@ class MemorialEditor {
         showAlert('Formulário preenchido com dados de exemplo!', 'success');
     }
     
-    async salvarProjeto() {
-        // Validar campos obrigatórios
-        const nome_cliente = document.getElementById('nome_cliente').value.trim();
-        if (!nome_cliente) {
-            showAlert('Nome do cliente é obrigatório', 'error');
-            return;
-        }
-        
-        const dados = {
-            projeto_id: this.projeto?.id || null,
+    coletarDados() {
+        return JSON.parse(JSON.stringify({
             nome_cliente: document.getElementById('nome_cliente').value,
             cpf_cnpj: document.getElementById('cpf_cnpj').value,
             uc: document.getElementById('uc').value,
@@ -426,8 +455,101 @@ class MemorialEditor {
             geracao_kwh_mes: document.getElementById('geracao_kwh_mes').value,
             reducao_percentual: document.getElementById('reducao_percentual').value,
             area_arranjos: document.getElementById('area_arranjos').value,
-            quantidade_modulos: document.getElementById('quantidade_modulos').value,
+            quantidade_modulos: document.getElementById('quantidade_modulos').value
+        }));
+    }
+    
+    preencherTotais(totais) {
+        // Totais recalculados pelo servidor
+        Object.entries(totais || {}).forEach(([campo, valor]) => {
+            document.getElementById(campo).value = valor;
+            if (this.ultimoSalvo) this.ultimoSalvo[campo] = String(valor);
+        });
+    }
+    
+    agendarAutosave() {
+        if (!this.projeto?.id || this.conflito) return;
+        clearTimeout(this.autosaveTimer);
+        this.autosaveTimer = setTimeout(() => this.autosalvar(), AUTOSAVE_DELAY);
+    }
+    
+    async autosalvar() {
+        if (this.salvando) {
+            this.agendarAutosave();
+            return;
+        }
+        
+        const atual = this.coletarDados();
+        const alteracoes = {};
+        Object.keys(atual).forEach(campo => {
+            if (JSON.stringify(atual[campo]) !== JSON.stringify(this.ultimoSalvo?.[campo])) {
+                alteracoes[campo] = atual[campo];
+            }
+        });
+        if (!Object.keys(alteracoes).length || !atual.nome_cliente.trim()) return;
+        
+        await this.enviando(this.enviarAlteracoes(alteracoes));
+    }
+    
+    async enviando(envio) {
+        // Marca o envio em andamento até ele terminar
+        this.salvando = envio;
+        try {
+            await envio;
+        } finally {
+            if (this.salvando === envio) this.salvando = null;
+        }
+    }
+    
+    async enviarAlteracoes(alteracoes) {
+        try {
+            const response = await fetch(API.atualizarProjeto(this.projeto.id), {
+                method: 'PATCH',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ versao: this.projeto.versao, ...alteracoes })
+            });
+            
+            const result = await response.json();
             
+            if (result.success) {
+                this.projeto.versao = result.versao;
+                Object.assign(this.ultimoSalvo, alteracoes);
+                this.preencherTotais(result.totais);
+            } else if (response.status === 409) {
+                this.conflito = true;
+                showAlert(result.message, 'warning');
+            } else {
+                showAlert(result.message, 'error');
+            }
+        } catch (error) {
+            showAlert('Erro no salvamento automático: ' + error.message, 'error');
+        }
+    }
+    
+    async salvarProjeto() {
+        // Validar campos obrigatórios
+        const nome_cliente = document.getElementById('nome_cliente').value.trim();
+        if (!nome_cliente) {
+            showAlert('Nome do cliente é obrigatório', 'error');
+            return;
+        }
+        
+        clearTimeout(this.autosaveTimer);
+        // Um autosave em andamento muda a versão do projeto: espera ele responder
+        while (this.salvando) {
+            await this.salvando;
+        }
+        await this.enviando(this.enviarProjeto());
+    }
+    
+    async enviarProjeto() {
+        const atual = this.coletarDados();
+        const dados = {
+            projeto_id: this.projeto?.id || null,
+            versao: this.projeto?.versao ?? null,
+            ...atual,
             status: 'Rascunho'
         };
         
@@ -443,12 +565,20 @@ class MemorialEditor {
             const result = await response.json();
             
             if (result.success) {
+                if (this.projeto) {
+                    this.projeto.versao = result.versao;
+                    this.ultimoSalvo = atual;
+                }
+                this.preencherTotais(result.totais);
                 showAlert(result.message, 'success');
                 if (!this.projeto) {
                     setTimeout(() => {
                         window.location.href = '/dashboard';
                     }, 1500);
                 }
+            } else if (response.status === 409) {
+                this.conflito = true;
+                showAlert(result.message, 'warning');
             } else {
                 showAlert(result.message, 'error');
             }
@@ -468,12 +598,22 @@ class MemorialEditor {
                 method: 'POST'
             });
             
+            // Modo direto: o próprio corpo da resposta é o DOCX
+            if (response.ok && !(response.headers.get('Content-Type') || '').includes('json')) {
+                baixarArquivo(await response.blob(), nomeArquivoResposta(response) || 'Memorial.docx');
+                showAlert('DOCX gerado com sucesso!', 'success');
+                return;
+            }
+            
             const result = await response.json();
             
-            if (result.success) {
+            if (result.success && result.job_id) {
+                showAlert(result.message, 'info');
+                this.acompanharJob(result.job_id);
+            } else if (result.success) {
                 showAlert(result.message, 'success');
                 // Iniciar download
-                window.location.href = `/downloads/${result.arquivo}`;
+                window.location.href = result.download_url;
             } else {
                 showAlert(result.message, 'error');
             }
@@ -481,6 +621,24 @@ class MemorialEditor {
             showAlert('Erro ao gerar DOCX: ' + error.message, 'error');
         }
     }
+    
+    async acompanharJob(jobId, intervalo = 1000) {
+        try {
+            const response = await fetch(API.statusJob(jobId));
+            const result = await response.json();
+            
+            if (!result.success || result.status === 'erro') {
+                showAlert(result.message, 'error');
+            } else if (result.status === 'concluido') {
+                showAlert('DOCX gerado com sucesso!', 'success');
+                window.location.href = result.download_url;
+            } else {
+                setTimeout(() => this.acompanharJob(jobId, Math.min(intervalo * 1.5, 5000)), intervalo);
+            }
+        } catch (error) {
+            showAlert('Erro ao consultar geração do DOCX: ' + error.message, 'error');
+        }
+    }
 }
 
 // ============================================================================
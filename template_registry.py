@@ -0,0 +1,188 @@
+import os
+import io
+import copy
+import hashlib
+import threading
+from jinja2 import Environment
+from docx import Document
+from docx.parts.document import DocumentPart
+from docx.opc.parts.coreprops import CorePropertiesPart
+from docxtpl import DocxTemplate
+
+
+class _CachingEnvironment(Environment):
+    """Ambiente Jinja que compila cada parte XML do template uma única vez"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compilados = {}
+        self._lock = threading.Lock()
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+
+        template = self._compilados.get(source)
+        if template is None:
+            template = super().from_string(source)
+            with self._lock:
+                self._compilados.setdefault(source, template)
+        return template
+
+
+class CompiledDocxTemplate(DocxTemplate):
+    """DocxTemplate que carrega o documento a partir dos bytes em memória
+    e reaproveita o XML pré-processado e os templates Jinja já compilados"""
+
+    def __init__(self, entrada):
+        super().__init__(io.BytesIO(entrada.conteudo))
+        self._entrada = entrada
+
+    def init_docx(self, reload=True):
+        # Cópia das árvores XML já analisadas, em vez de abrir o zip e reanalisar o XML
+        if not self.docx or (self.is_rendered and reload):
+            self.template_file = io.BytesIO(self._entrada.conteudo)
+            self.docx = self._entrada.copiar_documento()
+            self.is_rendered = False
+
+    def patch_xml(self, src_xml):
+        cache = self._entrada.xml_processado
+        patched = cache.get(src_xml)
+        if patched is None:
+            patched = super().patch_xml(src_xml)
+            cache[src_xml] = patched
+        return patched
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        if jinja_env is None and not autoescape:
+            jinja_env = self._entrada.jinja_env
+        super().render(context, jinja_env, autoescape)
+
+
+class _TemplateEntry:
+    """Estado compilado de um template DOCX"""
+
+    __slots__ = ('path', 'mtime_ns', 'tamanho', 'sha256', 'conteudo',
+                 'jinja_env', 'xml_processado', 'documento', 'compartilhadas', '_lock')
+
+    def __init__(self, path, stat, conteudo):
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.tamanho = stat.st_size
+        self.conteudo = conteudo
+        self.sha256 = hashlib.sha256(conteudo).hexdigest()
+        self.jinja_env = _CachingEnvironment()
+        self.xml_processado = {}
+        self.documento = None
+        self.compartilhadas = None
+        self._lock = threading.Lock()
+
+    def copiar_documento(self):
+        """Cópia do documento analisado uma vez (o original nunca é renderizado).
+
+        O render só reescreve o corpo (document.xml) e as propriedades (core.xml) e
+        troca as partes de cabeçalho/rodapé nos rels copiados; as demais partes
+        (estilos, numeração, tema, imagens) são compartilhadas entre as cópias.
+        """
+        if self.documento is None:
+            with self._lock:
+                if self.documento is None:
+                    documento = Document(io.BytesIO(self.conteudo))
+                    self.compartilhadas = {
+                        id(parte): parte for parte in documento.part.package.iter_parts()
+                        if not isinstance(parte, (DocumentPart, CorePropertiesPart))
+                    }
+                    self.documento = documento
+        return copy.deepcopy(self.documento, dict(self.compartilhadas))
+
+    def atualizado(self, stat):
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.tamanho
+
+
+class TemplateRegistry:
+    """Registro de templates DOCX carregados e compilados uma vez por processo.
+
+    Cada template é invalidado quando o mtime/tamanho do arquivo muda e o
+    conteúdo (sha256) é diferente do que está em memória.
+    """
+
+    def __init__(self):
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _carregar(self, path):
+        """Retorna a entrada compilada do template, ou None se o arquivo não existir"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._entradas.pop(path, None)
+            return None
+
+        entrada = self._entradas.get(path)
+        if entrada is not None and entrada.atualizado(stat):
+            with self._lock:
+                self.hits += 1
+            return entrada
+
+        with self._lock:
+            entrada = self._entradas.get(path)
+            if entrada is not None and entrada.atualizado(stat):
+                self.hits += 1
+                return entrada
+
+            with open(path, 'rb') as f:
+                conteudo = f.read()
+            nova = _TemplateEntry(path, os.stat(path), conteudo)
+
+            if entrada is not None and entrada.sha256 == nova.sha256:
+                # Arquivo tocado sem alteração de conteúdo: mantém o que já foi compilado
+                entrada.mtime_ns = nova.mtime_ns
+                entrada.tamanho = nova.tamanho
+                self.hits += 1
+                return entrada
+
+            if entrada is not None:
+                self.reloads += 1
+            self.misses += 1
+            self._entradas[path] = nova
+            return nova
+
+    def get(self, path):
+        """Retorna um DocxTemplate novo pronto para render, ou None se o arquivo não existir"""
+        entrada = self._carregar(path)
+        if entrada is None:
+            return None
+        return CompiledDocxTemplate(entrada)
+
+    def versao(self, path):
+        """Retorna o sha256 do conteúdo do template, ou None se o arquivo não existir"""
+        entrada = self._carregar(path)
+        return entrada.sha256 if entrada is not None else None
+
+    def invalidate(self, path=None):
+        """Descarta um template (ou todos) do registro"""
+        with self._lock:
+            if path is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(path, None)
+
+    def stats(self):
+        """Retorna contadores de uso do registro"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'templates': len(self._entradas),
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Registro compartilhado pelo processo
+registry = TemplateRegistry()
@@ -0,0 +1,66 @@
+import time
+import threading
+from collections import OrderedDict
+
+class UserCache:
+    """Cache LRU com TTL dos usuários carregados pelo Flask-Login"""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.removidos = 0
+
+    def get(self, user_id):
+        """Retorna o usuário em cache, ou None se ausente/expirado"""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(user_id)
+            if item is None:
+                self.misses += 1
+                return None
+
+            expira_em, user = item
+            if expira_em < agora:
+                del self._itens[user_id]
+                self.expirados += 1
+                self.misses += 1
+                return None
+
+            self._itens.move_to_end(user_id)
+            self.hits += 1
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._itens[user_id] = (time.monotonic() + self.ttl, user)
+            self._itens.move_to_end(user_id)
+            while len(self._itens) > self.max_size:
+                self._itens.popitem(last=False)
+                self.removidos += 1
+
+    def invalidate(self, user_id=None):
+        """Descarta um usuário (ou todos) do cache; chamar sempre que o registro mudar"""
+        with self._lock:
+            if user_id is None:
+                self._itens.clear()
+            else:
+                self._itens.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'tamanho': len(self._itens),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirados': self.expirados,
+                'removidos': self.removidos,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }